@@ -9,6 +9,7 @@ from pydantic.alias_generators import to_camel
 
 from app.config import DATA_DIR
 from app.services.file import DocumentFile
+from app.services.upload_jobs import get_upload_jobs
 
 logger = logging.getLogger("uvicorn")
 
@@ -40,7 +41,7 @@ class AnnotationFileData(BaseModel):
                 return f"File URL: {file.url}\n"
             else:
                 # Construct url from file name
-                return f"File URL (instruction: do not update this file URL yourself): {url_prefix}/output/uploaded/{file.name}\n"
+                return f"File URL (instruction: do not update this file URL yourself): {url_prefix}/output/uploaded/{file.stored_name}\n"
         else:
             logger.warning(
                 "Warning: FILESERVER_URL_PREFIX not set in environment variables. Can't use file server"
@@ -61,8 +62,8 @@ class AnnotationFileData(BaseModel):
         if file.refs is not None:
             default_content += f"Document IDs: {file.refs}\n"
         # file path
-        sandbox_file_path = f"/tmp/{file.name}"
-        local_file_path = f"output/uploaded/{file.name}"
+        sandbox_file_path = f"/tmp/{file.stored_name}"
+        local_file_path = f"output/uploaded/{file.stored_name}"
         default_content += f"Sandbox file path (instruction: only use sandbox path for artifact or code interpreter tool): {sandbox_file_path}\n"
         default_content += f"Local file path (instruction: Use for local tools: form filling, extractor): {local_file_path}\n"
         return default_content
@@ -240,7 +241,9 @@ class ChatData(BaseModel):
         document_ids: List[str] = []
         uploaded_files = self.get_document_files()
         for _file in uploaded_files:
-            refs = getattr(_file, "refs", None)
+            # The refs sent by the client are ignored: private documents are only
+            # reachable through the id of a file that uploaded them
+            refs = get_upload_jobs().refs_for_file(_file.id)
             if refs is not None:
                 document_ids.extend(refs)
         return list(set(document_ids))
@@ -298,8 +301,9 @@ class SourceNodes(BaseModel):
                 return f"{url_prefix}/output/llamacloud/{file_name}"
             is_private = metadata.get("private", "false") == "true"
             if is_private:
-                # file is a private upload
-                return f"{url_prefix}/output/uploaded/{file_name}"
+                # file is a private upload, stored under a name of its own
+                stored_file_name = metadata.get("stored_file_name", file_name)
+                return f"{url_prefix}/output/uploaded/{stored_file_name}"
             # file is from calling the 'generate' script
             # Get the relative path of file_path to data_dir
             file_path = metadata.get("file_path")
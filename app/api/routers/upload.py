@@ -1,16 +1,33 @@
+import json
 import logging
-from typing import Any
+from typing import Any, Dict, Optional
 
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, ValidationError
 
 from app.api.routers.models import DocumentFile
-from app.services.file import FileService
+from app.services.file import (
+    FileService,
+    FileTooLargeError,
+    InvalidUploadError,
+    UnsupportedFileError,
+    UploadWriter,
+)
+from app.services.upload_jobs import (
+    TooManyUploadsError,
+    UploadJob,
+    UploadResponse,
+    get_upload_jobs,
+)
 
 file_upload_router = r = APIRouter()
 
 logger = logging.getLogger("uvicorn")
 
+# Form fields other than the file are small (e.g. the JSON params)
+MAX_FIELD_SIZE = 64 * 1024
+
 
 class FileUploadRequest(BaseModel):
     base64: str
@@ -18,16 +35,187 @@ class FileUploadRequest(BaseModel):
     params: Any = None
 
 
+class MultipartUpload:
+    """
+    Streaming multipart/form-data parser for the upload request.
+    The `file` part is written to disk as it arrives, the other parts
+    (`params`, as JSON) are small and kept in memory.
+    """
+
+    def __init__(self, boundary: bytes):
+        from multipart.multipart import MultipartParser
+
+        self.document_file: Optional[DocumentFile] = None
+        self.fields: Dict[str, bytes] = {}
+        self._writer: Optional[UploadWriter] = None
+        self._field_name: Optional[str] = None
+        self._header_field = b""
+        self._header_value = b""
+        self._headers: Dict[bytes, bytes] = {}
+        self._parser = MultipartParser(
+            boundary,
+            callbacks={
+                "on_part_begin": self._on_part_begin,
+                "on_part_data": self._on_part_data,
+                "on_part_end": self._on_part_end,
+                "on_header_field": self._on_header_field,
+                "on_header_value": self._on_header_value,
+                "on_header_end": self._on_header_end,
+                "on_headers_finished": self._on_headers_finished,
+            },
+        )
+
+    def _on_part_begin(self) -> None:
+        self._headers = {}
+        self._field_name = None
+
+    def _on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def _on_header_end(self) -> None:
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self) -> None:
+        from multipart.multipart import parse_options_header
+
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        self._field_name = options.get(b"name", b"").decode("utf-8")
+        file_name = options.get(b"filename")
+        if self._field_name == "file" and file_name:
+            if self._writer is not None:
+                raise HTTPException(
+                    status_code=400, detail="Only one file can be uploaded per request"
+                )
+            self._writer = UploadWriter(file_name.decode("utf-8"))
+        else:
+            self.fields[self._field_name] = b""
+
+    def _on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._field_name == "file" and self._writer is not None:
+            self._writer.write(data[start:end])
+        else:
+            self.fields[self._field_name] += data[start:end]
+            if len(self.fields[self._field_name]) > MAX_FIELD_SIZE:
+                raise HTTPException(
+                    status_code=413, detail=f"Form field {self._field_name} is too large"
+                )
+
+    def _on_part_end(self) -> None:
+        if self._field_name == "file" and self._writer is not None:
+            self.document_file = self._writer.close()
+
+    async def receive(self, request: Request) -> None:
+        async for chunk in request.stream():
+            self._parser.write(chunk)
+        self._parser.finalize()
+
+    def abort(self) -> None:
+        """
+        Drop the file of a failed request, whether partially written or stored.
+        """
+        if self._writer is not None:
+            self._writer.abort()
+
+    @property
+    def params(self) -> Any:
+        raw = self.fields.get("params")
+        if not raw:
+            return None
+        try:
+            return json.loads(raw)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=f"Invalid params: {e}")
+
+
+async def _upload_multipart(request: Request) -> UploadJob:
+    from multipart.exceptions import MultipartParseError
+    from multipart.multipart import parse_options_header
+
+    _, options = parse_options_header(request.headers["content-type"])
+    boundary = options.get(b"boundary")
+    if not boundary:
+        raise HTTPException(status_code=400, detail="Missing multipart boundary")
+    upload = MultipartUpload(boundary)
+    try:
+        try:
+            await upload.receive(request)
+        except MultipartParseError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid multipart body: {e}")
+        if upload.document_file is None:
+            raise HTTPException(status_code=400, detail="Missing file field")
+        params = upload.params
+        logger.info(f"Processing file: {upload.document_file.name}")
+        return await run_in_threadpool(
+            get_upload_jobs().submit, upload.document_file, params
+        )
+    except BaseException:
+        upload.abort()
+        raise
+
+
+async def _upload_base64(request: Request) -> UploadJob:
+    try:
+        body = FileUploadRequest.model_validate(await request.json())
+    except (ValidationError, ValueError) as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    logger.info(f"Processing file: {body.name}")
+    writer = await run_in_threadpool(
+        FileService.write_private_file, body.name, body.base64
+    )
+    try:
+        document_file = await run_in_threadpool(writer.close)
+        return await run_in_threadpool(
+            get_upload_jobs().submit, document_file, body.params
+        )
+    except BaseException:
+        await run_in_threadpool(writer.abort)
+        raise
+
+
 @r.post("")
-def upload_file(request: FileUploadRequest) -> DocumentFile:
+async def upload_file(request: Request) -> UploadResponse:
     """
     To upload a private file from the chat UI.
+    multipart/form-data requests (a `file` part and an optional JSON `params` part)
+    are streamed to disk; JSON requests with the file as a base64 data URL
+    (`FileUploadRequest`) are still accepted.
+    The file is indexed in the background: the response is the uploaded file with
+    the id and status of its job, polled with `GET /{job_id}` until it is done and
+    `file.refs` holds the document ids.
     """
+    content_type = request.headers.get("content-type", "")
     try:
-        logger.info(f"Processing file: {request.name}")
-        return FileService.process_private_file(
-            request.name, request.base64, request.params
-        )
+        if content_type.startswith("multipart/form-data"):
+            job = await _upload_multipart(request)
+        else:
+            job = await _upload_base64(request)
+        return UploadResponse.from_job(job)
+    except HTTPException:
+        raise
+    except FileTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UnsupportedFileError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except InvalidUploadError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except TooManyUploadsError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"Error processing file: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Error processing file")
+
+
+@r.get("/{job_id}")
+def get_upload_job(job_id: str) -> UploadJob:
+    """
+    Status of an upload: queued, parsing, embedding, done or failed.
+    """
+    job = get_upload_jobs().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Upload job not found")
+    return job
@@ -4,8 +4,8 @@ import re
 from typing import List, Optional
 
 from app.api.routers.models import Message
+from app.settings import get_stage_llm
 from llama_index.core.prompts import PromptTemplate
-from llama_index.core.settings import Settings
 
 logger = logging.getLogger("uvicorn")
 
@@ -51,7 +51,7 @@ class NextQuestionSuggestion:
 
             # Call the LLM and parse questions from the output
             prompt = prompt_template.format(conversation=conversation)
-            output = await Settings.llm.acomplete(prompt)
+            output = await get_stage_llm("suggestion").acomplete(prompt)
             questions = cls._extract_questions(output.text)
 
             return questions
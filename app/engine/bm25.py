@@ -2,13 +2,23 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+import copy
 import logging
 import os
-from llama_index.core.storage.docstore import SimpleDocumentStore
-from llama_index.core import Document
+from typing import List, Optional
+
+import bm25s
+import numpy as np
 from llama_index.retrievers.bm25 import BM25Retriever
 from llama_index.core.node_parser import SentenceSplitter
+from llama_index.core.schema import NodeWithScore, QueryBundle
 from llama_index.core.settings import Settings
+from llama_index.core.vector_stores.types import MetadataFilters
+from llama_index.core.vector_stores.utils import metadata_dict_to_node
+
+from app.engine.dedup import DEDUP_THRESHOLD, MinHashIndex, apply_dedup_index
+from app.engine.docstore import get_doc_store
+from app.engine.query_filter import metadata_matches
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger()
@@ -18,23 +28,80 @@ STORAGE_DIR = os.getenv("STORAGE_DIR", "storage")
 BM25_PATH = os.getenv("BM25_PATH", os.path.join(STORAGE_DIR, "bm25"))
 top_k = int(os.getenv("TOP_K", 2))
 
-def get_bm25_retriever():
-    docstore = SimpleDocumentStore.from_persist_dir(STORAGE_DIR)
 
-    documents = []
-    for doc_id, doc_data in docstore.docs.items():
-        document = Document(
-            text=doc_data.text,
-            id_=doc_data.id_,
-            metadata=doc_data.metadata if doc_data.metadata else {}  
+class FilteredBM25Retriever(BM25Retriever):
+    """
+    BM25Retriever that only scores the corpus entries matching metadata filters,
+    using a bm25s weight mask, so filtered questions select candidates from a
+    slice of the corpus instead of post-filtering the top results.
+    """
+
+    filters: Optional[MetadataFilters] = None
+
+    def with_filters(self, filters: Optional[MetadataFilters]) -> "FilteredBM25Retriever":
+        """Return a shallow copy sharing the index, with the given filters."""
+        retriever = copy.copy(self)
+        retriever.filters = filters
+        return retriever
+
+    def _weight_mask(self) -> np.ndarray:
+        return np.array(
+            [
+                1.0 if isinstance(entry, dict) and metadata_matches(entry, self.filters) else 0.0
+                for entry in self.corpus
+            ]
         )
-        document.metadata["private"] = "false"
-        documents.append(document)
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        if self.filters is None:
+            return super()._retrieve(query_bundle)
+
+        weight_mask = self._weight_mask()
+        if not weight_mask.any():
+            return []
+        tokenized_query = bm25s.tokenize(
+            query_bundle.query_str,
+            stemmer=self.stemmer if not self.skip_stemming else None,
+            token_pattern=self.token_pattern,
+            show_progress=self._verbose,
+        )
+        indexes, scores = self.bm25.retrieve(
+            tokenized_query,
+            k=min(self.similarity_top_k, len(self.corpus)),
+            show_progress=self._verbose,
+            weight_mask=weight_mask,
+        )
+
+        nodes: List[NodeWithScore] = []
+        for idx, score in zip(indexes[0], scores[0]):
+            # Masked out entries come back with a zero score when few entries match
+            if score <= 0:
+                continue
+            node_dict = idx if isinstance(idx, dict) else self.corpus[int(idx)]
+            nodes.append(NodeWithScore(node=metadata_dict_to_node(node_dict), score=float(score)))
+        return nodes
+
+
+def get_bm25_retriever(dedup_index: Optional[MinHashIndex] = None):
+    docstore = get_doc_store()
+
+    documents = []
+    for doc_data in docstore.iter_documents():
+        # Files uploaded in the chat are private, the vector store filters them by doc id
+        if doc_data.metadata.get("private") == "true":
+            continue
+        # The stored document keeps its excluded metadata keys, so it is split into
+        # the same chunks as during ingestion
+        doc_data.metadata["private"] = "false"
+        documents.append(doc_data)
 
     splitter = SentenceSplitter(
         chunk_size=Settings.chunk_size,
         chunk_overlap=Settings.chunk_overlap)
     nodes = splitter.get_nodes_from_documents(documents)
+    if DEDUP_THRESHOLD:
+        # Near-duplicate chunks are not embedded, keep the same ones out of BM25
+        nodes = apply_dedup_index(nodes, dedup_index or MinHashIndex())
 
 
     if nodes:
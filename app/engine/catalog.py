@@ -0,0 +1,272 @@
+import json
+import logging
+import os
+import re
+import threading
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional
+
+from llama_index.core.base.base_retriever import BaseRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle, TextNode
+
+from app.engine.periods import (
+    extract_period,
+    month_full_name,
+    normalize_text,
+    period_from_path,
+)
+
+logger = logging.getLogger(__name__)
+
+STORAGE_DIR = os.getenv("STORAGE_DIR", "storage")
+CATALOG_PATH = os.getenv(
+    "DOCUMENT_CATALOG_PATH", os.path.join(STORAGE_DIR, "document_catalog.json")
+)
+# Maximum number of catalog entries put in the prompt for one question
+CATALOG_MAX_RESULTS = int(os.getenv("CATALOG_MAX_RESULTS", "50"))
+CATALOG_FILE_NAME = "Catálogo de documentos"
+
+# A catalog question asks which documents exist, e.g. "quais manuais existem em março de 2023?"
+_LISTING_PATTERN = re.compile(
+    r"\b(quais|liste|listar|lista|existem|existe|ha|havia|temos|tem|quantos|quantas|"
+    r"which|list|what)\b"
+)
+_DOCUMENT_NOUN_PATTERN = re.compile(
+    r"\b(manuais|documentos|arquivos|mps|migs|organogramas|normativos|"
+    r"manuals|documents|files)\b"
+)
+# Questions about the content of documents go through retrieval
+_TOPIC_PATTERN = re.compile(
+    r"\b(sobre|falam|fala|tratam|trata|explicam|explica|dizem|diz|conteudo|"
+    r"about|regarding|explain|say)\b"
+)
+_ALL_DOCUMENTS_PATTERN = re.compile(r"\b(todos|todas|disponiveis|all|available)\b")
+_FILE_TYPE_PATTERN = re.compile(r"\b(pdf|docx?|xlsx?|csv|txt|pptx?)\b")
+
+
+@dataclass
+class CatalogEntry:
+    file_name: str
+    # Path relative to the data dir
+    path: str
+    # Lowercase file extension without the dot
+    type: str
+    year: Optional[str] = None
+    month: Optional[str] = None
+
+
+@dataclass
+class CatalogQuery:
+    year: Optional[str] = None
+    month: Optional[str] = None
+    file_type: Optional[str] = None
+
+    def describe(self) -> str:
+        parts = []
+        if self.month:
+            parts.append(month_full_name(self.month))
+        if self.year:
+            parts.append(self.year)
+        description = " de ".join(parts) if parts else "todos os períodos"
+        if self.file_type:
+            description += f", tipo {self.file_type}"
+        return description
+
+
+def parse_catalog_query(question: str) -> Optional[CatalogQuery]:
+    """
+    Detect questions that only ask which documents exist (optionally in a period),
+    which are answered from the catalog instead of dense retrieval.
+    Return None for any other question.
+    """
+    text = normalize_text(question)
+    if not (_LISTING_PATTERN.search(text) and _DOCUMENT_NOUN_PATTERN.search(text)):
+        return None
+    if _TOPIC_PATTERN.search(text):
+        return None
+
+    query = CatalogQuery()
+    period = extract_period(question)
+    if period is not None:
+        if period.year is not None:
+            query.year = f"{period.year:04d}"
+        if period.month is not None:
+            query.month = f"{period.month:02d}"
+    type_match = _FILE_TYPE_PATTERN.search(text)
+    if type_match:
+        query.file_type = type_match.group(1)
+
+    # Without a period or an explicit "all documents", the question is too vague
+    # to be a catalog listing
+    if not (query.year or query.month or _ALL_DOCUMENTS_PATTERN.search(text)):
+        return None
+    return query
+
+
+class DocumentCatalog:
+    """
+    Structured index of the files in the data dir (name, year, month, path, type),
+    persisted as JSON. Replaces the synthetic "Lista de documentos" document that
+    used to be chunked and embedded with the corpus.
+    """
+
+    def __init__(self, entries: Optional[List[CatalogEntry]] = None):
+        self.entries = entries or []
+
+    @classmethod
+    def build(cls, directory_path: str) -> "DocumentCatalog":
+        entries = []
+        for root, dirs, files in os.walk(directory_path):
+            # Skip hidden files and folders (e.g. partial downloads)
+            dirs[:] = [d for d in dirs if not d.startswith(".")]
+            relative_root = os.path.relpath(root, directory_path)
+            for file_name in files:
+                if file_name.startswith("."):
+                    continue
+                path = os.path.normpath(os.path.join(relative_root, file_name))
+                year, month = period_from_path(path) or (None, None)
+                entries.append(
+                    CatalogEntry(
+                        file_name=file_name,
+                        path=path,
+                        type=os.path.splitext(file_name)[1].lstrip(".").lower(),
+                        year=year,
+                        month=month,
+                    )
+                )
+        entries.sort(key=lambda e: (e.year or "", e.month or "", e.file_name))
+        return cls(entries)
+
+    @classmethod
+    def load(cls, path: str = CATALOG_PATH) -> "DocumentCatalog":
+        if not os.path.exists(path):
+            return cls()
+        with open(path, "r", encoding="utf-8") as f:
+            return cls([CatalogEntry(**entry) for entry in json.load(f)])
+
+    def persist(self, path: str = CATALOG_PATH) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump([asdict(entry) for entry in self.entries], f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        logger.info(f"Document catalog with {len(self.entries)} files persisted to {path}")
+
+    def query(
+        self,
+        year: Optional[str] = None,
+        month: Optional[str] = None,
+        file_type: Optional[str] = None,
+    ) -> List[CatalogEntry]:
+        return [
+            entry
+            for entry in self.entries
+            if (year is None or entry.year == year)
+            and (month is None or entry.month == month)
+            and (file_type is None or entry.type.startswith(file_type))
+        ]
+
+    def periods(self, year: Optional[str] = None) -> List[str]:
+        """Return the YYYY-MM periods that have files, optionally within a year."""
+        return sorted(
+            {
+                f"{entry.year}-{entry.month}"
+                for entry in self.entries
+                if entry.year and (year is None or entry.year == year)
+            }
+        )
+
+    def answer(self, query: CatalogQuery) -> str:
+        """
+        Render the entries matching the query as a compact context for the LLM.
+        """
+        entries = self.query(query.year, query.month, query.file_type)
+        description = query.describe()
+        if not entries:
+            lines = [f"Nenhum documento encontrado no catálogo para {description}."]
+            periods = self.periods(query.year)
+            if periods:
+                lines.append(
+                    "Períodos com documentos: "
+                    + ", ".join(
+                        f"{month_full_name(p[5:])} de {p[:4]}" for p in periods
+                    )
+                    + "."
+                )
+            return "\n".join(lines)
+
+        lines = [f"Catálogo de documentos para {description}: {len(entries)} arquivo(s)."]
+        for entry in entries[:CATALOG_MAX_RESULTS]:
+            period = (
+                f"{month_full_name(entry.month)} de {entry.year}"
+                if entry.year
+                else "sem data"
+            )
+            lines.append(f"- {entry.file_name} ({period}, {entry.type})")
+        if len(entries) > CATALOG_MAX_RESULTS:
+            lines.append(f"... e mais {len(entries) - CATALOG_MAX_RESULTS} arquivo(s).")
+        return "\n".join(lines)
+
+
+_catalog_lock = threading.Lock()
+_catalog_cache: Dict[str, Any] = {"mtime_ns": None, "catalog": DocumentCatalog()}
+
+
+def get_catalog(path: str = CATALOG_PATH) -> DocumentCatalog:
+    """
+    Return the persisted catalog, reloading it only when the file changed.
+    The chat engine is rebuilt per request, so the catalog is kept per process.
+    """
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return DocumentCatalog()
+    with _catalog_lock:
+        if _catalog_cache["mtime_ns"] != mtime_ns:
+            _catalog_cache["catalog"] = DocumentCatalog.load(path)
+            _catalog_cache["mtime_ns"] = mtime_ns
+        return _catalog_cache["catalog"]
+
+
+class CatalogRetriever(BaseRetriever):
+    """
+    Answer catalog questions ("quais manuais existem em março de 2023?") with a
+    single node built from the catalog, without calling the wrapped retriever.
+    Any other question is delegated to the wrapped retriever.
+    """
+
+    def __init__(
+        self,
+        retriever: BaseRetriever,
+        catalog: Optional[DocumentCatalog] = None,
+        **kwargs: Any,
+    ):
+        super().__init__(**kwargs)
+        self._retriever = retriever
+        self._catalog = catalog
+
+    def _catalog_nodes(self, query_bundle: QueryBundle) -> Optional[List[NodeWithScore]]:
+        catalog = self._catalog or get_catalog()
+        if not catalog.entries:
+            return None
+        query = parse_catalog_query(query_bundle.query_str)
+        if query is None:
+            return None
+        logger.info(f"Answering from the document catalog: {query}")
+        node = TextNode(
+            text=catalog.answer(query),
+            metadata={"file_name": CATALOG_FILE_NAME, "private": "false"},
+        )
+        return [NodeWithScore(node=node, score=1.0)]
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        nodes = self._catalog_nodes(query_bundle)
+        if nodes is not None:
+            return nodes
+        return self._retriever.retrieve(query_bundle)
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        nodes = self._catalog_nodes(query_bundle)
+        if nodes is not None:
+            return nodes
+        return await self._retriever.aretrieve(query_bundle)
@@ -0,0 +1,139 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+from typing import Any, List, Optional, Tuple
+
+from cachetools import TTLCache
+from llama_index.core.base.llms.generic_utils import messages_to_history_str
+from llama_index.core.chat_engine import CondensePlusContextChatEngine
+from llama_index.core.llms import LLM, ChatMessage
+
+logger = logging.getLogger("uvicorn")
+
+# Words that usually point back to something said earlier in the conversation.
+# If a question contains none of them it can be sent to the retriever as is.
+_FOLLOW_UP_PATTERN = re.compile(
+    r"\b("
+    r"ele|ela|eles|elas|dele|dela|deles|delas|nele|nela|neles|nelas|"
+    r"isso|isto|disso|disto|nisso|nisto|aquilo|daquilo|naquilo|"
+    r"esse|essa|esses|essas|desse|dessa|desses|dessas|nesse|nessa|nesses|nessas|"
+    r"este|esta|estes|estas|deste|desta|destes|destas|neste|nesta|nestes|nestas|"
+    r"aquele|aquela|aqueles|aquelas|daquele|daquela|naquele|naquela|"
+    r"mesmo|mesma|anterior|acima|"
+    r"it|its|this|that|these|those|they|them|their|he|she|him|her|"
+    r"above|previous|same"
+    r")\b",
+    re.IGNORECASE,
+)
+# Short continuations such as "e o de 2022?" or "and for March?"
+_CONTINUATION_PATTERN = re.compile(
+    r"^\s*(e|mas|também|tambem|and|but|also|what about|e quanto|e sobre)\b",
+    re.IGNORECASE,
+)
+_MIN_SELF_CONTAINED_WORDS = 4
+
+# Cache condensed questions across requests; the chat engine is rebuilt per request
+_condense_cache: TTLCache = TTLCache(
+    maxsize=int(os.getenv("CONDENSE_CACHE_SIZE", "1024")),
+    ttl=int(os.getenv("CONDENSE_CACHE_TTL", "3600")),
+)
+# cachetools caches are not thread-safe and requests run on several threads
+_condense_cache_lock = threading.Lock()
+
+
+def is_self_contained(question: str) -> bool:
+    """
+    Cheap heuristic to decide whether a question can be understood without
+    the chat history, so the condense LLM call can be skipped.
+    """
+    words = question.split()
+    if len(words) < _MIN_SELF_CONTAINED_WORDS:
+        return False
+    if _CONTINUATION_PATTERN.search(question):
+        return False
+    return _FOLLOW_UP_PATTERN.search(question) is None
+
+
+def _cache_key(chat_history_str: str, question: str) -> str:
+    history_hash = hashlib.sha256(chat_history_str.encode("utf-8")).hexdigest()
+    return f"{history_hash}:{question.strip()}"
+
+
+def _get_cached(key: str) -> Optional[str]:
+    with _condense_cache_lock:
+        return _condense_cache.get(key)
+
+
+def _set_cached(key: str, condensed: str) -> None:
+    with _condense_cache_lock:
+        _condense_cache[key] = condensed
+
+
+class CachedCondensePlusContextChatEngine(CondensePlusContextChatEngine):
+    """
+    CondensePlusContextChatEngine with a cheaper condensation stage:
+    - skips the LLM when there is no history or the question is self-contained
+    - caches condensed questions keyed by (history hash, question)
+    - uses a separate (usually smaller) LLM for condensation
+    """
+
+    def __init__(
+        self,
+        *args: Any,
+        condense_llm: Optional[LLM] = None,
+        **kwargs: Any,
+    ):
+        super().__init__(*args, **kwargs)
+        self._condense_llm = condense_llm or self._llm
+
+    def _get_fast_path(
+        self, chat_history: List[ChatMessage], latest_message: str
+    ) -> Optional[str]:
+        if self._skip_condense or len(chat_history) == 0:
+            return latest_message
+        if is_self_contained(latest_message):
+            logger.debug("Skipping condense for self-contained question")
+            return latest_message
+        return None
+
+    def _prepare_condense(
+        self, chat_history: List[ChatMessage], latest_message: str
+    ) -> Tuple[Optional[str], str, str]:
+        """
+        Returns the condensed question if it is known without calling the LLM,
+        otherwise None, along with the cache key and the LLM input.
+        """
+        fast_path = self._get_fast_path(chat_history, latest_message)
+        if fast_path is not None:
+            return fast_path, "", ""
+
+        chat_history_str = messages_to_history_str(chat_history)
+        key = _cache_key(chat_history_str, latest_message)
+        cached = _get_cached(key)
+        if cached is not None:
+            return cached, key, ""
+
+        llm_input = self._condense_prompt_template.format(
+            chat_history=chat_history_str, question=latest_message
+        )
+        return None, key, llm_input
+
+    def _condense_question(
+        self, chat_history: List[ChatMessage], latest_message: str
+    ) -> str:
+        condensed, key, llm_input = self._prepare_condense(chat_history, latest_message)
+        if condensed is None:
+            condensed = str(self._condense_llm.complete(llm_input))
+            _set_cached(key, condensed)
+        return condensed
+
+    async def _acondense_question(
+        self, chat_history: List[ChatMessage], latest_message: str
+    ) -> str:
+        condensed, key, llm_input = self._prepare_condense(chat_history, latest_message)
+        if condensed is None:
+            condensed = str(await self._condense_llm.acomplete(llm_input))
+            _set_cached(key, condensed)
+        return condensed
@@ -0,0 +1,572 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from llama_index.core.schema import BaseNode, MetadataMode, TransformComponent
+from pydantic import Field, PrivateAttr
+
+from app.engine.periods import linked_period_key
+
+logger = logging.getLogger(__name__)
+
+STORAGE_DIR = os.getenv("STORAGE_DIR", "storage")
+# Estimated Jaccard similarity above which a chunk is a near duplicate, 0 disables
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.9"))
+DEDUP_INDEX_PATH = os.getenv(
+    "DEDUP_INDEX_PATH", os.path.join(STORAGE_DIR, "minhash_index.sqlite3")
+)
+DEDUP_REPORT_PATH = os.getenv(
+    "DEDUP_REPORT_PATH", os.path.join(STORAGE_DIR, "dedup_report.json")
+)
+
+NUM_PERM = 128
+SHINGLE_SIZE = 5
+# Shorter chunks (titles, page footers...) are never treated as duplicates
+MIN_WORDS = 20
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+@lru_cache(maxsize=None)
+def _permutations(num_perm: int, seed: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+    rng = np.random.RandomState(seed)
+    a = rng.randint(1, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+    b = rng.randint(0, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+    return a, b
+
+
+def minhash_signature(text: str, num_perm: int = NUM_PERM) -> Optional[np.ndarray]:
+    """
+    MinHash signature of the word 5-shingles of a text, None if the text is too short.
+    """
+    words = _WORD_PATTERN.findall(text.lower())
+    if len(words) < MIN_WORDS:
+        return None
+    shingles = {
+        " ".join(words[i : i + SHINGLE_SIZE])
+        for i in range(len(words) - SHINGLE_SIZE + 1)
+    }
+    hashes = np.array(
+        [
+            int.from_bytes(hashlib.sha1(s.encode("utf-8")).digest()[:4], "little")
+            for s in shingles
+        ],
+        dtype=np.uint64,
+    )
+    a, b = _permutations(num_perm)
+    # Same universal hashing as datasketch, the uint64 products wrap around
+    with np.errstate(over="ignore"):
+        permuted = np.bitwise_and((np.outer(hashes, a) + b) % _MERSENNE_PRIME, _MAX_HASH)
+    return permuted.min(axis=0).astype(np.uint32)
+
+
+def chunk_hash(node: BaseNode) -> str:
+    return hashlib.sha1(
+        node.get_content(metadata_mode=MetadataMode.NONE).encode("utf-8")
+    ).hexdigest()
+
+
+@lru_cache(maxsize=None)
+def lsh_bands(threshold: float, num_perm: int = NUM_PERM) -> Tuple[int, int]:
+    """
+    Pick the (bands, rows) split of the signature that minimizes the false positive
+    and false negative probability mass around `threshold`.
+    """
+    s = np.linspace(0, 1, 501)
+    best, best_error = (1, num_perm), float("inf")
+    for bands in range(1, num_perm + 1):
+        for rows in range(1, num_perm // bands + 1):
+            p = 1 - (1 - s**rows) ** bands
+            error = np.mean(np.where(s < threshold, p, 1 - p))
+            if error < best_error:
+                best, best_error = (bands, rows), error
+    return best
+
+
+class MinHashIndex:
+    """
+    LSH index of chunk MinHash signatures stored in SQLite, so chunks ingested in
+    previous runs are found too. Only canonical chunks are put in the LSH buckets;
+    duplicates are kept with a link to their canonical chunk and their period.
+    Writes are only visible to other connections after `commit`.
+    """
+
+    def __init__(
+        self,
+        path: str = DEDUP_INDEX_PATH,
+        threshold: float = DEDUP_THRESHOLD,
+        num_perm: int = NUM_PERM,
+    ):
+        self.path = path
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands, self.rows = lsh_bands(threshold, num_perm)
+        self._lock = threading.Lock()
+        # Canonical chunk id -> periods of duplicates linked or unlinked since the last commit
+        self._changed_links: Dict[str, Set[str]] = {}
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        # Documents with chunks skipped by an index from before chunk hashes were stored
+        self.legacy_duplicate_doc_ids = self._migrate_legacy_index()
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS signatures (
+                node_id TEXT PRIMARY KEY,
+                doc_id TEXT NOT NULL,
+                signature BLOB NOT NULL,
+                canonical_id TEXT,
+                period TEXT NOT NULL DEFAULT '',
+                chunk_hash TEXT NOT NULL DEFAULT ''
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_signatures_doc_id ON signatures (doc_id)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_signatures_canonical_id ON signatures (canonical_id)"
+        )
+        # Bucket hashes depend on the band split, hence on the threshold
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS bands (
+                band INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                node_id TEXT NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_bands_bucket ON bands (band, bucket)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+        self._check_settings()
+        self._conn.commit()
+
+    def _migrate_legacy_index(self) -> List[str]:
+        """
+        Chunks used to be deduplicated within their period only, stored as `scope`:
+        the column already holds the period of every chunk. Signatures written
+        before that have no chunk hash to match the BM25 chunks with, the index is
+        rebuilt and the documents with skipped chunks are returned, to be ingested again.
+        """
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(signatures)")]
+        if not columns or "period" in columns:
+            return []
+        if "scope" in columns:
+            self._conn.execute("ALTER TABLE signatures RENAME COLUMN scope TO period")
+            self._conn.commit()
+            return []
+        doc_ids = [
+            doc_id
+            for (doc_id,) in self._conn.execute(
+                "SELECT DISTINCT doc_id FROM signatures WHERE canonical_id IS NOT NULL"
+            ).fetchall()
+        ]
+        logger.info("Rebuilding the MinHash index with chunk hashes and periods")
+        self._conn.execute("DROP TABLE signatures")
+        self._conn.execute("DROP TABLE IF EXISTS bands")
+        self._conn.commit()
+        return sorted(doc_ids)
+
+    def _check_settings(self) -> None:
+        settings = json.dumps([self.num_perm, self.bands, self.rows])
+        row = self._conn.execute(
+            "SELECT value FROM settings WHERE key = 'lsh'"
+        ).fetchone()
+        if row is not None and row[0] != settings:
+            logger.info("MinHash LSH settings changed, rebuilding the buckets")
+            self._conn.execute("DELETE FROM bands")
+            self._conn.executemany(
+                "INSERT INTO bands (band, bucket, node_id) VALUES (?, ?, ?)",
+                [
+                    bucket
+                    for node_id, signature in self._conn.execute(
+                        "SELECT node_id, signature FROM signatures WHERE canonical_id IS NULL"
+                    ).fetchall()
+                    for bucket in self._buckets(node_id, np.frombuffer(signature, dtype=np.uint32))
+                ],
+            )
+        self._conn.execute(
+            "INSERT OR REPLACE INTO settings (key, value) VALUES ('lsh', ?)", (settings,)
+        )
+
+    def _buckets(self, node_id: str, signature: np.ndarray) -> List[Tuple[int, int, str]]:
+        buckets = []
+        for band in range(self.bands):
+            chunk = signature[band * self.rows : (band + 1) * self.rows].tobytes()
+            bucket = int.from_bytes(
+                hashlib.blake2b(chunk, digest_size=8).digest(), "little", signed=True
+            )
+            buckets.append((band, bucket, node_id))
+        return buckets
+
+    def find_canonical(self, signature: np.ndarray) -> Optional[Tuple[str, str, float]]:
+        """
+        Return the (node id, doc id, similarity) of the most similar canonical chunk
+        at or above the threshold.
+        """
+        buckets = self._buckets("", signature)
+        placeholders = ",".join("(?, ?)" for _ in buckets)
+        params = [value for band, bucket, _ in buckets for value in (band, bucket)]
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT node_id, doc_id, signature FROM signatures WHERE node_id IN "
+                f"(SELECT node_id FROM bands WHERE (band, bucket) IN (VALUES {placeholders}))",
+                params,
+            ).fetchall()
+        best = None
+        for node_id, doc_id, candidate in rows:
+            similarity = float(np.mean(np.frombuffer(candidate, dtype=np.uint32) == signature))
+            if similarity >= self.threshold and (best is None or similarity > best[2]):
+                best = (node_id, doc_id, similarity)
+        return best
+
+    def add(
+        self,
+        node_id: str,
+        doc_id: str,
+        signature: np.ndarray,
+        canonical_id: Optional[str] = None,
+        period: str = "",
+        chunk_hash: str = "",
+    ) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO signatures "
+                "(node_id, doc_id, signature, canonical_id, period, chunk_hash) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (node_id, doc_id, signature.tobytes(), canonical_id, period, chunk_hash),
+            )
+            if canonical_id is None:
+                self._conn.executemany(
+                    "INSERT INTO bands (band, bucket, node_id) VALUES (?, ?, ?)",
+                    self._buckets(node_id, signature),
+                )
+            else:
+                self._track_link(canonical_id, period)
+
+    def _track_link(self, canonical_id: str, period: str) -> None:
+        if period:
+            self._changed_links.setdefault(canonical_id, set()).add(period)
+
+    def remove_documents(self, doc_ids: Iterable[str]) -> None:
+        """
+        Remove the chunks of the given documents. The duplicates of their canonical
+        chunks are unlinked until `relink` finds them another canonical chunk.
+        """
+        doc_ids = list(doc_ids)
+        with self._lock:
+            for i in range(0, len(doc_ids), 500):
+                batch = doc_ids[i : i + 500]
+                placeholders = ",".join("?" * len(batch))
+                for canonical_id, period in self._conn.execute(
+                    "SELECT canonical_id, period FROM signatures "
+                    f"WHERE doc_id IN ({placeholders}) AND canonical_id != ''",
+                    batch,
+                ).fetchall():
+                    self._track_link(canonical_id, period)
+                canonical_ids = [
+                    node_id
+                    for (node_id,) in self._conn.execute(
+                        f"SELECT node_id FROM signatures WHERE doc_id IN ({placeholders}) "
+                        "AND canonical_id IS NULL",
+                        batch,
+                    ).fetchall()
+                ]
+                for j in range(0, len(canonical_ids), 500):
+                    nodes = canonical_ids[j : j + 500]
+                    node_placeholders = ",".join("?" * len(nodes))
+                    self._conn.execute(
+                        "UPDATE signatures SET canonical_id = '' "
+                        f"WHERE canonical_id IN ({node_placeholders})",
+                        nodes,
+                    )
+                    self._conn.execute(
+                        f"DELETE FROM bands WHERE node_id IN ({node_placeholders})", nodes
+                    )
+                self._conn.execute(
+                    f"DELETE FROM signatures WHERE doc_id IN ({placeholders})", batch
+                )
+
+    def relink(self) -> List[str]:
+        """
+        Link the duplicates of removed chunks to another canonical chunk, e.g. the
+        same chunk of the document ingested again. The ones without a canonical
+        chunk left are removed, and the ids of their documents returned, as those
+        chunks are no longer indexed anywhere.
+        """
+        with self._lock:
+            unlinked = self._conn.execute(
+                "SELECT node_id, doc_id, signature, period FROM signatures WHERE canonical_id = ''"
+            ).fetchall()
+        orphaned: Set[str] = set()
+        for node_id, doc_id, signature, period in unlinked:
+            canonical = self.find_canonical(np.frombuffer(signature, dtype=np.uint32))
+            with self._lock:
+                if canonical is None:
+                    orphaned.add(doc_id)
+                    self._conn.execute("DELETE FROM signatures WHERE node_id = ?", (node_id,))
+                    continue
+                self._conn.execute(
+                    "UPDATE signatures SET canonical_id = ? WHERE node_id = ?",
+                    (canonical[0], node_id),
+                )
+                self._track_link(canonical[0], period)
+        return sorted(orphaned)
+
+    def pop_link_changes(self) -> Dict[str, Dict[str, str]]:
+        """
+        Metadata updates of the canonical chunks whose duplicates changed since the
+        last call: a canonical chunk is linked to the periods of its duplicates
+        (see `linked_period_key`), so period filters still match the chunk.
+        """
+        with self._lock:
+            changed, self._changed_links = self._changed_links, {}
+            node_ids = list(changed)
+            own_periods: Dict[str, str] = {}
+            linked: Dict[str, Set[str]] = {}
+            for i in range(0, len(node_ids), 500):
+                batch = node_ids[i : i + 500]
+                placeholders = ",".join("?" * len(batch))
+                own_periods.update(
+                    self._conn.execute(
+                        "SELECT node_id, period FROM signatures "
+                        f"WHERE canonical_id IS NULL AND node_id IN ({placeholders})",
+                        batch,
+                    ).fetchall()
+                )
+                for canonical_id, period in self._conn.execute(
+                    "SELECT canonical_id, period FROM signatures "
+                    f"WHERE canonical_id IN ({placeholders})",
+                    batch,
+                ).fetchall():
+                    linked.setdefault(canonical_id, set()).add(period)
+        updates = {}
+        # Removed canonical chunks are gone from the vector store too
+        for node_id, own_period in own_periods.items():
+            metadata = {
+                linked_period_key(period): "true" if period in linked.get(node_id, ()) else "false"
+                for period in changed[node_id]
+                if period != own_period
+            }
+            if metadata:
+                updates[node_id] = metadata
+        return updates
+
+    def duplicate_chunks(self) -> Set[Tuple[str, str]]:
+        """
+        (doc id, chunk hash) of the chunks skipped as near duplicates.
+        """
+        with self._lock:
+            return set(
+                self._conn.execute(
+                    "SELECT doc_id, chunk_hash FROM signatures WHERE canonical_id IS NOT NULL"
+                ).fetchall()
+            )
+
+    def linked_periods(self) -> Dict[Tuple[str, str], Set[str]]:
+        """
+        (doc id, chunk hash) of the canonical chunks with duplicates of other
+        periods, with the periods of those duplicates.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT c.doc_id, c.chunk_hash, d.period FROM signatures d "
+                "JOIN signatures c ON c.node_id = d.canonical_id "
+                "WHERE d.period != '' AND d.period != c.period"
+            ).fetchall()
+        linked: Dict[Tuple[str, str], Set[str]] = {}
+        for doc_id, hash_, period in rows:
+            linked.setdefault((doc_id, hash_), set()).add(period)
+        return linked
+
+    def commit(self) -> None:
+        with self._lock:
+            self._conn.commit()
+
+    def rollback(self) -> None:
+        with self._lock:
+            self._conn.rollback()
+            self._changed_links = {}
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class MinHashDeduplicator(TransformComponent):
+    """
+    Ingestion transformation, between chunking and embedding, that drops chunks
+    whose estimated Jaccard similarity with an already indexed chunk is at least
+    `threshold`, so revisions of the same file are not embedded and retrieved
+    several times. Only chunks of files are deduplicated. A chunk skipped in favor
+    of a chunk of another period links that chunk to its period, with
+    `on_links_changed` applying the metadata updates to the stored chunks.
+    The chunks of a batch are recorded with `commit` once the batch is stored,
+    or dropped with `rollback` if it fails.
+    """
+
+    threshold: float = Field(default=DEDUP_THRESHOLD)
+
+    _index: MinHashIndex = PrivateAttr()
+    _on_links_changed: Optional[Callable[[Dict[str, Dict[str, str]]], None]] = PrivateAttr(
+        default=None
+    )
+    _duplicates: List[Dict[str, Any]] = PrivateAttr(default_factory=list)
+    _orphaned: Set[str] = PrivateAttr(default_factory=set)
+    _checked: int = PrivateAttr(default=0)
+    _pending_duplicates: List[Dict[str, Any]] = PrivateAttr(default_factory=list)
+    _pending_checked: int = PrivateAttr(default=0)
+
+    def __init__(
+        self,
+        threshold: float = DEDUP_THRESHOLD,
+        index: Optional[MinHashIndex] = None,
+        on_links_changed: Optional[Callable[[Dict[str, Dict[str, str]]], None]] = None,
+        **kwargs: Any,
+    ):
+        super().__init__(threshold=threshold, **kwargs)
+        self._index = index or MinHashIndex(threshold=threshold)
+        self._on_links_changed = on_links_changed
+        self._orphaned.update(self._index.legacy_duplicate_doc_ids)
+
+    @property
+    def index(self) -> MinHashIndex:
+        return self._index
+
+    def pop_orphaned_doc_ids(self) -> List[str]:
+        """
+        Documents with chunks skipped as duplicates of chunks removed since the
+        last call, which have to be ingested again.
+        """
+        orphaned, self._orphaned = self._orphaned, set()
+        return sorted(orphaned)
+
+    def remove_documents(self, doc_ids: Iterable[str]) -> None:
+        self._index.remove_documents(doc_ids)
+        self.commit()
+
+    def commit(self) -> None:
+        """
+        Record the chunks of the last batch, once it is stored.
+        """
+        self._orphaned.update(self._index.relink())
+        links = self._index.pop_link_changes()
+        if links and self._on_links_changed is not None:
+            self._on_links_changed(links)
+        self._index.commit()
+        self._duplicates.extend(self._pending_duplicates)
+        self._checked += self._pending_checked
+        self._clear_pending()
+
+    def rollback(self) -> None:
+        """
+        Forget the chunks of the last batch, which failed to be stored.
+        """
+        self._index.rollback()
+        self._clear_pending()
+
+    def _clear_pending(self) -> None:
+        self._pending_duplicates = []
+        self._pending_checked = 0
+
+    def __call__(self, nodes: Sequence[BaseNode], **kwargs: Any) -> Sequence[BaseNode]:
+        # Chunks of documents ingested again replace their previous version
+        self._index.remove_documents({node.ref_doc_id for node in nodes if node.ref_doc_id})
+        kept = []
+        for node in nodes:
+            signature = (
+                minhash_signature(node.get_content(metadata_mode=MetadataMode.NONE))
+                if node.ref_doc_id and node.metadata.get("file_path")
+                else None
+            )
+            if signature is None:
+                kept.append(node)
+                continue
+            self._pending_checked += 1
+            period = str(node.metadata.get("period", ""))
+            canonical = self._index.find_canonical(signature)
+            if canonical is None:
+                self._index.add(
+                    node.node_id, node.ref_doc_id, signature, period=period,
+                    chunk_hash=chunk_hash(node),
+                )
+                kept.append(node)
+                continue
+            canonical_id, canonical_doc_id, similarity = canonical
+            self._index.add(
+                node.node_id, node.ref_doc_id, signature, canonical_id, period=period,
+                chunk_hash=chunk_hash(node),
+            )
+            self._pending_duplicates.append(
+                {
+                    "doc_id": node.ref_doc_id,
+                    "node_id": node.node_id,
+                    "canonical_doc_id": canonical_doc_id,
+                    "canonical_node_id": canonical_id,
+                    "similarity": round(similarity, 3),
+                    "chars": len(node.get_content(metadata_mode=MetadataMode.NONE)),
+                }
+            )
+        return kept
+
+    def log_stats(self) -> None:
+        logger.info(
+            f"Near-duplicate chunks: {len(self._duplicates)} of {self._checked} "
+            f"checked chunks skipped (threshold {self.threshold})"
+        )
+
+    def write_report(self, path: str = DEDUP_REPORT_PATH) -> None:
+        """
+        Write the chunks skipped during this run with the chunk they duplicate.
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "threshold": self.threshold,
+                    "checked_chunks": self._checked,
+                    "skipped_chunks": len(self._duplicates),
+                    "skipped_chars": sum(d["chars"] for d in self._duplicates),
+                    "duplicates": self._duplicates,
+                },
+                f,
+                ensure_ascii=False,
+                indent=2,
+            )
+        os.replace(tmp_path, path)
+
+
+def apply_dedup_index(nodes: Sequence[BaseNode], index: MinHashIndex) -> List[BaseNode]:
+    """
+    Drop the chunks that the ingestion skipped as near duplicates and link the
+    canonical chunks to the periods of their duplicates, matched by document id
+    and text, so other indexes keep the same chunks as the vector store.
+    """
+    duplicates = index.duplicate_chunks()
+    linked = index.linked_periods()
+    kept = []
+    for node in nodes:
+        key = (node.ref_doc_id, chunk_hash(node))
+        if key in duplicates:
+            continue
+        link_keys = [linked_period_key(period) for period in sorted(linked.get(key, ()))]
+        if link_keys:
+            # Split chunks may share their metadata with the document, copy it
+            node.metadata = {**node.metadata, **{k: "true" for k in link_keys}}
+            node.excluded_embed_metadata_keys = [*node.excluded_embed_metadata_keys, *link_keys]
+            node.excluded_llm_metadata_keys = [*node.excluded_llm_metadata_keys, *link_keys]
+        kept.append(node)
+    return kept
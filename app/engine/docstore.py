@@ -0,0 +1,191 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from llama_index.core.schema import BaseNode
+from llama_index.core.storage.docstore.keyval_docstore import KVDocumentStore
+from llama_index.core.storage.docstore.utils import json_to_doc
+from llama_index.core.storage.kvstore.types import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_COLLECTION,
+    BaseKVStore,
+)
+
+logger = logging.getLogger(__name__)
+
+STORAGE_DIR = os.getenv("STORAGE_DIR", "storage")
+DOCSTORE_PATH = os.getenv(
+    "DOCSTORE_PATH", os.path.join(STORAGE_DIR, "docstore.sqlite3")
+)
+# Written by SimpleDocumentStore before the SQLite docstore, imported once
+LEGACY_DOCSTORE_PATH = os.path.join(STORAGE_DIR, "docstore.json")
+
+
+class SQLiteKVStore(BaseKVStore):
+    """
+    Key-value store in a single SQLite table, one row per (collection, key).
+    Each `put_all` is written in one transaction, so a batch is either fully
+    stored or not at all, and only the rows that changed are written.
+    """
+
+    def __init__(self, path: str = DOCSTORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = self._connect()
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS kv (
+                collection TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                PRIMARY KEY (collection, key)
+            )
+            """
+        )
+        self._conn.commit()
+
+    def _connect(self) -> sqlite3.Connection:
+        # The API server and `generate` may open the store at the same time
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def put(self, key: str, val: dict, collection: str = DEFAULT_COLLECTION) -> None:
+        self.put_all([(key, val)], collection=collection)
+
+    async def aput(
+        self, key: str, val: dict, collection: str = DEFAULT_COLLECTION
+    ) -> None:
+        self.put(key, val, collection=collection)
+
+    def put_all(
+        self,
+        kv_pairs: List[Tuple[str, dict]],
+        collection: str = DEFAULT_COLLECTION,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ) -> None:
+        rows = [(collection, key, json.dumps(val)) for key, val in kv_pairs]
+        if not rows:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO kv (collection, key, value) VALUES (?, ?, ?)",
+                rows,
+            )
+
+    async def aput_all(
+        self,
+        kv_pairs: List[Tuple[str, dict]],
+        collection: str = DEFAULT_COLLECTION,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ) -> None:
+        self.put_all(kv_pairs, collection=collection, batch_size=batch_size)
+
+    def get(self, key: str, collection: str = DEFAULT_COLLECTION) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM kv WHERE collection = ? AND key = ?",
+                (collection, key),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    async def aget(
+        self, key: str, collection: str = DEFAULT_COLLECTION
+    ) -> Optional[dict]:
+        return self.get(key, collection=collection)
+
+    def get_all(self, collection: str = DEFAULT_COLLECTION) -> Dict[str, dict]:
+        return dict(self.iter_collection(collection))
+
+    async def aget_all(self, collection: str = DEFAULT_COLLECTION) -> Dict[str, dict]:
+        return self.get_all(collection=collection)
+
+    def delete(self, key: str, collection: str = DEFAULT_COLLECTION) -> bool:
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "DELETE FROM kv WHERE collection = ? AND key = ?", (collection, key)
+            )
+        return cursor.rowcount > 0
+
+    async def adelete(self, key: str, collection: str = DEFAULT_COLLECTION) -> bool:
+        return self.delete(key, collection=collection)
+
+    def iter_collection(
+        self, collection: str = DEFAULT_COLLECTION, fetch_size: int = 500
+    ) -> Iterator[Tuple[str, dict]]:
+        """
+        Stream the entries of a collection. A separate connection reads a consistent
+        snapshot, so the store can be written while the entries are consumed.
+        """
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                "SELECT key, value FROM kv WHERE collection = ?", (collection,)
+            )
+            while True:
+                rows = cursor.fetchmany(fetch_size)
+                if not rows:
+                    break
+                for key, value in rows:
+                    yield key, json.loads(value)
+        finally:
+            conn.close()
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM kv LIMIT 1").fetchone() is None
+
+
+class SQLiteDocumentStore(KVDocumentStore):
+    """
+    Document store backed by SQLite instead of a JSON file.
+    Documents, hashes and ref doc info are read and written row by row, so nothing
+    is loaded up front and there is nothing left to persist after a write.
+    """
+
+    def __init__(
+        self,
+        path: str = DOCSTORE_PATH,
+        namespace: Optional[str] = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ):
+        self._sqlite_kvstore = SQLiteKVStore(path)
+        super().__init__(self._sqlite_kvstore, namespace=namespace, batch_size=batch_size)
+
+    def persist(self, persist_path: Optional[str] = None, fs=None) -> None:
+        # Every write is already committed
+        pass
+
+    def iter_documents(self) -> Iterator[BaseNode]:
+        """
+        Stream the stored documents without building the whole `docs` dict.
+        """
+        for _, doc_json in self._sqlite_kvstore.iter_collection(self._node_collection):
+            yield json_to_doc(doc_json)
+
+    def import_legacy_docstore(self, json_path: str = LEGACY_DOCSTORE_PATH) -> bool:
+        """
+        Copy the collections of a docstore.json written by SimpleDocumentStore.
+        The JSON file is renamed afterwards so it is imported only once.
+        """
+        from llama_index.core.storage.kvstore.simple_kvstore import SimpleKVStore
+
+        if not os.path.exists(json_path):
+            return False
+        data = SimpleKVStore.from_persist_path(json_path).to_dict()
+        for collection, entries in data.items():
+            self._sqlite_kvstore.put_all(list(entries.items()), collection=collection)
+        os.replace(json_path, f"{json_path}.migrated")
+        logger.info(f"Imported {json_path} into {self._sqlite_kvstore.path}")
+        return True
+
+
+def get_doc_store() -> SQLiteDocumentStore:
+    docstore = SQLiteDocumentStore()
+    if docstore._sqlite_kvstore.is_empty():
+        docstore.import_legacy_docstore()
+    return docstore
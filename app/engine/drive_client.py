@@ -0,0 +1,217 @@
+try:
+    import random
+    from abc import ABC, abstractmethod
+    import threading
+    import time
+    from googleapiclient.discovery import build
+    from googleapiclient.errors import HttpError
+    from googleapiclient.http import MediaIoBaseDownload
+except ImportError as e:
+    # Se faltarem as bibliotecas necessárias, levantamos Exception
+    raise Exception(
+        "Faltam bibliotecas necessárias para o GoogleApiDriveClient. "
+        "Instale-as com:\n\n"
+        "  pip install google-api-python-client google-auth-httplib2 google-auth-oauthlib\n\n"
+        f"Detalhes do erro: {str(e)}"
+    )
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+# Campos pedidos em listagens e no feed de mudanças, suficientes para decidir a sincronização
+FILE_FIELDS = 'id, name, mimeType, parents, trashed, size, md5Checksum, modifiedTime'
+
+
+class RangeNotSatisfiableError(Exception):
+    """O offset pedido na retomada está além do fim do arquivo no Drive (HTTP 416)."""
+
+
+class DriveClient(ABC):
+    """
+    Interface mínima do Google Drive usada pelo GoogleDriveDownloader.
+    Permite trocar a API real por uma implementação local (ex.: um fake em testes).
+
+    Os arquivos são dicts com as chaves de FILE_FIELDS; 'parents' é uma lista de ids.
+    """
+
+    @abstractmethod
+    def list_folder(self, folder_id):
+        """Retorna todos os itens (arquivos/pastas) diretamente em 'folder_id', já paginados."""
+
+    @abstractmethod
+    def get_files_metadata(self, file_ids):
+        """Retorna {file_id: metadados} para os arquivos informados."""
+
+    @abstractmethod
+    def download(self, file_id, fh, chunksize, on_progress=None, offset=0):
+        """
+        Escreve o conteúdo do arquivo em 'fh' a partir do byte 'offset' (retomada),
+        chamando on_progress(bytes) a cada chunk.
+        Levanta RangeNotSatisfiableError se 'offset' passar do fim do arquivo.
+        """
+
+    @abstractmethod
+    def get_start_page_token(self):
+        """Retorna o token a partir do qual o feed de mudanças deve ser lido."""
+
+    @abstractmethod
+    def list_changes(self, page_token):
+        """
+        Retorna (mudanças, novo_start_page_token) desde 'page_token'.
+        Cada mudança tem 'fileId', 'removed' e, se não removida, 'file'.
+        """
+
+
+class _RateLimiter:
+    """
+    Limita o número de requisições por segundo compartilhado entre as threads
+    (token bucket), para ficar dentro da cota por usuário do Drive.
+    """
+
+    def __init__(self, max_qps):
+        self.max_qps = max_qps
+        self._lock = threading.Lock()
+        self._tokens = max_qps
+        self._last = time.monotonic()
+
+    def acquire(self):
+        if not self.max_qps:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.max_qps, self._tokens + (now - self._last) * self.max_qps)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.max_qps
+            time.sleep(wait)
+
+
+def _is_rate_limit_error(error):
+    """Retorna True para respostas 429 ou 403 de limite de taxa do Drive."""
+    if not isinstance(error, HttpError):
+        return False
+    status = error.resp.status
+    if status == 429:
+        return True
+    if status == 403:
+        reason = str(error).lower()
+        return 'ratelimitexceeded' in reason or 'rate limit' in reason
+    return False
+
+
+class GoogleApiDriveClient(DriveClient):
+    """
+    DriveClient sobre a API v3 do Google Drive.
+    - Cada thread usa seu próprio serviço/cliente HTTP (httplib2 não é thread-safe).
+    - Todas as requisições respeitam um limite de QPS compartilhado e são repetidas
+      com backoff exponencial (com jitter) em respostas de limite de taxa.
+    """
+
+    # Máximo de chamadas por requisição ao endpoint de batch do Drive
+    BATCH_SIZE = 100
+
+    def __init__(self, creds, max_qps=10, max_retries=5):
+        self._creds = creds
+        self.max_retries = max_retries
+        self._rate_limiter = _RateLimiter(max_qps)
+        self._local = threading.local()
+
+    def _service(self):
+        service = getattr(self._local, 'service', None)
+        if service is None:
+            service = build("drive", "v3", credentials=self._creds, cache_discovery=False)
+            self._local.service = service
+        return service
+
+    def _execute(self, request_fn):
+        for attempt in range(self.max_retries + 1):
+            self._rate_limiter.acquire()
+            try:
+                return request_fn()
+            except HttpError as e:
+                if not _is_rate_limit_error(e) or attempt == self.max_retries:
+                    raise
+                delay = random.uniform(0, min(64, 2 ** attempt))
+                print(f"Limite de taxa do Drive atingido, nova tentativa em {delay:.1f}s...")
+                time.sleep(delay)
+
+    def list_folder(self, folder_id):
+        items = []
+        page_token = None
+        query = f"'{folder_id}' in parents and trashed=false"
+
+        while True:
+            response = self._execute(self._service().files().list(
+                q=query,
+                spaces='drive',
+                fields=f'nextPageToken, files({FILE_FIELDS})',
+                pageSize=1000,
+                pageToken=page_token
+            ).execute)
+            items.extend(response.get('files', []))
+            page_token = response.get('nextPageToken', None)
+            if not page_token:
+                break
+        return items
+
+    def get_files_metadata(self, file_ids):
+        results = {}
+
+        def callback(request_id, response, exception):
+            if exception is None:
+                results[request_id] = response
+
+        service = self._service()
+        for i in range(0, len(file_ids), self.BATCH_SIZE):
+            batch = service.new_batch_http_request(callback=callback)
+            for file_id in file_ids[i:i + self.BATCH_SIZE]:
+                batch.add(
+                    service.files().get(fileId=file_id, fields=FILE_FIELDS),
+                    request_id=file_id
+                )
+            self._execute(batch.execute)
+        return results
+
+    def download(self, file_id, fh, chunksize, on_progress=None, offset=0):
+        request = self._service().files().get_media(fileId=file_id)
+        # Cada chunk é pedido com um cabeçalho Range e fica em memória até ser escrito,
+        # então o chunksize limita a memória usada por download
+        downloader = MediaIoBaseDownload(fh, request, chunksize=chunksize)
+        # MediaIoBaseDownload não expõe um offset inicial; o próximo Range parte de _progress
+        downloader._progress = offset
+        done = False
+        previous_progress = offset
+
+        while not done:
+            try:
+                status, done = self._execute(downloader.next_chunk)
+            except HttpError as e:
+                if e.resp.status == 416:
+                    raise RangeNotSatisfiableError(
+                        f"Offset {offset} além do fim do arquivo {file_id}"
+                    ) from e
+                raise
+            if status and on_progress:
+                current_progress = status.resumable_progress
+                on_progress(current_progress - previous_progress)
+                previous_progress = current_progress
+
+    def get_start_page_token(self):
+        response = self._execute(self._service().changes().getStartPageToken().execute)
+        return response['startPageToken']
+
+    def list_changes(self, page_token):
+        changes = []
+        while True:
+            response = self._execute(self._service().changes().list(
+                pageToken=page_token,
+                spaces='drive',
+                includeRemoved=True,
+                pageSize=1000,
+                fields=f'nextPageToken, newStartPageToken, changes(fileId, removed, file({FILE_FIELDS}))'
+            ).execute)
+            changes.extend(response.get('changes', []))
+            if 'newStartPageToken' in response:
+                return changes, response['newStartPageToken']
+            page_token = response['nextPageToken']
@@ -3,11 +3,13 @@ try:
     import io
     import json
     import hashlib
-    from googleapiclient.discovery import build
-    from googleapiclient.http import MediaIoBaseDownload
+    import re
+    import threading
+    from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
     from google.auth.transport.requests import Request
     from google.oauth2.credentials import Credentials
     from tqdm import tqdm
+    from app.engine.drive_client import FOLDER_MIME_TYPE, GoogleApiDriveClient, RangeNotSatisfiableError
 except ImportError as e:
     # Se faltarem as bibliotecas necessárias, levantamos Exception
     raise Exception(
@@ -17,23 +19,237 @@ except ImportError as e:
         f"Detalhes do erro: {str(e)}"
     )
 
+STORAGE_DIR = os.getenv("STORAGE_DIR", "storage")
+
+
+class LocalHashManifest:
+    """
+    Manifesto persistido com (tamanho, mtime_ns, md5) dos arquivos locais.
+    Um arquivo só é lido novamente para calcular o MD5 quando o tamanho ou o
+    mtime mudaram desde a última execução.
+    """
+
+    HASH_CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+
+    @classmethod
+    def _hash_file(cls, file_path):
+        """Calcula o MD5 lendo o arquivo em blocos de tamanho fixo."""
+        digest = hashlib.md5()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(cls.HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _key(self, file_path):
+        return os.path.abspath(file_path)
+
+    def _cached_md5(self, file_path, stat):
+        entry = self.entries.get(self._key(file_path))
+        if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            return entry['md5']
+        return None
+
+    def update(self, file_path, md5=None):
+        """Registra o arquivo, calculando o MD5 se não for informado."""
+        stat = os.stat(file_path)
+        if md5 is None:
+            md5 = self._cached_md5(file_path, stat) or self._hash_file(file_path)
+        with self._lock:
+            self.entries[self._key(file_path)] = {
+                'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns,
+                'md5': md5,
+            }
+        return md5
+
+    def get_md5(self, file_path):
+        return self.update(file_path)
+
+    def prefetch(self, file_paths, max_workers):
+        """Calcula em paralelo o MD5 dos arquivos que mudaram desde a última execução."""
+        stale = [p for p in file_paths if self._cached_md5(p, os.stat(p)) is None]
+        if not stale:
+            return
+        print(f"Calculando MD5 de {len(stale)} arquivos locais...")
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(self.update, stale))
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.path)
+
+    def move(self, old_path, new_path):
+        """Transfere a entrada de um arquivo renomeado/movido sem recalcular o MD5."""
+        with self._lock:
+            entry = self.entries.pop(self._key(old_path), None)
+            if entry is not None:
+                self.entries[self._key(new_path)] = entry
+
+    def remove(self, file_path):
+        with self._lock:
+            self.entries.pop(self._key(file_path), None)
+
+
+class _HashingWriter(io.RawIOBase):
+    """Repassa as escritas para 'fh' atualizando o hash com os mesmos bytes."""
+
+    def __init__(self, fh, digest):
+        self._fh = fh
+        self._digest = digest
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._digest.update(data)
+        return self._fh.write(data)
+
+
+class DriveSyncState:
+    """
+    Estado persistido da sincronização incremental: a pasta raiz, o token do
+    feed de mudanças (Changes API) e a árvore de pastas/arquivos conhecida,
+    usada para saber se uma mudança pertence à pasta raiz e qual o seu caminho.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.folder_id = None
+        self.page_token = None
+        self.folders = {}  # id -> {'name', 'parent'}
+        self.files = {}    # id -> {'name', 'parent', 'mimeType', 'size', 'md5Checksum', 'modifiedTime'}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.folder_id = data.get('folder_id')
+            self.page_token = data.get('page_token')
+            self.folders = data.get('folders', {})
+            self.files = data.get('files', {})
+
+    def reset(self, folder_id, page_token, items):
+        """Recria o estado a partir de uma listagem completa da pasta raiz."""
+        self.folder_id = folder_id
+        self.page_token = page_token
+        self.folders = {}
+        self.files = {}
+        for item in items:
+            self.add_item(item)
+
+    def add_item(self, item):
+        if item['mimeType'] == FOLDER_MIME_TYPE:
+            self.folders[item['id']] = {'name': item['name'], 'parent': item['parentId']}
+        else:
+            self.files[item['id']] = {
+                'name': item['name'],
+                'parent': item['parentId'],
+                'mimeType': item['mimeType'],
+                **{k: item[k] for k in ('size', 'md5Checksum', 'modifiedTime') if k in item},
+            }
+
+    def in_scope(self, parents):
+        """Retorna o primeiro pai que é a pasta raiz ou uma subpasta conhecida dela."""
+        for parent in parents or []:
+            if parent == self.folder_id or parent in self.folders:
+                return parent
+        return None
+
+    def folder_path(self, folder_id):
+        parts = []
+        while folder_id != self.folder_id:
+            folder = self.folders[folder_id]
+            parts.append(folder['name'])
+            folder_id = folder['parent']
+        return os.path.join(*reversed(parts)) if parts else ''
+
+    def file_info(self, file_id):
+        """Retorna o registro no formato da listagem {id, name, mimeType, path, ...}."""
+        data = self.files[file_id]
+        info = {k: v for k, v in data.items() if k != 'parent'}
+        info.update({'id': file_id, 'path': self.folder_path(data['parent'])})
+        return info
+
+    def descendants(self, folder_id):
+        """Retorna (ids de subpastas, ids de arquivos) abaixo de 'folder_id'."""
+        folder_ids = {folder_id}
+        changed = True
+        while changed:
+            changed = False
+            for fid, folder in self.folders.items():
+                if fid not in folder_ids and folder['parent'] in folder_ids:
+                    folder_ids.add(fid)
+                    changed = True
+        file_ids = [fid for fid, f in self.files.items() if f['parent'] in folder_ids]
+        return folder_ids - {folder_id}, file_ids
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'folder_id': self.folder_id,
+                'page_token': self.page_token,
+                'folders': self.folders,
+                'files': self.files,
+            }, f)
+        os.replace(tmp_path, self.path)
+
+
 class GoogleDriveDownloader:
     """
     Classe para autenticar e baixar arquivos do Google Drive,
     preservando a estrutura de pastas e evitando downloads redundantes.
     - Nunca abrirá navegador se não encontrar token válido (apenas levanta exceção).
     - Pode ler 'credentials.json' e 'token.json' do disco ou das variáveis de ambiente.
+    - Após uma sincronização completa, usa o feed de mudanças do Drive (Changes API)
+      para buscar apenas o que mudou desde a execução anterior.
     """
 
     SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
-    
-    def __init__(self, chunksize=100 * 1024 * 1024):
+
+    def __init__(
+        self,
+        chunksize=int(os.getenv("DRIVE_DOWNLOAD_CHUNK_SIZE", str(8 * 1024 * 1024))),
+        max_workers=int(os.getenv("DRIVE_DOWNLOAD_WORKERS", "8")),
+        max_qps=float(os.getenv("DRIVE_MAX_QPS", "10")),
+        max_retries=int(os.getenv("DRIVE_MAX_RETRIES", "5")),
+        sync_mode=os.getenv("DRIVE_SYNC_MODE", "changes"),
+        client=None,
+    ):
         """
         :param chunksize: Tamanho (em bytes) de cada chunk ao baixar arquivos.
-                          Ex.: 100MB = 100 * 1024 * 1024.
+                          Cada download em andamento mantém até um chunk em memória.
+                          Ex.: 8MB = 8 * 1024 * 1024.
+        :param max_workers: Número de downloads simultâneos.
+        :param max_qps: Máximo de requisições por segundo à API do Drive (0 desativa o limite).
+        :param max_retries: Tentativas em respostas de limite de taxa (403/429).
+        :param sync_mode: 'changes' usa o feed de mudanças quando já houve uma sincronização
+                          completa da mesma pasta; 'full' sempre lista a pasta inteira.
+        :param client: DriveClient a ser usado. Se omitido, autentica e usa a API do Google.
         """
         self.chunksize = chunksize
-        self.service = None
+        self.max_workers = max_workers
+        self.max_qps = max_qps
+        self.max_retries = max_retries
+        self.sync_mode = sync_mode
+        self.client = client
+        self._progress_lock = threading.Lock()
+        self._hash_manifest = LocalHashManifest(
+            os.getenv("DRIVE_MANIFEST_PATH", os.path.join(STORAGE_DIR, "drive_manifest.json"))
+        )
+        self._sync_state = DriveSyncState(
+            os.getenv("DRIVE_SYNC_STATE_PATH", os.path.join(STORAGE_DIR, "drive_sync_state.json"))
+        )
 
     def _get_credentials_from_env_or_file(self):
         """
@@ -113,71 +329,86 @@ class GoogleDriveDownloader:
 
         return creds
 
+
     def authenticate(self):
-        """Cria e armazena o serviço do Drive API nesta instância."""
+        """Cria e armazena o cliente do Drive API nesta instância."""
         creds = self._get_credentials_from_env_or_file()
-        self.service = build("drive", "v3", credentials=creds)
-
-    def _list_files_in_folder(self, folder_id):
-        """Retorna a lista de itens (arquivos/pastas) diretamente em 'folder_id'."""
-        items = []
-        page_token = None
-        query = f"'{folder_id}' in parents and trashed=false"
-
-        while True:
-            response = self.service.files().list(
-                q=query,
-                spaces='drive',
-                fields='nextPageToken, files(id, name, mimeType)',
-                pageToken=page_token
-            ).execute()
-            items.extend(response.get('files', []))
-            page_token = response.get('nextPageToken', None)
-            if not page_token:
-                break
-        return items
-
-    def _get_file_metadata(self, file_id):
+        self.client = GoogleApiDriveClient(creds, max_qps=self.max_qps, max_retries=self.max_retries)
+
+    @staticmethod
+    def _get_file_metadata(file_info):
         """
-        Retorna (size, md5Checksum, modifiedTime) de um arquivo no Drive.
+        Retorna (size, md5Checksum, modifiedTime) de um arquivo a partir dos dados da listagem.
         Se algum campo não existir, retorna valor padrão.
         """
-        data = self.service.files().get(
-            fileId=file_id,
-            fields='size, md5Checksum, modifiedTime'
-        ).execute()
-
-        size = int(data.get('size', 0))
-        md5 = data.get('md5Checksum', '')
-        modified_time = data.get('modifiedTime', '')
+        size = int(file_info.get('size', 0))
+        md5 = file_info.get('md5Checksum', '')
+        modified_time = file_info.get('modifiedTime', '')
         return size, md5, modified_time
 
+    def _fill_missing_metadata(self, files):
+        """
+        Busca os metadados dos arquivos que vieram sem 'size' na listagem
+        (o cliente agrupa as requisições no endpoint de batch do Drive).
+        """
+        # Arquivos nativos do Google (Docs, Planilhas...) não têm tamanho nem MD5
+        missing = [
+            f for f in files
+            if 'size' not in f and not f['mimeType'].startswith('application/vnd.google-apps.')
+        ]
+        if not missing:
+            return
+        metadata = self.client.get_files_metadata([f['id'] for f in missing])
+        for file_info in missing:
+            data = metadata.get(file_info['id'], {})
+            for key in ('size', 'md5Checksum', 'modifiedTime'):
+                if key in data:
+                    file_info[key] = data[key]
+
     def _get_all_items_recursively(self, folder_id, parent_path=''):
         """
-        Percorre recursivamente a pasta (folder_id) no Drive,
-        retornando lista de dicts (id, name, mimeType, path).
+        Percorre a árvore da pasta (folder_id) no Drive em largura, listando várias
+        pastas em paralelo (cada listagem pagina por conta própria),
+        retornando lista de dicts (id, name, mimeType, path, parentId).
         """
         results = []
-        items = self._list_files_in_folder(folder_id)
 
-        for item in items:
-            current_path = os.path.join(parent_path, item['name'])
-            if item['mimeType'] == 'application/vnd.google-apps.folder':
-                results.append({
-                    'id': item['id'],
-                    'name': item['name'],
-                    'mimeType': item['mimeType'],
-                    'path': current_path
-                })
-                sub = self._get_all_items_recursively(item['id'], current_path)
-                results.extend(sub)
-            else:
-                results.append({
-                    'id': item['id'],
-                    'name': item['name'],
-                    'mimeType': item['mimeType'],
-                    'path': parent_path
-                })
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            # Cada subpasta encontrada é listada assim que aparece, sem esperar
+            # o restante do nível atual
+            pending = {executor.submit(self.client.list_folder, folder_id): (folder_id, parent_path)}
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    current_folder_id, current_parent_path = pending.pop(future)
+                    for item in future.result():
+                        current_path = os.path.join(current_parent_path, item['name'])
+                        if item['mimeType'] == FOLDER_MIME_TYPE:
+                            results.append({
+                                'id': item['id'],
+                                'name': item['name'],
+                                'mimeType': item['mimeType'],
+                                'path': current_path,
+                                'parentId': current_folder_id
+                            })
+                            sub = executor.submit(self.client.list_folder, item['id'])
+                            pending[sub] = (item['id'], current_path)
+                        else:
+                            file_info = {
+                                'id': item['id'],
+                                'name': item['name'],
+                                'mimeType': item['mimeType'],
+                                'path': current_parent_path,
+                                'parentId': current_folder_id
+                            }
+                            # Mantém os metadados da listagem para a verificação de sincronização
+                            for key in ('size', 'md5Checksum', 'modifiedTime'):
+                                if key in item:
+                                    file_info[key] = item[key]
+                            results.append(file_info)
+
+        # A ordem de conclusão das listagens varia; ordena para um resultado estável
+        results.sort(key=lambda info: (info['path'], info['name']))
         return results
 
     def _needs_download(self, local_folder, file_info):
@@ -187,11 +418,10 @@ class GoogleDriveDownloader:
         - Se existir, compara tamanho e MD5 (quando disponível).
         - Retorna True se for diferente, False se for idêntico.
         """
-        file_id = file_info['id']
         file_name = file_info['name']
         rel_path = file_info['path']
 
-        drive_size, drive_md5, _ = self._get_file_metadata(file_id)
+        drive_size, drive_md5, _ = self._get_file_metadata(file_info)
         full_local_path = os.path.join(local_folder, rel_path, file_name)
 
         if not os.path.exists(full_local_path):
@@ -202,81 +432,135 @@ class GoogleDriveDownloader:
             return True
 
         if drive_md5:
-            with open(full_local_path, 'rb') as f:
-                local_md5 = hashlib.md5(f.read()).hexdigest()
+            local_md5 = self._hash_manifest.get_md5(full_local_path)
             if local_md5 != drive_md5:
                 return True
 
         return False
 
-    def _download_single_file(self, file_id, file_name, relative_path, progress_bar):
+
+    @staticmethod
+    def _partial_path(file_path, drive_md5):
         """
-        Faz download de um único arquivo do Drive, atualizando a barra de progresso global.
+        Caminho do arquivo temporário de um download, na mesma pasta do destino
+        (para que o rename seja atômico). O nome começa com '.' para ser ignorado
+        pela ingestão e inclui o MD5 do Drive, assim um parcial só é retomado se o
+        conteúdo no Drive não mudou.
         """
-        # Como fizemos 'os.chdir(local_folder)' antes, 'relative_path' pode ser vazio.
-        # Então concatenamos sem o local_folder:
-        file_path = os.path.join(relative_path, file_name)
-
-        # Se o path do diretório for vazio, cai no '.' para evitar WinError 3
-        dir_name = os.path.dirname(file_path) or '.'
-        os.makedirs(dir_name, exist_ok=True)
+        dir_name, file_name = os.path.split(file_path)
+        return os.path.join(dir_name, f".{file_name}.{drive_md5 or 'nomd5'}.part")
 
-        request = self.service.files().get_media(fileId=file_id)
-        with io.FileIO(file_path, 'wb') as fh:
-            downloader = MediaIoBaseDownload(fh, request, chunksize=self.chunksize)
-            done = False
-            previous_progress = 0
-
-            while not done:
-                status, done = downloader.next_chunk()
-                if status:
-                    current_progress = status.resumable_progress
-                    chunk_downloaded = current_progress - previous_progress
-                    previous_progress = current_progress
-                    progress_bar.update(chunk_downloaded)
-
-    def download_from_folder(self, drive_folder_id: str, local_folder: str):
+    @staticmethod
+    def _remove_stale_partials(file_path, keep=None):
         """
-        Método principal para:
-         1. Autenticar sem abrir navegador (usa token local/ambiente).
-         2. Exibir "Iniciando verificação de documentos".
-         3. Listar recursivamente arquivos da pasta do Drive.
-         4. Verificar quais precisam de download.
-         5. Baixar apenas o necessário, com barra de progresso única.
+        Apaga os parciais de 'file_path' de outras versões do arquivo (MD5 diferente
+        do atual no Drive), que nunca mais seriam retomados.
         """
-        print("Iniciando verificação de documentos")
-
-        if not self.service:
-            self.authenticate()
-
-        print("Buscando lista de arquivos no Drive...")
-        all_items = self._get_all_items_recursively(drive_folder_id)
+        dir_name, file_name = os.path.split(file_path)
+        pattern = re.compile(rf"\.{re.escape(file_name)}\.([0-9a-f]{{32}}|nomd5)\.part")
+        if not os.path.isdir(dir_name or '.'):
+            return
+        for entry in os.listdir(dir_name or '.'):
+            path = os.path.join(dir_name, entry)
+            if pattern.fullmatch(entry) and path != keep:
+                os.remove(path)
 
-        # Filtra apenas arquivos (exclui subpastas)
-        all_files = [f for f in all_items if f['mimeType'] != 'application/vnd.google-apps.folder']
+    def _fetch_partial(self, file_id, partial_path, offset, drive_md5, on_progress):
+        """
+        Baixa o arquivo para 'partial_path' a partir de 'offset' e retorna o MD5 do
+        parcial inteiro.
+        """
+        # O MD5 é calculado enquanto o arquivo é gravado; na retomada, os bytes já
+        # baixados são lidos uma vez do disco
+        digest = hashlib.md5()
+        if offset:
+            with open(partial_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(LocalHashManifest.HASH_CHUNK_SIZE), b''):
+                    digest.update(chunk)
+
+        # Um parcial completo (interrompido antes do rename) não precisa de nova requisição
+        if not (offset and digest.hexdigest() == drive_md5):
+            with open(partial_path, 'ab' if offset else 'wb') as f:
+                self.client.download(file_id, _HashingWriter(f, digest), self.chunksize, on_progress, offset=offset)
+        return digest.hexdigest()
+
+    def _download_single_file(self, file_id, file_name, local_folder, relative_path, progress_bar, drive_md5=''):
+        """
+        Faz download de um único arquivo do Drive, atualizando a barra de progresso global.
+        - Grava em um arquivo temporário e só o renomeia para o destino quando o download
+          termina e o MD5 confere, então nunca fica um arquivo truncado no destino.
+        - Retoma downloads parciais de execuções anteriores (requisições com Range).
+          Se o parcial não serve (HTTP 416 ou MD5 final diferente), ele é descartado
+          e o download recomeça do início.
+        Retorna (caminho local, MD5 calculado durante o download).
+        """
+        # Caminho completo, sem mudar o diretório de trabalho do processo
+        # (outras etapas da ingestão rodam em paralelo com o download)
+        file_path = os.path.join(local_folder, relative_path, file_name)
 
-        print("Verificando quais arquivos precisam ser baixados...")
-        files_to_download = []
-        total_size_to_download = 0
-        for info in all_files:
-            if self._needs_download(local_folder, info):
-                drive_size, _, _ = self._get_file_metadata(info['id'])
-                total_size_to_download += drive_size
-                files_to_download.append(info)
-
-        if not files_to_download:
-            print("Nenhum arquivo novo ou atualizado. Tudo sincronizado!")
-            return
+        # Se o path do diretório for vazio, cai no '.' para evitar WinError 3
+        dir_name = os.path.dirname(file_path) or '.'
+        os.makedirs(dir_name, exist_ok=True)
 
+        partial_path = self._partial_path(file_path, drive_md5)
+        self._remove_stale_partials(file_path, keep=partial_path)
+        # Sem MD5 não há como saber se o parcial é da mesma versão do arquivo
+        offset = os.path.getsize(partial_path) if drive_md5 and os.path.exists(partial_path) else 0
+
+        reported = 0
+
+        def on_progress(chunk_downloaded):
+            nonlocal reported
+            reported += chunk_downloaded
+            with self._progress_lock:
+                progress_bar.update(chunk_downloaded)
+
+        if offset:
+            on_progress(offset)
+
+        try:
+            md5 = self._fetch_partial(file_id, partial_path, offset, drive_md5, on_progress)
+        except RangeNotSatisfiableError:
+            if not offset:
+                raise
+            md5 = None
+        if offset and md5 != drive_md5:
+            print(f"Download parcial de {file_path} não confere com o Drive, baixando do início...")
+            os.remove(partial_path)
+            on_progress(-reported)
+            md5 = self._fetch_partial(file_id, partial_path, 0, drive_md5, on_progress)
+
+        if drive_md5 and md5 != drive_md5:
+            os.remove(partial_path)
+            raise Exception(
+                f"MD5 do arquivo baixado não confere com o Drive: {file_path} "
+                f"(esperado {drive_md5}, obtido {md5})"
+            )
+        os.replace(partial_path, file_path)
+        return file_path, md5
+
+    def _select_files_to_download(self, local_folder, files):
+        """Retorna os arquivos que não existem localmente ou que diferem do Drive."""
+        self._fill_missing_metadata(files)
+        # Só arquivos com o mesmo tamanho do Drive precisam do MD5 local
+        same_size_paths = []
+        for info in files:
+            local_path = os.path.join(local_folder, info['path'], info['name'])
+            drive_size, drive_md5, _ = self._get_file_metadata(info)
+            if drive_md5 and os.path.exists(local_path) and os.path.getsize(local_path) == drive_size:
+                same_size_paths.append(local_path)
+        self._hash_manifest.prefetch(same_size_paths, self.max_workers)
+
+        return [info for info in files if self._needs_download(local_folder, info)]
+
+    def _download_files(self, files_to_download, local_folder, on_file_downloaded=None):
+        """Baixa os arquivos em paralelo, com uma barra de progresso única."""
         print("Calculando total de bytes a serem baixados...")
+        total_size_to_download = sum(self._get_file_metadata(info)[0] for info in files_to_download)
 
         # Ajusta a pasta local e cria se necessário
         os.makedirs(local_folder, exist_ok=True)
 
-        # Muda diretório de trabalho para simplificar criação de subpastas
-        old_cwd = os.getcwd()
-        os.chdir(local_folder)
-
         # Cria a barra de progresso global
         progress_bar = tqdm(
             total=total_size_to_download,
@@ -285,16 +569,189 @@ class GoogleDriveDownloader:
             desc='Baixando arquivos'
         )
 
-        # Baixa só o que precisa
-        for file_info in files_to_download:
-            self._download_single_file(
-                file_id=file_info['id'],
-                file_name=file_info['name'],
-                relative_path=file_info['path'],
-                progress_bar=progress_bar
-            )
+        # Baixa só o que precisa, em paralelo, com um contador de bytes compartilhado
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [
+                executor.submit(
+                    self._download_single_file,
+                    file_id=file_info['id'],
+                    file_name=file_info['name'],
+                    local_folder=local_folder,
+                    relative_path=file_info['path'],
+                    progress_bar=progress_bar,
+                    drive_md5=file_info.get('md5Checksum', '')
+                )
+                for file_info in files_to_download
+            ]
+            try:
+                for future in as_completed(futures):
+                    file_path, md5 = future.result()
+                    self._hash_manifest.update(file_path, md5=md5)
+                    if on_file_downloaded:
+                        on_file_downloaded(file_path)
+            finally:
+                self._hash_manifest.save()
 
         progress_bar.close()
-        os.chdir(old_cwd)   
 
         print("Download concluído com sucesso!")
+
+    def _full_sync(self, drive_folder_id, local_folder, on_file_downloaded=None):
+        """Lista a pasta inteira no Drive e baixa o que for novo ou diferente."""
+        # O token é obtido antes da listagem para não perder mudanças feitas durante ela
+        page_token = self.client.get_start_page_token()
+
+        print("Buscando lista de arquivos no Drive...")
+        all_items = self._get_all_items_recursively(drive_folder_id)
+
+        # Filtra apenas arquivos (exclui subpastas)
+        all_files = [f for f in all_items if f['mimeType'] != FOLDER_MIME_TYPE]
+
+        print("Verificando quais arquivos precisam ser baixados...")
+        files_to_download = self._select_files_to_download(local_folder, all_files)
+
+        if files_to_download:
+            self._download_files(files_to_download, local_folder, on_file_downloaded)
+        else:
+            print("Nenhum arquivo novo ou atualizado. Tudo sincronizado!")
+
+        self._sync_state.reset(drive_folder_id, page_token, all_items)
+
+    def _sync_changes(self, local_folder, on_file_downloaded=None, on_file_removed=None):
+        """
+        Aplica apenas as mudanças desde o último token salvo, restritas à pasta raiz:
+        arquivos novos/alterados são baixados, removidos são apagados localmente e
+        renomeados/movidos são movidos no disco.
+        """
+        state = self._sync_state
+        print("Buscando mudanças no Drive desde a última sincronização...")
+        changes, new_page_token = self.client.list_changes(state.page_token)
+        print(f"{len(changes)} mudanças encontradas no Drive.")
+
+        candidates = {}  # file_id -> file_info a verificar/baixar
+        moved = {}       # file_id -> novo caminho local
+
+        def local_path(info):
+            return os.path.join(local_folder, info['path'], info['name'])
+
+        def remove_file(file_id):
+            path = local_path(state.file_info(file_id))
+            del state.files[file_id]
+            candidates.pop(file_id, None)
+            moved.pop(file_id, None)
+            if os.path.exists(path):
+                os.remove(path)
+            self._remove_stale_partials(path)
+            self._hash_manifest.remove(path)
+            if on_file_removed:
+                on_file_removed(path)
+
+        def move_file(file_id, old_info):
+            old_path, new_path = local_path(old_info), local_path(state.file_info(file_id))
+            if old_path == new_path or not os.path.exists(old_path):
+                return
+            os.makedirs(os.path.dirname(new_path), exist_ok=True)
+            os.replace(old_path, new_path)
+            self._hash_manifest.move(old_path, new_path)
+            moved[file_id] = new_path
+            if on_file_removed:
+                on_file_removed(old_path)
+
+        def is_folder(change):
+            item = change.get('file') or {}
+            return item.get('mimeType') == FOLDER_MIME_TYPE or change['fileId'] in state.folders
+
+        def scope_parent(change):
+            item = change.get('file') or {}
+            if change.get('removed') or item.get('trashed'):
+                return None
+            return state.in_scope(item.get('parents'))
+
+        # Pastas primeiro, para que os caminhos dos arquivos já estejam atualizados
+        for change in (c for c in changes if is_folder(c)):
+            folder_id = change['fileId']
+            if folder_id == state.folder_id:
+                continue
+            parent = scope_parent(change)
+            if parent is None:
+                # Pasta removida ou movida para fora da raiz
+                if folder_id in state.folders:
+                    sub_folders, file_ids = state.descendants(folder_id)
+                    for file_id in file_ids:
+                        remove_file(file_id)
+                    for sub_folder in sub_folders:
+                        del state.folders[sub_folder]
+                    del state.folders[folder_id]
+                continue
+            name = change['file']['name']
+            if folder_id in state.folders:
+                # Pasta renomeada ou movida: move os arquivos abaixo dela
+                _, file_ids = state.descendants(folder_id)
+                old_infos = {file_id: state.file_info(file_id) for file_id in file_ids}
+                state.folders[folder_id] = {'name': name, 'parent': parent}
+                for file_id, old_info in old_infos.items():
+                    move_file(file_id, old_info)
+            else:
+                # Pasta nova ou movida para dentro da raiz: o conteúdo de uma pasta
+                # movida não aparece no feed, então ela é listada
+                state.folders[folder_id] = {'name': name, 'parent': parent}
+                for item in self._get_all_items_recursively(folder_id, state.folder_path(folder_id)):
+                    state.add_item(item)
+                    if item['mimeType'] != FOLDER_MIME_TYPE:
+                        candidates[item['id']] = item
+
+        for change in (c for c in changes if not is_folder(c)):
+            file_id = change['fileId']
+            parent = scope_parent(change)
+            if parent is None:
+                if file_id in state.files:
+                    remove_file(file_id)
+                continue
+            old_info = state.file_info(file_id) if file_id in state.files else None
+            state.add_item({**change['file'], 'parentId': parent})
+            if old_info:
+                move_file(file_id, old_info)
+            candidates[file_id] = state.file_info(file_id)
+
+        files_to_download = self._select_files_to_download(local_folder, list(candidates.values()))
+        if files_to_download:
+            self._download_files(files_to_download, local_folder, on_file_downloaded)
+        else:
+            print("Nenhum arquivo novo ou atualizado. Tudo sincronizado!")
+
+        # Arquivos só renomeados/movidos também precisam ser reindexados no novo caminho
+        downloaded_ids = {info['id'] for info in files_to_download}
+        for file_id, path in moved.items():
+            if file_id not in downloaded_ids and on_file_downloaded:
+                on_file_downloaded(path)
+
+        state.page_token = new_page_token
+
+    def download_from_folder(self, drive_folder_id: str, local_folder: str, on_file_downloaded=None, on_file_removed=None):
+        """
+        Método principal para:
+         1. Autenticar sem abrir navegador (usa token local/ambiente).
+         2. Exibir "Iniciando verificação de documentos".
+         3. Listar recursivamente arquivos da pasta do Drive, ou apenas as mudanças
+            desde a última sincronização (modo 'changes').
+         4. Verificar quais precisam de download.
+         5. Baixar apenas o necessário, com barra de progresso única.
+
+        :param on_file_downloaded: Callback opcional chamado com o caminho local de cada
+                                   arquivo novo, atualizado ou movido.
+        :param on_file_removed: Callback opcional chamado com o caminho local de cada
+                                arquivo removido (ou caminho antigo de um arquivo movido).
+        """
+        print("Iniciando verificação de documentos")
+
+        if not self.client:
+            self.authenticate()
+
+        state = self._sync_state
+        if self.sync_mode == 'changes' and state.folder_id == drive_folder_id and state.page_token:
+            self._sync_changes(local_folder, on_file_downloaded, on_file_removed)
+        else:
+            self._full_sync(drive_folder_id, local_folder, on_file_downloaded)
+
+        state.save()
+        self._hash_manifest.save()
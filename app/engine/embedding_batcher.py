@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import os
+import random
+from typing import List, Optional
+
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.utils import get_tokenizer
+from tqdm import tqdm
+
+logger = logging.getLogger(__name__)
+
+EMBED_BATCH_MAX_TOKENS = int(os.getenv("EMBED_BATCH_MAX_TOKENS", "100000"))
+EMBED_BATCH_MAX_SIZE = int(os.getenv("EMBED_BATCH_MAX_SIZE", "2048"))
+EMBED_MAX_IN_FLIGHT = int(os.getenv("EMBED_MAX_IN_FLIGHT", "4"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "8"))
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+
+def _is_rate_limit(error: Exception) -> bool:
+    return _status_code(error) == 429 or "RateLimit" in type(error).__name__
+
+
+def _is_batch_too_large(error: Exception) -> bool:
+    message = str(error).lower()
+    return _status_code(error) in (400, 413) and (
+        "token" in message or "too large" in message
+    )
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    value = headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _batch_copy(embed_model: BaseEmbedding, max_batch_size: int) -> BaseEmbedding:
+    """
+    Copy of the embedding model that sends each batch in a single provider request
+    and does not retry on its own, the batching and retries are done here.
+    The shared model (`Settings.embed_model`) is left untouched.
+    """
+    update = {"embed_batch_size": max_batch_size}
+    if "max_retries" in type(embed_model).model_fields:
+        update["max_retries"] = 0
+    model = embed_model.model_copy(update=update)
+    # Clients already created by the shared model carry its retry settings
+    for attr in ("_client", "_aclient"):
+        if getattr(model, attr, None) is not None:
+            setattr(model, attr, None)
+    return model
+
+
+class AsyncBatchEmbedder:
+    """
+    Embed texts with a bounded number of concurrent batches.
+    - Batches are cut by an estimated token budget that shrinks when the provider
+      rejects or rate limits a batch and slowly grows back after successes.
+    - Failed batches are retried with exponential backoff and full jitter,
+      honouring the `Retry-After` header when the provider sends one.
+    - Throughput is reported live in chunks per second.
+    """
+
+    def __init__(
+        self,
+        embed_model: BaseEmbedding,
+        max_batch_tokens: int = EMBED_BATCH_MAX_TOKENS,
+        max_batch_size: int = EMBED_BATCH_MAX_SIZE,
+        max_in_flight: int = EMBED_MAX_IN_FLIGHT,
+        max_retries: int = EMBED_MAX_RETRIES,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+    ):
+        self.embed_model = _batch_copy(embed_model, max_batch_size)
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._token_budget = max_batch_tokens
+        self._tokenizer = get_tokenizer()
+
+    def _count_tokens(self, text: str) -> int:
+        return len(self._tokenizer(text))
+
+    def _next_batch_end(self, token_counts: List[int], start: int) -> int:
+        end = start
+        tokens = 0
+        while end < len(token_counts) and end - start < self.max_batch_size:
+            if end > start and tokens + token_counts[end] > self._token_budget:
+                break
+            tokens += token_counts[end]
+            end += 1
+        return end
+
+    def _shrink_budget(self) -> None:
+        self._token_budget = max(1, self._token_budget // 2)
+        logger.info(f"Reduced embedding batch budget to {self._token_budget} tokens")
+
+    def _grow_budget(self) -> None:
+        self._token_budget = min(
+            self.max_batch_tokens, int(self._token_budget * 1.25) + 1
+        )
+
+    async def _embed_with_retry(self, texts: List[str]) -> List[List[float]]:
+        for attempt in range(self.max_retries + 1):
+            try:
+                embeddings = await self.embed_model.aget_text_embedding_batch(texts)
+                self._grow_budget()
+                return embeddings
+            except Exception as e:
+                if _is_batch_too_large(e) and len(texts) > 1:
+                    self._shrink_budget()
+                    middle = len(texts) // 2
+                    first = await self._embed_with_retry(texts[:middle])
+                    second = await self._embed_with_retry(texts[middle:])
+                    return first + second
+                if attempt == self.max_retries:
+                    raise
+                if _is_rate_limit(e):
+                    self._shrink_budget()
+                delay = _retry_after(e) or random.uniform(
+                    0, min(self.max_delay, self.base_delay * 2**attempt)
+                )
+                logger.warning(
+                    f"Embedding batch of {len(texts)} failed ({e}), "
+                    f"retrying in {delay:.1f}s ({attempt + 1}/{self.max_retries})"
+                )
+                await asyncio.sleep(delay)
+        raise RuntimeError("unreachable")
+
+    async def aembed(self, texts: List[str]) -> List[List[float]]:
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        token_counts = [self._count_tokens(text) for text in texts]
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+        progress = tqdm(total=len(texts), unit="chunk", desc="Embedding chunks")
+
+        async def run_batch(start: int, end: int) -> None:
+            try:
+                embeddings = await self._embed_with_retry(texts[start:end])
+                results[start:end] = embeddings
+                progress.update(end - start)
+            finally:
+                semaphore.release()
+
+        tasks = []
+        start = 0
+        try:
+            while start < len(texts):
+                # Cut the next batch only once a slot is free so it uses the latest budget
+                await semaphore.acquire()
+                end = self._next_batch_end(token_counts, start)
+                tasks.append(asyncio.create_task(run_batch(start, end)))
+                start = end
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            progress.close()
+        return results  # type: ignore
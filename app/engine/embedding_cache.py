@@ -0,0 +1,220 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.schema import BaseNode, MetadataMode, TransformComponent
+from pydantic import Field, PrivateAttr
+
+from app.engine.embedding_batcher import AsyncBatchEmbedder
+
+logger = logging.getLogger(__name__)
+
+STORAGE_DIR = os.getenv("STORAGE_DIR", "storage")
+EMBEDDING_CACHE_PATH = os.getenv(
+    "EMBEDDING_CACHE_PATH", os.path.join(STORAGE_DIR, "embedding_cache.sqlite3")
+)
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "500000"))
+
+
+class EmbeddingCache:
+    """
+    Persistent embedding cache stored in SQLite.
+    Entries are keyed by (text hash, embedding model, dimensions) and the least
+    recently used entries are evicted once `max_entries` is exceeded.
+    """
+
+    def __init__(
+        self,
+        path: str = EMBEDDING_CACHE_PATH,
+        max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                text_hash TEXT NOT NULL,
+                model TEXT NOT NULL,
+                dimensions INTEGER NOT NULL,
+                embedding TEXT NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (text_hash, model, dimensions)
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def hash_text(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get_many(
+        self, text_hashes: Sequence[str], model: str, dimensions: int
+    ) -> Dict[str, List[float]]:
+        """
+        Return the cached embeddings for the given text hashes and mark them as used.
+        """
+        found: Dict[str, List[float]] = {}
+        unique_hashes = list(dict.fromkeys(text_hashes))
+        with self._lock:
+            # Stay below SQLite's default limit of host parameters per statement
+            for i in range(0, len(unique_hashes), 500):
+                batch = unique_hashes[i : i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, embedding FROM embeddings "
+                    f"WHERE model = ? AND dimensions = ? AND text_hash IN ({placeholders})",
+                    [model, dimensions, *batch],
+                ).fetchall()
+                found.update({text_hash: json.loads(emb) for text_hash, emb in rows})
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? "
+                    "WHERE text_hash = ? AND model = ? AND dimensions = ?",
+                    [(now, text_hash, model, dimensions) for text_hash in found],
+                )
+                self._conn.commit()
+        hits = sum(1 for text_hash in text_hashes if text_hash in found)
+        self.hits += hits
+        self.misses += len(text_hashes) - hits
+        return found
+
+    def put_many(
+        self, embeddings: Dict[str, List[float]], model: str, dimensions: int
+    ) -> None:
+        if not embeddings:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings "
+                "(text_hash, model, dimensions, embedding, last_used) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (text_hash, model, dimensions, json.dumps(embedding), now)
+                    for text_hash, embedding in embeddings.items()
+                ],
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE rowid IN "
+                "(SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+                (overflow,),
+            )
+            logger.info(f"Evicted {overflow} entries from the embedding cache")
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def log_stats(self) -> None:
+        logger.info(
+            f"Embedding cache: {self.hits} hits, {self.misses} misses "
+            f"(hit rate {self.hit_rate:.1%})"
+        )
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class CachedEmbedding(TransformComponent):
+    """
+    Ingestion transformation that embeds nodes with `embed_model`,
+    reusing embeddings from the cache for chunks whose text did not change.
+    """
+
+    embed_model: BaseEmbedding
+    dimensions: int = Field(
+        default=0, description="Embedding dimensions, part of the cache key."
+    )
+
+    _cache: EmbeddingCache = PrivateAttr()
+    _embedder: Optional[AsyncBatchEmbedder] = PrivateAttr(default=None)
+
+    def __init__(
+        self,
+        embed_model: BaseEmbedding,
+        cache: Optional[EmbeddingCache] = None,
+        dimensions: Optional[int] = None,
+        embedder: Optional[AsyncBatchEmbedder] = None,
+        **kwargs: Any,
+    ):
+        if dimensions is None:
+            dimensions = getattr(embed_model, "dimensions", None) or 0
+        super().__init__(embed_model=embed_model, dimensions=dimensions, **kwargs)
+        self._cache = cache or EmbeddingCache()
+        self._embedder = embedder
+
+    @property
+    def cache(self) -> EmbeddingCache:
+        return self._cache
+
+    def _split_cached(self, nodes: Sequence[BaseNode]):
+        texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes]
+        text_hashes = [EmbeddingCache.hash_text(text) for text in texts]
+        cached = self._cache.get_many(
+            text_hashes, self.embed_model.model_name, self.dimensions
+        )
+        missing = [
+            i for i, text_hash in enumerate(text_hashes) if text_hash not in cached
+        ]
+        return texts, text_hashes, cached, missing
+
+    def _apply(self, nodes, text_hashes, cached, missing, new_embeddings):
+        self._cache.put_many(
+            {text_hashes[i]: emb for i, emb in zip(missing, new_embeddings)},
+            self.embed_model.model_name,
+            self.dimensions,
+        )
+        cached.update({text_hashes[i]: emb for i, emb in zip(missing, new_embeddings)})
+        for node, text_hash in zip(nodes, text_hashes):
+            node.embedding = cached[text_hash]
+        return nodes
+
+    def __call__(self, nodes: Sequence[BaseNode], **kwargs: Any) -> Sequence[BaseNode]:
+        texts, text_hashes, cached, missing = self._split_cached(nodes)
+        new_embeddings = (
+            self.embed_model.get_text_embedding_batch(
+                [texts[i] for i in missing], **kwargs
+            )
+            if missing
+            else []
+        )
+        return self._apply(nodes, text_hashes, cached, missing, new_embeddings)
+
+    async def acall(
+        self, nodes: Sequence[BaseNode], **kwargs: Any
+    ) -> Sequence[BaseNode]:
+        texts, text_hashes, cached, missing = self._split_cached(nodes)
+        missing_texts = [texts[i] for i in missing]
+        if not missing_texts:
+            new_embeddings = []
+        elif self._embedder is not None:
+            new_embeddings = await self._embedder.aembed(missing_texts)
+        else:
+            new_embeddings = await self.embed_model.aget_text_embedding_batch(
+                missing_texts, **kwargs
+            )
+        return self._apply(nodes, text_hashes, cached, missing, new_embeddings)
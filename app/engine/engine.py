@@ -1,16 +1,19 @@
 import os
 
+from app.engine.bm25 import FilteredBM25Retriever
+from app.engine.catalog import CatalogRetriever, get_catalog
+from app.engine.condense import CachedCondensePlusContextChatEngine
 from app.engine.index import IndexConfig, get_index
 from app.engine.node_postprocessors import NodeCitationProcessor
+from app.engine.periods import PeriodRetriever
+from app.engine.query_filter import combine_filters
 from fastapi import HTTPException
 from llama_index.core.callbacks import CallbackManager
-from llama_index.core.chat_engine import CondensePlusContextChatEngine
 from llama_index.core.memory import ChatMemoryBuffer
-from llama_index.core.settings import Settings
-from llama_index.retrievers.bm25 import BM25Retriever
 from llama_index.core.retrievers import QueryFusionRetriever
 from app.engine.mysqlchatstore import MySQLChatStore
 from llama_index.core.storage.docstore import SimpleDocumentStore
+from app.settings import get_stage_llm
 STORAGE_DIR = os.getenv("STORAGE_DIR", "storage")
 
 
@@ -30,7 +33,7 @@ def get_chat_engine(params=None, event_handlers=None, **kwargs):
     citation_prompt = os.getenv("SYSTEM_CITATION_PROMPT", None)
     context_prompt = os.getenv("SYSTEM_CONTEXT_PROMPT", None)
     top_k = int(os.getenv("TOP_K", 2))
-    llm = Settings.llm
+    llm = get_stage_llm("answer")
     memory = ChatMemoryBuffer.from_defaults(
         token_limit=llm.metadata.context_window - 256,
         chat_store=chat_store,
@@ -54,10 +57,9 @@ def get_chat_engine(params=None, event_handlers=None, **kwargs):
         )
     if top_k != 0 and kwargs.get("similarity_top_k") is None:
         kwargs["similarity_top_k"] = top_k
-    index_retriever = index.as_retriever(**kwargs)
     bm25_dir = os.getenv("BM25_PATH")
     if os.path.exists(bm25_dir):
-        bm25_retriever = BM25Retriever.from_persist_dir(bm25_dir)
+        bm25_retriever = FilteredBM25Retriever.from_persist_dir(bm25_dir)
         bm25_retriever.similarity_top_k = top_k
         bm25_retriever.language = "portuguese"  
     else:
@@ -66,18 +68,32 @@ def get_chat_engine(params=None, event_handlers=None, **kwargs):
             detail=f"BM25Retriever is empty - call 'poetry run generate' to generate the storage first"
         )
 
-    retriever = QueryFusionRetriever(
-        [index_retriever, bm25_retriever],
-        similarity_top_k=top_k,
-        mode="reciprocal_rerank",
-        num_queries=1,
-        use_async=True,
-        verbose=True,
+    def build_retriever(period_filters=None):
+        # Period filters are pushed into the Chroma `where` clause and the BM25 candidates
+        index_retriever = index.as_retriever(
+            **{**kwargs, "filters": combine_filters(kwargs.get("filters"), period_filters)}
+        )
+        return QueryFusionRetriever(
+            [index_retriever, bm25_retriever.with_filters(period_filters)],
+            similarity_top_k=top_k,
+            mode="reciprocal_rerank",
+            num_queries=1,
+            use_async=True,
+            verbose=True,
+            callback_manager=callback_manager,
+        )
+
+    retriever = PeriodRetriever(
+        build_retriever,
+        get_periods=lambda: get_catalog().periods(),
         callback_manager=callback_manager,
     )
+    # Questions listing the available documents are answered from the catalog
+    retriever = CatalogRetriever(retriever, callback_manager=callback_manager)
 
-    return CondensePlusContextChatEngine(
+    return CachedCondensePlusContextChatEngine(
         llm=llm,
+        condense_llm=get_stage_llm("condense"),
         memory=memory,
         system_prompt=system_prompt,
         context_prompt=context_prompt,
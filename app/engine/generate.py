@@ -3,21 +3,32 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+import asyncio
 import logging
 import os
+from typing import Callable, Iterable, Iterator, List, Optional
 
+from llama_index.core import Document
 from llama_index.core.ingestion import DocstoreStrategy, IngestionPipeline
 from llama_index.core.node_parser import SentenceSplitter
+from llama_index.core.schema import BaseNode
 from llama_index.core.settings import Settings
 from llama_index.core.storage import StorageContext
-from llama_index.core.storage.docstore import SimpleDocumentStore
 
+from app.engine.dedup import DEDUP_THRESHOLD, MinHashDeduplicator
+from app.engine.docstore import get_doc_store
+from app.engine.embedding_batcher import AsyncBatchEmbedder
+from app.engine.embedding_cache import CachedEmbedding
 from app.engine.loaders import get_documents
+from app.engine.loaders.crawler import WebCrawlState
+from app.engine.loaders.db import DBWatermarks
+from app.engine.manifest import IngestionManifest, source_path_from_doc_id
+from app.engine.stages import Stage, StageQueue
 from app.engine.vectordb import get_vector_store
 from app.engine.bm25 import get_bm25_retriever
 from app.settings import init_settings
 from app.engine.drive_downloader import GoogleDriveDownloader
-from app.engine.document_creator import create_single_document_with_filenames
+from app.engine.catalog import DocumentCatalog
 
 from app.config import DATA_DIR
 
@@ -26,32 +37,93 @@ logger = logging.getLogger()
 
 STORAGE_DIR = os.getenv("STORAGE_DIR", "storage")
 DRIVE_FOLDER = os.getenv("DRIVE_FOLDER")
+# Number of documents parsed, chunked, embedded and stored together
+INGESTION_BATCH_SIZE = int(os.getenv("INGESTION_BATCH_SIZE", "32"))
+# Maximum number of files/documents waiting between two ingestion stages
+INGESTION_QUEUE_SIZE = int(os.getenv("INGESTION_QUEUE_SIZE", "64"))
+LEGACY_CATALOG_FILE_NAME = "Lista de documentos"
+
+def _iter_batches(documents: Iterable[Document], batch_size: int):
+    batch = []
+    for document in documents:
+        batch.append(document)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
 
-def get_doc_store():
-    # If the storage directory is there, load the document store from it.
-    # If not, set up an in-memory document store since we can't load from a directory that doesn't exist.
-    if os.path.exists(STORAGE_DIR):
-        return SimpleDocumentStore.from_persist_dir(STORAGE_DIR)
-    else:
-        return SimpleDocumentStore()
 
+async def _arun_pipeline(pipeline, documents, batch_size, on_batch, deduplicator=None):
+    num_nodes = 0
+    for batch in _iter_batches(documents, batch_size):
+        try:
+            nodes = await pipeline.arun(show_progress=True, documents=batch)
+        except Exception:
+            # The pipeline stores the document hashes before embedding, reset them
+            # so the documents of the failed batch are not skipped on the next run
+            for document in batch:
+                pipeline.docstore.set_document_hash(document.doc_id, "")
+            if deduplicator is not None:
+                deduplicator.rollback()
+            raise
+        # Chunks are only recorded as canonical once they are in the vector store
+        if deduplicator is not None:
+            deduplicator.commit()
+        num_nodes += len(nodes)
+        if on_batch is not None:
+            on_batch(batch, nodes)
+    return num_nodes
 
-def run_pipeline(docstore, vector_store, documents):
-    
+
+def run_pipeline(
+    docstore,
+    vector_store,
+    documents: Iterable[Document],
+    on_batch: Optional[Callable[[List[Document], List[BaseNode]], None]] = None,
+    deduplicator: Optional[MinHashDeduplicator] = None,
+) -> int:
+    """
+    Run the ingestion pipeline over a stream of documents in bounded batches,
+    so only one batch of documents and nodes is held in memory at a time.
+    If `deduplicator` is given, near-duplicate chunks are dropped before embedding.
+    Return the number of nodes that were (re)indexed.
+    """
+    # Reuse embeddings of chunks whose text did not change since the last run
+    # and embed the rest in concurrent, rate-limit aware batches
+    embedding = CachedEmbedding(
+        embed_model=Settings.embed_model,
+        embedder=AsyncBatchEmbedder(Settings.embed_model),
+    )
+    transformations = [SentenceSplitter(chunk_size=Settings.chunk_size,chunk_overlap=Settings.chunk_overlap,)]
+    if deduplicator is not None:
+        transformations.append(deduplicator)
+    transformations.append(embedding)
     pipeline = IngestionPipeline(
-        transformations=[SentenceSplitter(chunk_size=Settings.chunk_size,chunk_overlap=Settings.chunk_overlap,),Settings.embed_model,],
+        transformations=transformations,
         docstore=docstore,
-        docstore_strategy=DocstoreStrategy.UPSERTS_AND_DELETE,  # type: ignore
+        # Deleted files are removed through the ingestion manifest, as only
+        # new or changed files are passed to the pipeline
+        docstore_strategy=DocstoreStrategy.UPSERTS,  # type: ignore
         vector_store=vector_store,
+        # Embeddings are cached per chunk by CachedEmbedding, the pipeline cache
+        # would only keep a copy of every transformed batch in memory
+        disable_cache=True,
     )
 
     # Run the ingestion pipeline and store the results
-    nodes = pipeline.run(show_progress=True, documents=documents)
+    num_nodes = asyncio.run(
+        _arun_pipeline(
+            pipeline, documents, INGESTION_BATCH_SIZE, on_batch, deduplicator
+        )
+    )
+    embedding.cache.log_stats()
 
-    return nodes
+    return num_nodes
 
 
 def persist_storage(docstore, vector_store):
+    # The SQLite docstore commits as it goes, this only writes the other stores
     storage_context = StorageContext.from_defaults(
         docstore=docstore,
         vector_store=vector_store,
@@ -59,26 +131,174 @@ def persist_storage(docstore, vector_store):
     storage_context.persist(STORAGE_DIR)
 
 
+def delete_documents(docstore, vector_store, doc_ids, deduplicator=None):
+    """
+    Remove documents and their nodes from the docstore and the vector store.
+    The BM25 index is rebuilt from the docstore afterwards.
+    """
+    for doc_id in doc_ids:
+        vector_store.delete(doc_id)
+        docstore.delete_document(doc_id, raise_error=False)
+    if deduplicator is not None:
+        deduplicator.remove_documents(doc_ids)
+
+
+def _reingest_orphaned_documents(docstore, vector_store, manifest, deduplicator) -> int:
+    """
+    Documents whose chunks were skipped as duplicates of chunks that are gone are
+    ingested again from the docstore in the same run, so those chunks are indexed.
+    Resetting their hash makes the pipeline replace them instead of skipping them
+    as unchanged. A document orphaned again after being ingested again is left to
+    the next run, so chunks duplicating each other across documents cannot loop.
+    Return the number of nodes that were (re)indexed.
+    """
+    reingested = set()
+    num_nodes = 0
+    while True:
+        documents = []
+        for doc_id in deduplicator.pop_orphaned_doc_ids():
+            document = docstore.get_document(doc_id, raise_error=False)
+            if document is None:
+                continue
+            docstore.set_document_hash(doc_id, "")
+            if doc_id in reingested:
+                manifest.invalidate(source_path_from_doc_id(doc_id))
+                logger.warning(f"{doc_id} was orphaned again, it will be ingested on the next run")
+                continue
+            documents.append(document)
+        if not documents:
+            return num_nodes
+        logger.info(
+            f"Ingesting again {len(documents)} documents with chunks deduplicated "
+            "against removed chunks"
+        )
+        reingested.update(document.doc_id for document in documents)
+        num_nodes += run_pipeline(
+            docstore, vector_store, documents, deduplicator=deduplicator
+        )
+
+
+def _mark_public(documents: Iterable[Document]) -> Iterator[Document]:
+    for doc in documents:
+        doc.metadata["private"] = "false"
+        yield doc
+
+
+def _delete_legacy_catalog_documents(docstore, vector_store) -> bool:
+    """
+    The file list used to be indexed as a synthetic "Lista de documentos" document,
+    it is replaced by the document catalog and removed from the stores.
+    """
+    doc_ids = [
+        doc.doc_id
+        for doc in docstore.iter_documents()
+        if doc.metadata.get("file_name") == LEGACY_CATALOG_FILE_NAME
+    ]
+    delete_documents(docstore, vector_store, doc_ids)
+    return bool(doc_ids)
+
+
 def generate_datasource():
     init_settings()
-    GoogleDriveDownloader().download_from_folder(DRIVE_FOLDER, DATA_DIR)
     logger.info("Generate index for the provided data")
 
-    # Get the stores and documents or create new ones
-    documents = get_documents()
-    document = create_single_document_with_filenames(DATA_DIR)
-    documents.append(document)
-    for doc in documents:
-        doc.metadata["private"] = "false"
+    # Only parse files that are new or changed since the last run
+    manifest = IngestionManifest.load()
+    changes = manifest.scan(DATA_DIR)
+    # Only read DB rows added or changed since the last run
+    db_watermarks = DBWatermarks.load()
+    # Only re-index web pages changed since the last crawl
+    web_crawl_state = WebCrawlState.load()
     docstore = get_doc_store()
     vector_store = get_vector_store()
+    # Skip chunks that are near duplicates of already indexed chunks
+    deduplicator = (
+        MinHashDeduplicator(on_links_changed=vector_store.update_metadata)
+        if DEDUP_THRESHOLD
+        else None
+    )
+
+    for file_path in changes.deleted:
+        delete_documents(
+            docstore, vector_store, manifest.remove(file_path), deduplicator
+        )
+    legacy_deleted = _delete_legacy_catalog_documents(docstore, vector_store)
+
+    # Download, parse and chunk/embed/index run concurrently, connected by bounded
+    # queues: downloaded files are parsed right away and parsed documents are
+    # embedded while the next files are still being downloaded and parsed.
+    files: StageQueue[str] = StageQueue(INGESTION_QUEUE_SIZE)
+    documents: StageQueue[Document] = StageQueue(INGESTION_QUEUE_SIZE)
+    # Local paths of files removed (or moved away) in the Drive during this run
+    removed_files: List[str] = []
+
+    def download():
+        for file_path in changes.to_ingest:
+            files.put(file_path)
+
+        def on_file_downloaded(file_path):
+            manifest.track(file_path)
+            files.put(file_path)
+
+        GoogleDriveDownloader().download_from_folder(
+            DRIVE_FOLDER,
+            DATA_DIR,
+            on_file_downloaded=on_file_downloaded,
+            on_file_removed=removed_files.append,
+        )
+
+    def parse():
+        for document in _mark_public(
+            get_documents(
+                input_files=files,
+                db_watermarks=db_watermarks,
+                web_crawl_state=web_crawl_state,
+            )
+        ):
+            documents.put(document)
+
+    stages = [
+        Stage("download", download, output=files),
+        Stage("parse", parse, output=documents),
+    ]
+    for stage in stages:
+        stage.start()
 
     # Run the ingestion pipeline
-    _ = run_pipeline(docstore, vector_store, documents)
+    num_nodes = run_pipeline(
+        docstore,
+        vector_store,
+        documents,
+        on_batch=manifest.add_batch,
+        deduplicator=deduplicator,
+    )
+    for stage in stages:
+        stage.result()
+    for file_path in removed_files:
+        delete_documents(
+            docstore, vector_store, manifest.remove(file_path), deduplicator
+        )
+    delete_documents(docstore, vector_store, manifest.commit(), deduplicator)
+    if deduplicator is not None:
+        num_nodes += _reingest_orphaned_documents(
+            docstore, vector_store, manifest, deduplicator
+        )
+        deduplicator.log_stats()
+        deduplicator.write_report()
 
-    persist_storage(docstore, vector_store)
+    # The catalog lists the files in DATA_DIR, so it is rebuilt once downloads finished
+    DocumentCatalog.build(DATA_DIR).persist()
 
-    get_bm25_retriever()
+    # BM25 needs the statistics of the whole corpus, so it is built last
+    if num_nodes or changes.deleted or removed_files or legacy_deleted:
+        persist_storage(docstore, vector_store)
+        # The MinHash index of this run tells which chunks were skipped or linked
+        get_bm25_retriever(deduplicator.index if deduplicator is not None else None)
+    else:
+        logger.info("No changes in the documents, skipping persisting the storage")
+    manifest.persist()
+    db_watermarks.persist()
+    web_crawl_state.persist()
 
     logger.info("Finished generating the index")
 
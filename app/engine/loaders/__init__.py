@@ -1,9 +1,10 @@
 import logging
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterable, Iterator, Optional
 
 import yaml  # type: ignore
-from app.engine.loaders.db import DBLoaderConfig, get_db_documents
+from app.engine.loaders.db import DBLoaderConfig, DBWatermarks, get_db_documents
 from app.engine.loaders.file import FileLoaderConfig, get_file_documents
+from app.engine.loaders.crawler import WebCrawlState
 from app.engine.loaders.web import WebLoaderConfig, get_web_documents
 from llama_index.core import Document
 
@@ -16,8 +17,17 @@ def load_configs() -> Dict[str, Any]:
     return configs
 
 
-def get_documents() -> List[Document]:
-    documents = []
+def get_documents(
+    input_files: Optional[Iterable[str]] = None,
+    db_watermarks: Optional[DBWatermarks] = None,
+    web_crawl_state: Optional[WebCrawlState] = None,
+) -> Iterator[Document]:
+    """
+    Yield the documents from all configured loaders, one loader after the other.
+    If `input_files` is given, the file loader only loads those files from the data dir.
+    If `db_watermarks` is given, DB queries with a watermark column only load new rows.
+    If `web_crawl_state` is given, web pages unchanged since the last crawl are skipped.
+    """
     config = load_configs()
     for loader_type, loader_config in config.items():
         logger.info(
@@ -25,15 +35,18 @@ def get_documents() -> List[Document]:
         )
         match loader_type:
             case "file":
-                document = get_file_documents(FileLoaderConfig(**loader_config))
+                documents = get_file_documents(
+                    FileLoaderConfig(**loader_config), input_files=input_files
+                )
             case "web":
-                document = get_web_documents(WebLoaderConfig(**loader_config))
+                documents = get_web_documents(
+                    WebLoaderConfig(**loader_config), crawl_state=web_crawl_state
+                )
             case "db":
-                document = get_db_documents(
-                    configs=[DBLoaderConfig(**cfg) for cfg in loader_config]
+                documents = get_db_documents(
+                    configs=[DBLoaderConfig(**cfg) for cfg in loader_config],
+                    watermarks=db_watermarks,
                 )
             case _:
                 raise ValueError(f"Invalid loader type: {loader_type}")
-        documents.extend(document)
-
-    return documents
+        yield from documents
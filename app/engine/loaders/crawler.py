@@ -0,0 +1,278 @@
+import asyncio
+import json
+import logging
+import os
+import queue
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urljoin
+
+from llama_index.core import Document
+
+logger = logging.getLogger(__name__)
+
+STORAGE_DIR = os.getenv("STORAGE_DIR", "storage")
+WEB_CRAWL_STATE_PATH = os.getenv(
+    "WEB_CRAWL_STATE_PATH", os.path.join(STORAGE_DIR, "web_crawl_state.json")
+)
+
+_EXTRACT_LINKS_SCRIPT = """
+    var links = [];
+    var elements = document.getElementsByTagName('a');
+    for (var i = 0; i < elements.length; i++) {
+        var href = elements[i].href;
+        if (href) {
+            links.push(href);
+        }
+    }
+    return links;
+"""
+
+
+def clean_url(url: str) -> str:
+    return url.split("#")[0]
+
+
+def html_to_text(html: str, base_url: str) -> Tuple[str, List[str]]:
+    """
+    Extract the visible text and the absolute links of an HTML page.
+    """
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    links = [urljoin(base_url, a["href"]) for a in soup.find_all("a", href=True)]
+    for element in soup(["script", "style", "noscript", "template"]):
+        element.decompose()
+    body = soup.body or soup
+    lines = (line.strip() for line in body.get_text("\n").splitlines())
+    return "\n".join(line for line in lines if line), links
+
+
+class WebCrawlState:
+    """
+    Pages crawled in previous runs with their ETag, Last-Modified and links,
+    used to send conditional requests and to keep crawling through unchanged pages.
+    Persisted by the caller once the documents have been ingested.
+    """
+
+    def __init__(self, path: str = WEB_CRAWL_STATE_PATH):
+        self.path = path
+        self.pages: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str = WEB_CRAWL_STATE_PATH) -> "WebCrawlState":
+        state = cls(path)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                state.pages = json.load(f)
+        return state
+
+    def persist(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with self._lock, open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.pages, f)
+        os.replace(tmp_path, self.path)
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self.pages.get(url)
+
+    def update(self, url: str, etag: Optional[str], last_modified: Optional[str], links: List[str]) -> None:
+        with self._lock:
+            self.pages[url] = {"etag": etag, "last_modified": last_modified, "links": links}
+
+
+class BrowserPool:
+    """
+    Pool of reusable headless Chrome instances, started lazily up to `size`.
+    Starting Chrome is slow, so drivers are shared by all the pages that need JavaScript.
+    """
+
+    def __init__(self, size: int, driver_arguments: List[str]):
+        self.size = size
+        self.driver_arguments = driver_arguments
+        self._drivers: queue.Queue = queue.Queue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _create_driver(self):
+        from selenium import webdriver
+        from selenium.webdriver.chrome.options import Options
+
+        options = Options()
+        for arg in self.driver_arguments:
+            options.add_argument(arg)
+        return webdriver.Chrome(options=options)
+
+    def _acquire(self):
+        try:
+            return self._drivers.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            create = self._created < self.size
+            if create:
+                self._created += 1
+        if create:
+            try:
+                return self._create_driver()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        return self._drivers.get()
+
+    def _discard(self, driver) -> None:
+        try:
+            driver.quit()
+        finally:
+            with self._lock:
+                self._created -= 1
+
+    def render(self, url: str) -> Tuple[str, List[str]]:
+        """
+        Load a page in a browser and return its text and links. Blocking.
+        """
+        from selenium.common.exceptions import WebDriverException
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        driver = self._acquire()
+        try:
+            driver.get(url)
+            WebDriverWait(driver, 10).until(
+                EC.presence_of_element_located((By.TAG_NAME, "body"))
+            )
+            text = driver.find_element(By.TAG_NAME, "body").text.strip()
+            links = driver.execute_script(_EXTRACT_LINKS_SCRIPT)
+        except WebDriverException:
+            # The driver may be broken, a new one is started on demand
+            self._discard(driver)
+            raise
+        except Exception:
+            self._drivers.put(driver)
+            raise
+        self._drivers.put(driver)
+        return text, links
+
+    def close(self) -> None:
+        while True:
+            try:
+                driver = self._drivers.get_nowait()
+            except queue.Empty:
+                return
+            self._discard(driver)
+
+
+class WebCrawler:
+    """
+    Breadth-first crawler fetching up to `max_concurrency` pages at a time.
+    Pages are fetched with plain async HTTP and converted to text; only pages
+    configured with `render_js`, or whose HTML has almost no text (rendered
+    client side), are loaded in the browser pool.
+    Pages unchanged since the last crawl (HTTP 304) are not emitted again.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        browser_pool: Optional[BrowserPool] = None,
+        state: Optional[WebCrawlState] = None,
+        min_text_length: int = 200,
+        timeout: float = 30.0,
+    ):
+        self.max_concurrency = max_concurrency
+        self.browser_pool = browser_pool
+        self.state = state or WebCrawlState()
+        self.min_text_length = min_text_length
+        self.timeout = timeout
+        self._visited: set = set()
+
+    async def _fetch(
+        self, client, semaphore: asyncio.Semaphore, url: str, render_js: Optional[bool]
+    ) -> Tuple[Optional[Document], List[str]]:
+        import httpx
+
+        async with semaphore:
+            cached = self.state.get(url)
+            headers = {}
+            if cached:
+                if cached.get("etag"):
+                    headers["If-None-Match"] = cached["etag"]
+                if cached.get("last_modified"):
+                    headers["If-Modified-Since"] = cached["last_modified"]
+            try:
+                response = await client.get(url, headers=headers)
+            except httpx.HTTPError as e:
+                logger.warning(f"Failed to fetch {url}: {e}")
+                return None, []
+
+            if response.status_code == 304 and cached:
+                logger.debug(f"Not modified: {url}")
+                return None, cached.get("links", [])
+            if response.status_code >= 400:
+                logger.warning(f"Failed to fetch {url}: HTTP {response.status_code}")
+                return None, []
+            if "html" not in response.headers.get("content-type", "html"):
+                return None, []
+
+            text, links = html_to_text(response.text, str(response.url))
+            needs_browser = render_js or (
+                render_js is None and len(text) < self.min_text_length
+            )
+            if needs_browser and self.browser_pool is not None:
+                try:
+                    text, links = await asyncio.to_thread(self.browser_pool.render, url)
+                except Exception as e:
+                    logger.warning(f"Failed to render {url} in the browser: {e}")
+
+        self.state.update(
+            url,
+            response.headers.get("etag"),
+            response.headers.get("last-modified"),
+            links,
+        )
+        document = Document(text=text, extra_info={"URL": url})
+        # The URL as id lets a re-crawled page replace its previous version
+        document.id_ = url
+        return document, links
+
+    async def crawl(
+        self,
+        base_url: str,
+        prefix: str,
+        max_depth: int,
+        emit: Callable[[Document], None],
+        render_js: Optional[bool] = None,
+    ) -> None:
+        import httpx
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        limits = httpx.Limits(max_connections=self.max_concurrency)
+        async with httpx.AsyncClient(
+            follow_redirects=True, timeout=self.timeout, limits=limits
+        ) as client:
+            frontier = [clean_url(base_url)]
+            self._visited.update(frontier)
+            for depth in range(max_depth + 1):
+                logger.info(f"Crawling {len(frontier)} pages at depth {depth} of {base_url}")
+                results = await asyncio.gather(
+                    *(self._fetch(client, semaphore, url, render_js) for url in frontier)
+                )
+                next_frontier = []
+                for document, links in results:
+                    if document is not None:
+                        emit(document)
+                    if depth == max_depth:
+                        continue
+                    for link in links:
+                        link = clean_url(link)
+                        if link.startswith(prefix) and link not in self._visited:
+                            self._visited.add(link)
+                            next_frontier.append(link)
+                if not next_frontier:
+                    break
+                frontier = next_frontier
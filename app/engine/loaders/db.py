@@ -1,31 +1,198 @@
+import hashlib
+import json
 import logging
-from typing import List
+import os
+from datetime import date, datetime
+from typing import Any, Dict, Iterator, List, Optional, Set, Union
 
+from llama_index.core import Document
 from pydantic import BaseModel
 
 logger = logging.getLogger(__name__)
 
+STORAGE_DIR = os.getenv("STORAGE_DIR", "storage")
+DB_WATERMARKS_PATH = os.getenv(
+    "DB_WATERMARKS_PATH", os.path.join(STORAGE_DIR, "db_watermarks.json")
+)
+
+
+class DBQueryConfig(BaseModel):
+    query: str
+    # Monotonic column (e.g. updated_at or id): only rows from the last value
+    # read on are loaded on the next run, skipping the ones already read
+    watermark_column: Optional[str] = None
+    # Stable row id used as document id, so a changed row replaces its previous version.
+    # Without it the document id is a hash of the row, a changed row is added as new
+    id_column: Optional[str] = None
+
 
 class DBLoaderConfig(BaseModel):
     uri: str
-    queries: List[str]
+    queries: List[Union[str, DBQueryConfig]]
+    # Rows fetched per round trip from the server-side cursor
+    fetch_size: int = 1000
+
+
+class DBWatermarks:
+    """
+    Last watermark value read by each query, persisted between runs, with the
+    ids of the rows read at that value.
+    Rows are read from the last value included (`>=`), so rows committed later
+    with the same value are not missed; the recorded ids skip the ones already read.
+    Values are updated while rows are streamed and only persisted by the caller
+    once the documents have been ingested.
+    """
+
+    def __init__(self, path: str = DB_WATERMARKS_PATH):
+        self.path = path
+        self.values: Dict[str, Dict[str, Any]] = {}
+
+    @classmethod
+    def load(cls, path: str = DB_WATERMARKS_PATH) -> "DBWatermarks":
+        watermarks = cls(path)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                watermarks.values = json.load(f)
+        return watermarks
+
+    def persist(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.values, f)
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def key(uri: str, query: DBQueryConfig) -> str:
+        raw = f"{uri}\n{query.query}\n{query.watermark_column}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Any:
+        entry = self.values.get(key)
+        if entry is None:
+            return None
+        if entry["type"] == "datetime":
+            return datetime.fromisoformat(entry["value"])
+        if entry["type"] == "date":
+            return date.fromisoformat(entry["value"])
+        return entry["value"]
 
+    def seen_ids(self, key: str) -> Set[str]:
+        """
+        Document ids of the rows read at the current watermark value.
+        """
+        entry = self.values.get(key)
+        return set(entry.get("ids", [])) if entry is not None else set()
 
-def get_db_documents(configs: list[DBLoaderConfig]):
+    def update(self, key: str, value: Any, doc_id: str) -> None:
+        ids = self.seen_ids(key) if self.get(key) == value else set()
+        if isinstance(value, datetime):
+            entry = {"type": "datetime", "value": value.isoformat()}
+        elif isinstance(value, date):
+            entry = {"type": "date", "value": value.isoformat()}
+        else:
+            entry = {"type": type(value).__name__, "value": value}
+        ids.add(doc_id)
+        entry["ids"] = sorted(ids)
+        self.values[key] = entry
+
+
+def _build_query(query: DBQueryConfig, watermark: Any):
+    """
+    Wrap the configured query to read only the rows from the watermark on, in order,
+    so the last row read holds the new watermark.
+    """
+    from sqlalchemy import text
+
+    if query.watermark_column is None:
+        return text(query.query), {}
+    column = query.watermark_column
+    sql = f"SELECT * FROM ({query.query}) AS wm_source"
+    params = {}
+    if watermark is not None:
+        sql += f" WHERE wm_source.{column} >= :watermark"
+        params["watermark"] = watermark
+    sql += f" ORDER BY wm_source.{column}"
+    return text(sql), params
+
+
+def _stream_query(
+    engine,
+    uri: str,
+    query: DBQueryConfig,
+    fetch_size: int,
+    watermarks: Optional[DBWatermarks],
+) -> Iterator[Document]:
+    key = DBWatermarks.key(uri, query)
+    watermark = (
+        watermarks.get(key)
+        if watermarks is not None and query.watermark_column
+        else None
+    )
+    # Rows at the watermark value that were ingested by the previous run
+    seen_ids = watermarks.seen_ids(key) if watermark is not None else set()
+    sql, params = _build_query(query, watermark)
+    logger.info(
+        f"Loading data from database with query: {query.query}"
+        + (f" ({query.watermark_column} >= {watermark})" if watermark is not None else "")
+    )
+
+    num_rows = 0
+    with engine.connect() as connection:
+        # Server-side cursor: rows are fetched in batches instead of all at once
+        result = connection.execution_options(
+            stream_results=True, max_row_buffer=fetch_size
+        ).execute(sql, params)
+        while True:
+            rows = result.fetchmany(fetch_size)
+            if not rows:
+                break
+            for row in rows:
+                values = row._mapping
+                # Same text as DatabaseReader.load_data
+                text = ", ".join(f"{col}: {value}" for col, value in values.items())
+                document = Document(text=text)
+                if query.id_column:
+                    document.id_ = f"db:{key[:16]}:{values[query.id_column]}"
+                else:
+                    # Without a row id the content is the id, so re-reading an
+                    # unchanged row does not ingest it again under a new random id
+                    row_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+                    document.id_ = f"db:{key[:16]}:{row_hash[:32]}"
+                if watermarks is not None and query.watermark_column:
+                    value = values[query.watermark_column]
+                    if value == watermark and document.id_ in seen_ids:
+                        continue
+                    watermarks.update(key, value, document.id_)
+                yield document
+            num_rows += len(rows)
+    logger.info(f"Loaded {num_rows} rows from database query")
+
+
+def get_db_documents(
+    configs: list[DBLoaderConfig], watermarks: Optional[DBWatermarks] = None
+) -> Iterator[Document]:
+    """
+    Stream the rows of the configured queries as documents.
+    Queries with a `watermark_column` only read the rows added or changed since
+    the last run recorded in `watermarks`.
+    """
     try:
-        from llama_index.readers.database import DatabaseReader
+        from sqlalchemy import create_engine
     except ImportError:
         logger.error(
-            "Failed to import DatabaseReader. Make sure llama_index is installed."
+            "Failed to import sqlalchemy. Make sure llama_index is installed."
         )
         raise
 
-    docs = []
     for entry in configs:
-        loader = DatabaseReader(uri=entry.uri)
-        for query in entry.queries:
-            logger.info(f"Loading data from database with query: {query}")
-            documents = loader.load_data(query=query)
-            docs.extend(documents)
-
-    return documents
+        engine = create_engine(entry.uri)
+        try:
+            for query in entry.queries:
+                if isinstance(query, str):
+                    query = DBQueryConfig(query=query)
+                yield from _stream_query(
+                    engine, entry.uri, query, entry.fetch_size, watermarks
+                )
+        finally:
+            engine.dispose()
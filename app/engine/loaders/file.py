@@ -1,16 +1,38 @@
+import asyncio
+import multiprocessing
 import os
 import logging
-from typing import Dict
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
 from llama_parse import LlamaParse
 from pydantic import BaseModel
+from llama_index.core import Document
+from llama_index.core.readers.base import BaseReader
 from llama_index.readers.file import PDFReader
 from app.config import DATA_DIR
+from app.engine.loaders.parse_cache import ParseCache, parser_settings_key
+from app.engine.loaders.xlsx import XLSX_EXTENSIONS, StreamingXLSXReader
+from app.engine.manifest import hash_file
+from app.engine.periods import add_period_metadata
+from app.engine.stages import Stage, StageQueue
 
 logger = logging.getLogger(__name__)
 
 
 class FileLoaderConfig(BaseModel):
     use_llama_parse: bool = False
+    # Number of parser processes, defaults to the number of CPUs
+    num_workers: Optional[int] = None
+    # PDFs with at least this many pages are split into page ranges parsed in parallel
+    pdf_page_split_threshold: int = 200
+    pdf_pages_per_task: int = 50
+    # Files sent to LlamaParse at the same time
+    llama_parse_max_concurrency: int = 8
+    # Spreadsheet rows per document, each document repeats the header row
+    xlsx_rows_per_document: int = 50
 
 
 def llama_parse_parser():
@@ -28,34 +50,214 @@ def llama_parse_parser():
     return parser
 
 
-def llama_parse_extractor() -> Dict[str, LlamaParse]:
-    from llama_parse.utils import SUPPORTED_FILE_TYPES
-
-    parser = llama_parse_parser()
-    return {file_type: parser for file_type in SUPPORTED_FILE_TYPES}
+def _default_file_extractor(config: FileLoaderConfig) -> Dict[str, BaseReader]:
+    extractor: Dict[str, BaseReader] = {".pdf": PDFReader(return_full_document = True)}
+    xlsx_reader = StreamingXLSXReader(rows_per_document=config.xlsx_rows_per_document)
+    for extension in XLSX_EXTENSIONS:
+        extractor[extension] = xlsx_reader
+    return extractor
 
 
-def get_file_documents(config: FileLoaderConfig):
+def _create_reader(input_files: List[str], file_extractor: Dict[str, BaseReader]):
     from llama_index.core.readers import SimpleDirectoryReader
 
+    return SimpleDirectoryReader(
+        input_files=input_files,
+        filename_as_id=True,
+        raise_on_error=True,
+        file_extractor=file_extractor,
+    )
+
+
+def _load_file(
+    input_file: str, file_extractor: Dict[str, BaseReader]
+) -> Tuple[List[Document], float]:
+    """
+    Parse a single file and return the documents with the parse time.
+    """
+    start = time.perf_counter()
+    documents = _create_reader([input_file], file_extractor).load_data()
+    return documents, time.perf_counter() - start
+
+
+def _documents_from_texts(
+    input_file: str, texts: List[str], file_extractor: Dict[str, BaseReader]
+) -> List[Document]:
+    """
+    Build the documents of a file parsed outside SimpleDirectoryReader, with the same
+    ids (`<path>_part_<n>`), metadata and excluded metadata keys.
+    """
+    reader = _create_reader([input_file], file_extractor)
+    metadata = {"file_name": os.path.basename(input_file)}
+    metadata.update(reader.file_metadata(input_file))
+    documents = [
+        Document(id_=f"{Path(input_file)!s}_part_{i}", text=text, metadata=dict(metadata))
+        for i, text in enumerate(texts)
+    ]
+    return reader._exclude_metadata(documents)
+
+
+def _is_xlsx(input_file: str) -> bool:
+    return Path(input_file).suffix.lower() in XLSX_EXTENSIONS
+
+
+def _iter_xlsx_documents(
+    input_file: str, file_extractor: Dict[str, BaseReader]
+) -> Iterator[Document]:
+    """
+    Stream the documents of a workbook in the calling process, with the same ids,
+    metadata and excluded metadata keys as SimpleDirectoryReader, so the rows of
+    a large sheet are never all held in memory or sent back from a worker.
+    """
+    reader = _create_reader([input_file], file_extractor)
+    xlsx_reader = file_extractor[Path(input_file).suffix.lower()]
+    metadata = reader.file_metadata(input_file)
+    for i, document in enumerate(
+        xlsx_reader.lazy_load_data(Path(input_file), extra_info=metadata)
+    ):
+        document.id_ = f"{Path(input_file)!s}_part_{i}"
+        yield from reader._exclude_metadata([document])
+
+
+def _extract_pdf_pages(input_file: Path, start: int, end: int) -> List[str]:
+    """
+    Extract the text of the pages [start, end) of a PDF in a worker process.
+    """
+    import pypdf
+
+    pdf = pypdf.PdfReader(str(input_file))
+    return [pdf.pages[i].extract_text() for i in range(start, end)]
+
+
+def _count_pdf_pages(input_file: Path) -> int:
+    import pypdf
+
     try:
-        file_extractor = {".pdf": PDFReader(return_full_document = True)}
-        if config.use_llama_parse:
-            # LlamaParse is async first,
-            # so we need to use nest_asyncio to run it in sync mode
-            import nest_asyncio
-
-            nest_asyncio.apply()
-
-            file_extractor = llama_parse_extractor()
-        reader = SimpleDirectoryReader(
-            DATA_DIR,
-            recursive=True,
-            filename_as_id=True,
-            raise_on_error=True,
-            file_extractor=file_extractor,
+        return len(pypdf.PdfReader(str(input_file)).pages)
+    except Exception as e:
+        logger.warning(f"Failed to count pages of {input_file}: {e}")
+        return 0
+
+
+def _future_result(future) -> Callable:
+    def result() -> Tuple[List[Document], float]:
+        return future.result()
+
+    return result
+
+
+def _parse_large_pdf(
+    executor,
+    input_file: str,
+    num_pages: int,
+    config: FileLoaderConfig,
+    file_extractor: Dict[str, BaseReader],
+):
+    """
+    Submit the page ranges of a large PDF and return a callable that waits for them
+    and builds the same output as PDFReader(return_full_document=True).
+    The returned time only covers waiting for the remaining page ranges.
+    """
+    futures = [
+        executor.submit(
+            _extract_pdf_pages,
+            Path(input_file),
+            start,
+            min(start + config.pdf_pages_per_task, num_pages),
         )
-        return reader.load_data()
+        for start in range(0, num_pages, config.pdf_pages_per_task)
+    ]
+
+    def result() -> Tuple[List[Document], float]:
+        start = time.perf_counter()
+        pages = [text for future in futures for text in future.result()]
+        documents = _documents_from_texts(input_file, ["\n".join(pages)], file_extractor)
+        return documents, time.perf_counter() - start
+
+    return result
+
+
+def _iter_files_in_parallel(
+    input_files: Iterable[str],
+    config: FileLoaderConfig,
+    file_extractor: Dict[str, BaseReader],
+) -> Iterator[Document]:
+    """
+    Parse the files in a process pool.
+    Large PDFs are split into page ranges so a single big file does not hold up
+    the whole run. Documents are yielded in the same order as the input files and
+    only a bounded number of files is pulled from `input_files` ahead of the consumer.
+    Workbooks are streamed in this process instead of being parsed in the pool.
+    """
+    num_workers = config.num_workers or os.cpu_count() or 1
+    max_pending = num_workers * 2
+
+    # Forked workers would inherit the locks and threads of the parent (e.g. the
+    # download stage), which can deadlock them
+    with ProcessPoolExecutor(
+        max_workers=num_workers, mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        pending: Deque[Tuple[str, Optional[Callable]]] = deque()
+
+        def submit(input_file: str) -> None:
+            if _is_xlsx(input_file):
+                pending.append((input_file, None))
+                return
+            num_pages = (
+                _count_pdf_pages(Path(input_file))
+                if input_file.lower().endswith(".pdf")
+                else 0
+            )
+            if num_pages >= config.pdf_page_split_threshold:
+                result = _parse_large_pdf(
+                    executor, input_file, num_pages, config, file_extractor
+                )
+            else:
+                result = _future_result(
+                    executor.submit(_load_file, input_file, file_extractor)
+                )
+            pending.append((input_file, result))
+
+        files = iter(input_files)
+        for input_file in files:
+            submit(input_file)
+            if len(pending) >= max_pending:
+                break
+        while pending:
+            input_file, result = pending.popleft()
+            if result is None:
+                next_file = next(files, None)
+                if next_file is not None:
+                    submit(next_file)
+                start = time.perf_counter()
+                yield from _iter_xlsx_documents(input_file, file_extractor)
+                logger.info(f"Parsed {input_file} in {time.perf_counter() - start:.2f}s")
+                continue
+            documents, elapsed = result()
+            logger.info(f"Parsed {input_file} in {elapsed:.2f}s")
+            next_file = next(files, None)
+            if next_file is not None:
+                submit(next_file)
+            yield from documents
+
+
+def _iter_files_serially(
+    input_files: Iterable[str], file_extractor: Dict[str, BaseReader]
+) -> Iterator[Document]:
+    for input_file in input_files:
+        if _is_xlsx(input_file):
+            yield from _iter_xlsx_documents(input_file, file_extractor)
+            continue
+        documents, elapsed = _load_file(input_file, file_extractor)
+        logger.info(f"Parsed {input_file} in {elapsed:.2f}s")
+        yield from documents
+
+
+def _list_data_files() -> List[str]:
+    from llama_index.core.readers import SimpleDirectoryReader
+
+    try:
+        reader = SimpleDirectoryReader(DATA_DIR, recursive=True)
     except Exception as e:
         import sys
         import traceback
@@ -72,3 +274,122 @@ def get_file_documents(config: FileLoaderConfig):
         else:
             # Raise the error if it is not the case of empty data dir
             raise e
+    return sorted(str(input_file) for input_file in reader.input_files)
+
+
+async def _aparse_with_llama_parse(
+    input_files: Iterable[str],
+    parser: Any,
+    cache: ParseCache,
+    config: FileLoaderConfig,
+    emit: Callable[[List[Document]], None],
+) -> None:
+    """
+    Parse files with LlamaParse concurrently, at most `llama_parse_max_concurrency`
+    at a time. Texts are cached by file content hash and parser settings.
+    Spreadsheets and files LlamaParse doesn't support are parsed with the default readers.
+    """
+    from llama_parse.utils import SUPPORTED_FILE_TYPES
+
+    max_concurrency = config.llama_parse_max_concurrency
+    semaphore = asyncio.Semaphore(max_concurrency)
+    settings_key = parser_settings_key(parser)
+    default_extractor = _default_file_extractor(config)
+
+    async def parse(input_file: str) -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            suffix = Path(input_file).suffix.lower()
+            if suffix in XLSX_EXTENSIONS or suffix not in SUPPORTED_FILE_TYPES:
+                documents, elapsed = await asyncio.to_thread(
+                    _load_file, input_file, default_extractor
+                )
+                logger.info(f"Parsed {input_file} in {elapsed:.2f}s")
+                emit(documents)
+                return
+            key = cache.key(await asyncio.to_thread(hash_file, input_file), settings_key)
+            texts = await asyncio.to_thread(cache.get, key)
+            if texts is None:
+                parsed = await parser.aload_data(input_file)
+                texts = [doc.text for doc in parsed]
+                await asyncio.to_thread(cache.put, key, texts)
+                logger.info(
+                    f"Parsed {input_file} with LlamaParse in {time.perf_counter() - start:.2f}s"
+                )
+            else:
+                logger.info(f"Loaded {input_file} from the LlamaParse cache")
+            documents = await asyncio.to_thread(
+                _documents_from_texts, input_file, texts, default_extractor
+            )
+            emit(documents)
+
+    files = iter(input_files)
+    pending: set = set()
+    while True:
+        # `input_files` may block while waiting for downloads, keep it off the event loop
+        input_file = await asyncio.to_thread(next, files, None)
+        if input_file is None:
+            break
+        if len(pending) >= max_concurrency * 2:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()
+        pending.add(asyncio.create_task(parse(input_file)))
+    for task in await asyncio.gather(*pending, return_exceptions=True):
+        if isinstance(task, BaseException):
+            raise task
+
+
+def _iter_files_with_llama_parse(
+    input_files: Iterable[str], config: FileLoaderConfig, parser: Optional[Any] = None
+) -> Iterator[Document]:
+    """
+    Run the async LlamaParse stage in its own event loop and yield the documents
+    as files finish parsing.
+    """
+    parser = parser or llama_parse_parser()
+    cache = ParseCache()
+    documents: StageQueue[List[Document]] = StageQueue(config.llama_parse_max_concurrency)
+    stage = Stage(
+        "llama-parse",
+        lambda: asyncio.run(
+            _aparse_with_llama_parse(
+                input_files, parser, cache, config, documents.put
+            )
+        ),
+        output=documents,
+    )
+    stage.start()
+    for file_documents in documents:
+        yield from file_documents
+    stage.result()
+    cache.log_stats()
+
+
+def get_file_documents(
+    config: FileLoaderConfig,
+    input_files: Optional[Iterable[str]] = None,
+    llama_parser: Optional[Any] = None,
+) -> Iterator[Document]:
+    """
+    Yield the documents of the data dir file by file.
+    If `input_files` is given, only those files are parsed. It can be a lazy
+    iterable (e.g. fed by the download stage), files are pulled as the parser has room.
+    `llama_parser` replaces the LlamaParse client (any object with an async
+    `aload_data(file_path)`), e.g. one pointing to a local server.
+    """
+    if input_files is None:
+        input_files = _list_data_files()
+    # Absolute paths keep the document ids (`<path>_part_<n>`) stable across runs
+    input_files = (os.path.abspath(input_file) for input_file in input_files)
+
+    file_extractor = _default_file_extractor(config)
+    if config.use_llama_parse:
+        documents = _iter_files_with_llama_parse(input_files, config, llama_parser)
+    elif config.num_workers == 1:
+        documents = _iter_files_serially(input_files, file_extractor)
+    else:
+        documents = _iter_files_in_parallel(input_files, config, file_extractor)
+    for document in documents:
+        # Year/month of the YYYY-MM folder, used to filter time-scoped questions
+        yield add_period_metadata(document, DATA_DIR)
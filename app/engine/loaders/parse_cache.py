@@ -0,0 +1,78 @@
+import hashlib
+import json
+import logging
+import os
+from typing import Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+STORAGE_DIR = os.getenv("STORAGE_DIR", "storage")
+LLAMA_PARSE_CACHE_DIR = os.getenv(
+    "LLAMA_PARSE_CACHE_DIR", os.path.join(STORAGE_DIR, "llama_parse_cache")
+)
+
+# Parser fields that don't change the parsed output
+_NON_OUTPUT_SETTINGS = {
+    "api_key",
+    "base_url",
+    "verbose",
+    "show_progress",
+    "num_workers",
+    "check_interval",
+    "max_timeout",
+    "custom_client",
+    "ignore_errors",
+}
+
+
+def parser_settings_key(parser: Any) -> str:
+    """
+    Hash the parser settings that affect the output (result type, language,
+    instructions...), so changing them invalidates the cached results.
+    """
+    if hasattr(parser, "model_dump"):
+        settings = parser.model_dump(exclude=_NON_OUTPUT_SETTINGS)
+    else:
+        settings = {"parser": type(parser).__name__}
+    raw = json.dumps(settings, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ParseCache:
+    """
+    On-disk cache of parsed texts keyed by file content hash and parser settings,
+    so an unchanged file is never sent to the parsing service again.
+    """
+
+    def __init__(self, cache_dir: str = LLAMA_PARSE_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(content_hash: str, settings_key: str) -> str:
+        return hashlib.sha256(f"{content_hash}:{settings_key}".encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[List[str]]:
+        path = self._path(key)
+        if not os.path.exists(path):
+            self.misses += 1
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            texts = json.load(f)
+        self.hits += 1
+        return texts
+
+    def put(self, key: str, texts: List[str]) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(texts, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def log_stats(self) -> None:
+        logger.info(f"LlamaParse cache: {self.hits} hits, {self.misses} misses")
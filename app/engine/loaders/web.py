@@ -1,36 +1,71 @@
-from typing import List, Optional
+import asyncio
+from typing import Iterator, List, Optional
+
+from llama_index.core import Document
 
 from pydantic import BaseModel, Field
 
+from app.engine.loaders.crawler import BrowserPool, WebCrawler, WebCrawlState
+from app.engine.stages import Stage, StageQueue
+
 
 class CrawlUrl(BaseModel):
     base_url: str
     prefix: str
     max_depth: int = Field(default=1, ge=0)
+    # True: always render in the browser, False: never,
+    # None: only pages whose HTML has almost no text
+    render_js: Optional[bool] = None
 
 
 class WebLoaderConfig(BaseModel):
     driver_arguments: Optional[List[str]] = Field(default_factory=list)
     urls: List[CrawlUrl]
+    # Pages fetched at the same time
+    max_concurrency: int = Field(default=8, ge=1)
+    # Headless browsers kept open for pages that need JavaScript
+    browser_pool_size: int = Field(default=2, ge=0)
+    # Pages whose HTML has less text than this are rendered in the browser
+    min_text_length: int = 200
 
 
-def get_web_documents(config: WebLoaderConfig):
-    from llama_index.readers.web import WholeSiteReader
-    from selenium import webdriver
-    from selenium.webdriver.chrome.options import Options
-
-    options = Options()
-    driver_arguments = config.driver_arguments or []
-    for arg in driver_arguments:
-        options.add_argument(arg)
+def get_web_documents(
+    config: WebLoaderConfig, crawl_state: Optional[WebCrawlState] = None
+) -> Iterator[Document]:
+    """
+    Crawl the configured URLs and yield the pages as they are fetched.
+    If `crawl_state` is given, pages unchanged since the last crawl are skipped.
+    """
+    browser_pool = (
+        BrowserPool(config.browser_pool_size, config.driver_arguments or [])
+        if config.browser_pool_size
+        else None
+    )
+    crawler = WebCrawler(
+        max_concurrency=config.max_concurrency,
+        browser_pool=browser_pool,
+        state=crawl_state,
+        min_text_length=config.min_text_length,
+    )
+    documents: StageQueue[Document] = StageQueue(config.max_concurrency * 4)
 
-    docs = []
-    for url in config.urls:
-        scraper = WholeSiteReader(
-            prefix=url.prefix,
-            max_depth=url.max_depth,
-            driver=webdriver.Chrome(options=options),
-        )
-        docs.extend(scraper.load_data(url.base_url))
+    async def crawl_all():
+        for url in config.urls:
+            await crawler.crawl(
+                url.base_url,
+                url.prefix,
+                url.max_depth,
+                emit=documents.put,
+                render_js=url.render_js,
+            )
 
-    return docs
+    # The crawler runs its own event loop in a thread, pages are yielded as they
+    # arrive and the bounded queue pauses the crawl if the consumer falls behind
+    stage = Stage("web-crawl", lambda: asyncio.run(crawl_all()), output=documents)
+    stage.start()
+    try:
+        yield from documents
+        stage.result()
+    finally:
+        if browser_pool is not None:
+            browser_pool.close()
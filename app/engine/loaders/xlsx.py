@@ -0,0 +1,118 @@
+import logging
+from datetime import date, datetime, time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from llama_index.core import Document
+from llama_index.core.readers.base import BaseReader
+
+logger = logging.getLogger(__name__)
+
+XLSX_EXTENSIONS = (".xlsx", ".xlsm")
+
+
+def _format_cell(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        # Excel stores dates as datetimes at midnight
+        if value.time() == time(0):
+            return value.date().isoformat()
+        return value.isoformat(sep=" ")
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value).replace("\n", " ").replace("|", "/").strip()
+
+
+def _format_row(values: Sequence[Any]) -> List[str]:
+    cells = [_format_cell(value) for value in values]
+    while cells and not cells[-1]:
+        cells.pop()
+    return cells
+
+
+def _format_table(header: List[str], rows: List[List[str]]) -> str:
+    width = max([len(header)] + [len(row) for row in rows])
+    lines = [header + [""] * (width - len(header)), ["---"] * width]
+    lines.extend(row + [""] * (width - len(row)) for row in rows)
+    return "\n".join("| " + " | ".join(line) + " |" for line in lines)
+
+
+class StreamingXLSXReader(BaseReader):
+    """
+    Read Excel workbooks row by row in openpyxl read-only mode, so memory does not
+    grow with the number of rows. Each window of `rows_per_document` rows becomes a
+    document that repeats the header row (the first non-empty row of the sheet)
+    and records the sheet and the rows it covers.
+    """
+
+    def __init__(self, rows_per_document: int = 50):
+        self.rows_per_document = rows_per_document
+
+    def _window_document(
+        self,
+        sheet_name: str,
+        header: List[str],
+        rows: List[List[str]],
+        row_start: int,
+        row_end: int,
+        extra_info: Optional[Dict],
+    ) -> Document:
+        metadata = dict(extra_info or {})
+        metadata.update(
+            {"sheet_name": sheet_name, "row_start": row_start, "row_end": row_end}
+        )
+        document = Document(
+            text=f"Sheet: {sheet_name}\n{_format_table(header, rows)}",
+            metadata=metadata,
+        )
+        document.excluded_embed_metadata_keys.extend(["row_start", "row_end"])
+        return document
+
+    def lazy_load_data(
+        self, file: Path, extra_info: Optional[Dict] = None, **kwargs: Any
+    ) -> Iterator[Document]:
+        import openpyxl
+
+        workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+        try:
+            for sheet in workbook.worksheets:
+                header: Optional[List[str]] = None
+                header_row = 0
+                rows: List[List[str]] = []
+                row_start = row_end = 0
+                for row_number, values in enumerate(
+                    sheet.iter_rows(values_only=True), start=1
+                ):
+                    cells = _format_row(values)
+                    if not cells:
+                        continue
+                    if header is None:
+                        header = cells
+                        header_row = row_number
+                        continue
+                    if not rows:
+                        row_start = row_number
+                    rows.append(cells)
+                    row_end = row_number
+                    if len(rows) >= self.rows_per_document:
+                        yield self._window_document(
+                            sheet.title, header, rows, row_start, row_end, extra_info
+                        )
+                        rows = []
+                if rows:
+                    yield self._window_document(
+                        sheet.title, header, rows, row_start, row_end, extra_info
+                    )
+                elif header is not None and not row_end:
+                    # Sheet with a single row, keep it instead of dropping the sheet
+                    yield self._window_document(
+                        sheet.title, header, [], header_row, header_row, extra_info
+                    )
+        finally:
+            workbook.close()
+
+    def load_data(
+        self, file: Path, extra_info: Optional[Dict] = None, **kwargs: Any
+    ) -> List[Document]:
+        return list(self.lazy_load_data(file, extra_info=extra_info))
@@ -0,0 +1,245 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+from llama_index.core import Document
+from llama_index.core.schema import BaseNode
+
+logger = logging.getLogger(__name__)
+
+STORAGE_DIR = os.getenv("STORAGE_DIR", "storage")
+MANIFEST_PATH = os.getenv(
+    "INGESTION_MANIFEST_PATH", os.path.join(STORAGE_DIR, "ingestion_manifest.json")
+)
+HASH_CHUNK_SIZE = 1024 * 1024
+# Bump when the documents produced from a file change (e.g. new metadata),
+# so every file is ingested again on the next run
+MANIFEST_VERSION = 3
+
+
+def hash_file(path: str) -> str:
+    """
+    Hash a file in fixed-size chunks so large files are never fully loaded in memory.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def source_path_from_doc_id(doc_id: str) -> str:
+    """
+    Documents loaded with `filename_as_id=True` have ids like `<path>_part_<n>`.
+    """
+    return doc_id.rsplit("_part_", 1)[0]
+
+
+@dataclass
+class ManifestEntry:
+    size: int
+    mtime_ns: int
+    hash: str
+    doc_ids: List[str] = field(default_factory=list)
+    node_ids: List[str] = field(default_factory=list)
+
+
+@dataclass
+class ManifestChanges:
+    new: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    deleted: List[str] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+
+    @property
+    def to_ingest(self) -> List[str]:
+        return sorted(self.new + self.changed)
+
+    def has_changes(self) -> bool:
+        return bool(self.new or self.changed or self.deleted)
+
+
+class IngestionManifest:
+    """
+    Persistent record of the files in DATA_DIR that have been ingested, with their
+    size, mtime, content hash and the document and node ids they produced.
+    Used to parse, chunk and embed only new or changed files on each run.
+    """
+
+    def __init__(self, path: str = MANIFEST_PATH):
+        self.path = path
+        self.entries: Dict[str, ManifestEntry] = {}
+        self.version = MANIFEST_VERSION
+        # Content hashes computed during `scan`, recorded once ingestion succeeds
+        self._pending: Dict[str, ManifestEntry] = {}
+        # `track` is called from the download stage while batches are added
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str = MANIFEST_PATH) -> "IngestionManifest":
+        manifest = cls(path)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            # The first manifests were a plain {path: entry} mapping
+            manifest.version = data.get("version", 1) if "files" in data else 1
+            files = data["files"] if "files" in data else data
+            manifest.entries = {
+                file_path: ManifestEntry(**entry) for file_path, entry in files.items()
+            }
+        return manifest
+
+    def persist(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "version": self.version,
+                    "files": {
+                        file_path: vars(entry) for file_path, entry in self.entries.items()
+                    },
+                },
+                f,
+            )
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def list_files(data_dir: str) -> List[str]:
+        """
+        List the files in `data_dir` with absolute paths, matching the document ids.
+        """
+        files = []
+        for root, dirs, file_names in os.walk(os.path.abspath(data_dir)):
+            # Skip hidden files and folders like SimpleDirectoryReader does
+            dirs[:] = [d for d in dirs if not d.startswith(".")]
+            files.extend(
+                os.path.join(root, name)
+                for name in file_names
+                if not name.startswith(".")
+            )
+        return sorted(files)
+
+    def scan(self, data_dir: str) -> ManifestChanges:
+        """
+        Compare the files in `data_dir` with the manifest.
+        Files are only re-hashed when their size or mtime changed.
+        After a manifest version change every file is reported as changed.
+        """
+        changes = ManifestChanges()
+        self._pending = {}
+        outdated = self.version != MANIFEST_VERSION
+        if outdated:
+            logger.info(
+                f"Ingestion manifest version changed ({self.version} -> {MANIFEST_VERSION}), "
+                "ingesting all files again"
+            )
+        current_files = self.list_files(data_dir)
+        for file_path in current_files:
+            stat = os.stat(file_path)
+            entry = self.entries.get(file_path)
+            if (
+                not outdated
+                and entry is not None
+                and entry.size == stat.st_size
+                and entry.mtime_ns == stat.st_mtime_ns
+            ):
+                changes.unchanged.append(file_path)
+                continue
+            content_hash = hash_file(file_path)
+            if not outdated and entry is not None and entry.hash == content_hash:
+                # Touched but identical, only refresh the stat fields
+                entry.size = stat.st_size
+                entry.mtime_ns = stat.st_mtime_ns
+                changes.unchanged.append(file_path)
+                continue
+            self._pending[file_path] = ManifestEntry(
+                size=stat.st_size, mtime_ns=stat.st_mtime_ns, hash=content_hash
+            )
+            if entry is None:
+                changes.new.append(file_path)
+            else:
+                changes.changed.append(file_path)
+        current = set(current_files)
+        changes.deleted = sorted(p for p in self.entries if p not in current)
+        logger.info(
+            f"Ingestion manifest: {len(changes.new)} new, {len(changes.changed)} changed, "
+            f"{len(changes.deleted)} deleted, {len(changes.unchanged)} unchanged files"
+        )
+        return changes
+
+    def track(self, file_path: str) -> None:
+        """
+        Mark a file written during this run (e.g. downloaded) as to be ingested.
+        """
+        file_path = os.path.abspath(file_path)
+        stat = os.stat(file_path)
+        entry = ManifestEntry(
+            size=stat.st_size, mtime_ns=stat.st_mtime_ns, hash=hash_file(file_path)
+        )
+        with self._lock:
+            self._pending[file_path] = entry
+
+    def add_batch(
+        self,
+        documents: Sequence[Document],
+        nodes: Optional[Sequence[BaseNode]] = None,
+    ) -> None:
+        """
+        Collect the ids of the documents and nodes produced by the files being ingested.
+        Called once per ingestion batch, documents of other loaders are ignored.
+        """
+        with self._lock:
+            for doc in documents:
+                entry = self._pending.get(source_path_from_doc_id(doc.doc_id))
+                if entry is not None and doc.doc_id not in entry.doc_ids:
+                    entry.doc_ids.append(doc.doc_id)
+            for node in nodes or []:
+                if node.ref_doc_id:
+                    entry = self._pending.get(source_path_from_doc_id(node.ref_doc_id))
+                    if entry is not None:
+                        entry.node_ids.append(node.node_id)
+
+    def commit(self) -> List[str]:
+        """
+        Record the ingested files in the manifest.
+        Return the document ids previously produced by changed files that are no
+        longer produced, so they can be removed from the stores.
+        """
+        stale_doc_ids: List[str] = []
+        for file_path, entry in self._pending.items():
+            previous = self.entries.get(file_path)
+            if previous is not None:
+                current = set(entry.doc_ids)
+                stale_doc_ids.extend(
+                    doc_id for doc_id in previous.doc_ids if doc_id not in current
+                )
+            self.entries[file_path] = entry
+        self._pending = {}
+        self.version = MANIFEST_VERSION
+        return stale_doc_ids
+
+    def remove(self, file_path: str) -> List[str]:
+        """
+        Remove a file from the manifest and return the document ids it produced.
+        """
+        file_path = os.path.abspath(file_path)
+        with self._lock:
+            if file_path in self._pending:
+                # Re-written at the same path during this run, `commit` replaces its ids
+                return []
+        entry = self.entries.pop(file_path, None)
+        return entry.doc_ids if entry else []
+
+    def invalidate(self, file_path: str) -> None:
+        """
+        Force a file to be ingested again on the next run.
+        """
+        entry = self.entries.get(os.path.abspath(file_path))
+        if entry is not None:
+            entry.size = -1
+            entry.hash = ""
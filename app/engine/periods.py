@@ -0,0 +1,283 @@
+import logging
+import os
+import re
+import unicodedata
+from dataclasses import dataclass
+from datetime import date
+from typing import Any, Callable, List, Optional, Tuple
+
+from llama_index.core.base.base_retriever import BaseRetriever
+from llama_index.core.schema import Document, NodeWithScore, QueryBundle
+from llama_index.core.vector_stores.types import (
+    FilterOperator,
+    MetadataFilter,
+    MetadataFilters,
+)
+
+from app.engine.query_filter import metadata_matches
+
+logger = logging.getLogger(__name__)
+
+# Metadata added to every document stored in a YYYY-MM folder
+PERIOD_METADATA_KEYS = ["year", "month", "period"]
+
+MONTH_NAMES = {
+    "01": "Janeiro",   "02": "Fevereiro", "03": "Março",
+    "04": "Abril",     "05": "Maio",      "06": "Junho",
+    "07": "Julho",     "08": "Agosto",    "09": "Setembro",
+    "10": "Outubro",   "11": "Novembro",  "12": "Dezembro"
+}
+
+# A chunk skipped as a near duplicate of a chunk of another period is not indexed,
+# the canonical chunk is linked to its period with a `linked_period_<YYYY-MM>` key
+LINKED_PERIOD_PREFIX = "linked_period_"
+
+# Files are organized in YYYY-MM folders
+_YEAR_MONTH_FOLDER_PATTERN = re.compile(r"(\d{4})-(\d{2})")
+
+
+def month_full_name(month_str: str) -> str:
+    """
+    Converts a month number string to its full name in Portuguese.
+    For example, converts '07' to 'Julho' and '09' to 'Setembro'.
+    """
+    return MONTH_NAMES.get(month_str, month_str)
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase and strip accents, so "Março" and "marco" match."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+_MONTH_NUMBERS = {normalize_text(name): int(number) for number, name in MONTH_NAMES.items()}
+# "may" is left out, it is too common as a verb
+_MONTH_NUMBERS.update(
+    {
+        "january": 1, "february": 2, "march": 3, "april": 4,
+        "june": 6, "july": 7, "august": 8, "september": 9,
+        "october": 10, "november": 11, "december": 12,
+    }
+)
+_MONTH = "(" + "|".join(_MONTH_NUMBERS) + ")"
+_YEAR = r"((?:19|20)\d{2})"
+
+_NUMERIC_MONTH_PATTERNS = [
+    # 03/2022, but not part of a number like "4.966/2021"
+    (re.compile(rf"(?<![\d./])(0?[1-9]|1[0-2])[/-]{_YEAR}\b"), (0, 1)),
+    # 2022-03
+    (re.compile(rf"(?<![\d./]){_YEAR}-(0[1-9]|1[0-2])\b"), (1, 0)),
+]
+_MONTH_YEAR_PATTERN = re.compile(rf"\b{_MONTH}\s*(?:de\s+|/\s*|\s)\s*{_YEAR}\b")
+# A month name alone must follow a preposition ("em março"), "marco" is also a noun
+_MONTH_ALONE_PATTERN = re.compile(rf"\b(?:em|de|no mes de|mes de|in|of)\s+{_MONTH}\b")
+_YEAR_RANGE_PATTERN = re.compile(
+    rf"\b(?:entre|de|from|between)\s+{_YEAR}\s+(?:e|a|ate|and|to)\s+{_YEAR}\b"
+)
+_SINCE_YEAR_PATTERN = re.compile(rf"\b(?:desde|a partir de|since)\s+{_YEAR}\b")
+# A bare year must follow a preposition too, "Resolução 4.966/2021" is not a period
+_YEAR_PATTERN = re.compile(
+    rf"\b(?:em|de|no ano de|do ano de|ano|in|of|during)\s+{_YEAR}\b"
+)
+# "último manual" or "documento mais recente", but not "última atualização da norma"
+_DOCUMENT_NOUN = r"(manual|manuais|documento|documentos|arquivo|arquivos|mps?|migs?|organogramas?|normativos?)"
+_LATEST_PATTERN = re.compile(
+    rf"\b(?:ultimo|ultima|ultimos|ultimas|mais recentes?|latest|most recent)\s+{_DOCUMENT_NOUN}\b"
+    rf"|\b{_DOCUMENT_NOUN}\s+mais recentes?\b"
+)
+_THIS_YEAR_PATTERN = re.compile(r"\b(este ano|neste ano|esse ano|nesse ano|ano atual|this year)\b")
+_LAST_YEAR_PATTERN = re.compile(r"\b(ano passado|last year)\b")
+
+
+def linked_period_key(period: str) -> str:
+    return f"{LINKED_PERIOD_PREFIX}{period}"
+
+
+def period_from_path(relative_path: str) -> Optional[Tuple[str, str]]:
+    """
+    Return the (year, month) of the YYYY-MM folder a file is stored in.
+    The path should be relative to the data dir, so the data dir itself does not match.
+    """
+    match = _YEAR_MONTH_FOLDER_PATTERN.search(os.path.dirname(relative_path))
+    if match is None:
+        return None
+    return match.group(1), match.group(2)
+
+
+def add_period_metadata(document: Document, data_dir: str) -> Document:
+    """
+    Store normalized year, month and period metadata on a document of a YYYY-MM folder.
+    The keys are kept out of the embedded text, so embeddings don't change.
+    """
+    file_path = document.metadata.get("file_path")
+    if not file_path:
+        return document
+    relative_path = os.path.relpath(os.path.abspath(file_path), os.path.abspath(data_dir))
+    period = period_from_path(relative_path)
+    if period is None:
+        return document
+    year, month = period
+    document.metadata.update({"year": int(year), "month": int(month), "period": f"{year}-{month}"})
+    for key in PERIOD_METADATA_KEYS:
+        if key not in document.excluded_embed_metadata_keys:
+            document.excluded_embed_metadata_keys.append(key)
+    # The LLM only needs the period
+    for key in ("year", "month"):
+        if key not in document.excluded_llm_metadata_keys:
+            document.excluded_llm_metadata_keys.append(key)
+    return document
+
+
+@dataclass
+class PeriodQuery:
+    year: Optional[int] = None
+    month: Optional[int] = None
+    year_from: Optional[int] = None
+    year_to: Optional[int] = None
+    # "último manual": the most recent period (within `year` if given)
+    latest: bool = False
+
+    def to_filters(self, periods: List[str]) -> Optional[MetadataFilters]:
+        """
+        Build the metadata filters for the question.
+        `periods` are the YYYY-MM periods that have documents, used for `latest`.
+        """
+        if self.latest and self.month is None:
+            candidates = [
+                p for p in periods if self.year is None or p.startswith(f"{self.year:04d}-")
+            ]
+            if candidates:
+                return _filters(MetadataFilter(key="period", value=max(candidates)))
+        if self.year is not None and self.month is not None:
+            return _filters(
+                MetadataFilter(key="period", value=f"{self.year:04d}-{self.month:02d}")
+            )
+        if self.year is not None:
+            return _filters(MetadataFilter(key="year", value=self.year))
+        if self.month is not None:
+            return _filters(MetadataFilter(key="month", value=self.month))
+        year_filters = []
+        if self.year_from is not None:
+            year_filters.append(
+                MetadataFilter(key="year", value=self.year_from, operator=FilterOperator.GTE)
+            )
+        if self.year_to is not None:
+            year_filters.append(
+                MetadataFilter(key="year", value=self.year_to, operator=FilterOperator.LTE)
+            )
+        return _filters(*year_filters) if year_filters else None
+
+
+def _filters(*filters: MetadataFilter) -> MetadataFilters:
+    return MetadataFilters(filters=list(filters))
+
+
+def include_linked_chunks(filters: MetadataFilters, periods: List[str]) -> MetadataFilters:
+    """
+    Extend period filters to the chunks linked to one of the matching `periods`,
+    i.e. the chunks kept in place of their near duplicates of those periods.
+    """
+    linked = []
+    for period in periods:
+        year, month = period.split("-")
+        metadata = {"period": period, "year": int(year), "month": int(month)}
+        if metadata_matches(metadata, filters):
+            linked.append(MetadataFilter(key=linked_period_key(period), value="true"))
+    if not linked:
+        return filters
+    return MetadataFilters(filters=[filters, *linked], condition="or")  # type: ignore
+
+
+def extract_period(question: str, today: Optional[date] = None) -> Optional[PeriodQuery]:
+    """
+    Lightweight extractor of the period a Portuguese (or English) question refers to,
+    e.g. "em março de 2022", "03/2022", "entre 2020 e 2022", "último manual".
+    Return None when the question is not time-scoped.
+    """
+    text = normalize_text(question)
+    today = today or date.today()
+    query = PeriodQuery(latest=_LATEST_PATTERN.search(text) is not None)
+
+    for pattern, (month_group, year_group) in _NUMERIC_MONTH_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            query.month = int(match.groups()[month_group])
+            query.year = int(match.groups()[year_group])
+            return query
+
+    match = _MONTH_YEAR_PATTERN.search(text)
+    if match:
+        query.month = _MONTH_NUMBERS[match.group(1)]
+        query.year = int(match.group(2))
+        return query
+
+    match = _YEAR_RANGE_PATTERN.search(text)
+    if match:
+        query.year_from, query.year_to = sorted(int(y) for y in match.groups())
+    else:
+        match = _SINCE_YEAR_PATTERN.search(text)
+        if match:
+            query.year_from = int(match.group(1))
+        else:
+            match = _YEAR_PATTERN.search(text)
+            if match:
+                query.year = int(match.group(1))
+            elif _LAST_YEAR_PATTERN.search(text):
+                query.year = today.year - 1
+            elif _THIS_YEAR_PATTERN.search(text):
+                query.year = today.year
+
+    match = _MONTH_ALONE_PATTERN.search(text)
+    if match:
+        query.month = _MONTH_NUMBERS[match.group(1)]
+
+    if query == PeriodQuery():
+        return None
+    return query
+
+
+class PeriodRetriever(BaseRetriever):
+    """
+    Push the period of a time-scoped question into the retrieval filters.
+    `build_retriever` creates the retriever for the given extra filters (None for
+    a question without period). If nothing matches the period, the question is
+    retried without it, so a wrong guess never leaves the answer without context.
+    """
+
+    def __init__(
+        self,
+        build_retriever: Callable[[Optional[MetadataFilters]], BaseRetriever],
+        get_periods: Callable[[], List[str]],
+        **kwargs: Any,
+    ):
+        super().__init__(**kwargs)
+        self._build_retriever = build_retriever
+        self._get_periods = get_periods
+
+    def _period_filters(self, query_bundle: QueryBundle) -> Optional[MetadataFilters]:
+        period = extract_period(query_bundle.query_str)
+        if period is None:
+            return None
+        periods = self._get_periods()
+        filters = period.to_filters(periods)
+        if filters is not None:
+            filters = include_linked_chunks(filters, periods)
+        logger.info(f"Filtering retrieval by period {period}: {filters}")
+        return filters
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        filters = self._period_filters(query_bundle)
+        if filters is not None:
+            nodes = self._build_retriever(filters).retrieve(query_bundle)
+            if nodes:
+                return nodes
+        return self._build_retriever(None).retrieve(query_bundle)
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        filters = self._period_filters(query_bundle)
+        if filters is not None:
+            nodes = await self._build_retriever(filters).aretrieve(query_bundle)
+            if nodes:
+                return nodes
+        return await self._build_retriever(None).aretrieve(query_bundle)
+
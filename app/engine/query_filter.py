@@ -32,3 +32,105 @@ def generate_filters(doc_ids):
         )
 
     return filters
+
+
+def combine_filters(*filters):
+    """
+    Combine metadata filters with AND, ignoring the ones that are None.
+    AND groups are merged into a single flat group; OR groups (e.g. the
+    public/private document filter) stay nested, vector stores translate them
+    with `to_chroma_where`.
+    """
+    filters = [f for f in filters if f is not None]
+    if not filters:
+        return None
+    if len(filters) == 1:
+        return filters[0]
+    combined = []
+    for f in filters:
+        if _condition(f) == "and":
+            combined.extend(f.filters)
+        else:
+            combined.append(f)
+    if len(combined) == 1 and isinstance(combined[0], MetadataFilters):
+        return combined[0]
+    return MetadataFilters(filters=combined, condition="and")  # type: ignore
+
+
+def _condition(filters: MetadataFilters) -> str:
+    return str(getattr(filters.condition, "value", filters.condition) or "and")
+
+
+_CHROMA_OPERATORS = {
+    "==": "$eq",
+    "!=": "$ne",
+    ">": "$gt",
+    ">=": "$gte",
+    "<": "$lt",
+    "<=": "$lte",
+    "in": "$in",
+    "nin": "$nin",
+}
+
+
+def to_chroma_where(filters: MetadataFilters) -> dict:
+    """
+    Translate metadata filters, including nested groups, to a Chroma `where` clause.
+    The Chroma integration only handles a flat list of filters.
+    """
+    clauses = []
+    for f in filters.filters:
+        if isinstance(f, MetadataFilters):
+            clause = to_chroma_where(f)
+            if clause:
+                clauses.append(clause)
+            continue
+        operator = str(getattr(f.operator, "value", f.operator))
+        if operator not in _CHROMA_OPERATORS:
+            raise ValueError(f"Unsupported metadata filter operator for Chroma: {operator}")
+        clauses.append({f.key: {_CHROMA_OPERATORS[operator]: f.value}})
+    if not clauses:
+        return {}
+    if len(clauses) == 1:
+        return clauses[0]
+    return {f"${_condition(filters)}": clauses}
+
+
+def has_nested_filters(filters: MetadataFilters) -> bool:
+    return any(isinstance(f, MetadataFilters) for f in filters.filters)
+
+
+def metadata_matches(metadata, filters):
+    """
+    Evaluate metadata filters against a metadata dict, for retrievers without
+    native filter support (e.g. BM25).
+    """
+    results = []
+    for f in filters.filters:
+        if isinstance(f, MetadataFilters):
+            results.append(metadata_matches(metadata, f))
+            continue
+        value = metadata.get(f.key)
+        operator = str(getattr(f.operator, "value", f.operator))
+        if value is None:
+            results.append(operator == "!=")
+        elif operator == "==":
+            results.append(value == f.value)
+        elif operator == "!=":
+            results.append(value != f.value)
+        elif operator == ">":
+            results.append(value > f.value)
+        elif operator == ">=":
+            results.append(value >= f.value)
+        elif operator == "<":
+            results.append(value < f.value)
+        elif operator == "<=":
+            results.append(value <= f.value)
+        elif operator == "in":
+            results.append(value in f.value)
+        elif operator == "nin":
+            results.append(value not in f.value)
+        else:
+            raise ValueError(f"Unsupported metadata filter operator: {operator}")
+    condition = str(getattr(filters.condition, "value", filters.condition))
+    return any(results) if condition == "or" else all(results)
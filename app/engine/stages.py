@@ -0,0 +1,75 @@
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, Generic, Iterator, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_DONE = object()
+
+
+class StageQueue(Generic[T]):
+    """
+    Bounded queue connecting two ingestion stages.
+    `put` blocks while the queue is full, so a fast producer waits for a slow
+    consumer instead of buffering the whole corpus (backpressure).
+    Iterating the queue yields items until the producer closes it.
+    """
+
+    def __init__(self, maxsize: int):
+        self._queue: queue.Queue = queue.Queue(maxsize=maxsize)
+
+    def put(self, item: T) -> None:
+        self._queue.put(item)
+
+    def close(self) -> None:
+        self._queue.put(_DONE)
+
+    def __iter__(self) -> Iterator[T]:
+        while True:
+            item = self._queue.get()
+            if item is _DONE:
+                return
+            yield item
+
+
+class Stage(threading.Thread):
+    """
+    Run one ingestion stage in a background thread.
+    The output queue is closed when the stage ends, even on errors, so the next
+    stage never waits forever. The error is re-raised by `result`.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        target: Callable[[], Any],
+        output: Optional[StageQueue] = None,
+    ):
+        # Daemon threads don't keep the process alive if the consumer stage fails
+        super().__init__(name=f"ingestion-{name}", daemon=True)
+        self.stage_name = name
+        self._stage_target = target
+        self._output = output
+        self._error: Optional[BaseException] = None
+
+    def run(self) -> None:
+        start = time.perf_counter()
+        try:
+            self._stage_target()
+        except BaseException as e:
+            self._error = e
+        finally:
+            if self._output is not None:
+                self._output.close()
+            logger.info(
+                f"Ingestion stage '{self.stage_name}' finished in {time.perf_counter() - start:.2f}s"
+            )
+
+    def result(self) -> None:
+        self.join()
+        if self._error is not None:
+            raise self._error
@@ -1,7 +1,73 @@
+import asyncio
+import logging
 import os
+from copy import copy
+from typing import Any, Dict, List
 
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.types import VectorStoreQuery, VectorStoreQueryResult
 from llama_index.vector_stores.chroma import ChromaVectorStore
 
+from app.engine.query_filter import has_nested_filters, to_chroma_where
+
+logger = logging.getLogger(__name__)
+
+# Used when the Chroma client does not report its maximum batch size
+DEFAULT_CHROMA_MAX_BATCH_SIZE = 5461
+
+
+class BatchedChromaVectorStore(ChromaVectorStore):
+    """
+    ChromaVectorStore that splits inserts into batches no larger than
+    the maximum batch size accepted by the Chroma server.
+    """
+
+    def _get_max_batch_size(self) -> int:
+        configured = os.getenv("CHROMA_MAX_BATCH_SIZE")
+        if configured:
+            return int(configured)
+        client = getattr(self._collection, "_client", None)
+        try:
+            if hasattr(client, "get_max_batch_size"):
+                return client.get_max_batch_size()
+            if hasattr(client, "max_batch_size"):
+                return client.max_batch_size
+        except Exception as e:
+            logger.warning(f"Failed to get the Chroma max batch size: {e}")
+        return DEFAULT_CHROMA_MAX_BATCH_SIZE
+
+    def add(self, nodes: List[BaseNode], **add_kwargs: Any) -> List[str]:
+        batch_size = self._get_max_batch_size()
+        ids: List[str] = []
+        for i in range(0, len(nodes), batch_size):
+            ids.extend(super().add(nodes[i : i + batch_size], **add_kwargs))
+        return ids
+
+    async def async_add(self, nodes: List[BaseNode], **add_kwargs: Any) -> List[str]:
+        # The Chroma client is synchronous, keep it off the event loop
+        return await asyncio.to_thread(self.add, nodes, **add_kwargs)
+
+    def update_metadata(self, metadata: Dict[str, Dict[str, Any]]) -> None:
+        """
+        Merge metadata keys into stored nodes, e.g. the periods a chunk is linked to
+        by the deduplication.
+        """
+        node_ids = list(metadata)
+        batch_size = self._get_max_batch_size()
+        for i in range(0, len(node_ids), batch_size):
+            batch = node_ids[i : i + batch_size]
+            self._collection.update(ids=batch, metadatas=[metadata[node_id] for node_id in batch])
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        # Nested filters (e.g. the private documents OR group combined with the
+        # period filters) are not supported by the Chroma integration
+        if query.filters is not None and has_nested_filters(query.filters):
+            where = to_chroma_where(query.filters)
+            query = copy(query)
+            query.filters = None
+            return super().query(query, where=where, **kwargs)
+        return super().query(query, **kwargs)
+
 
 def get_vector_store():
     collection_name = os.getenv("CHROMA_COLLECTION", "default")
@@ -9,7 +75,7 @@ def get_vector_store():
     # if CHROMA_PATH is set, use a local ChromaVectorStore from the path
     # otherwise, use a remote ChromaVectorStore (ChromaDB Cloud is not supported yet)
     if chroma_path:
-        store = ChromaVectorStore.from_params(
+        store = BatchedChromaVectorStore.from_params(
             persist_dir=chroma_path, collection_name=collection_name
         )
     else:
@@ -17,7 +83,7 @@ def get_vector_store():
             raise ValueError(
                 "Please provide either CHROMA_PATH or CHROMA_HOST and CHROMA_PORT"
             )
-        store = ChromaVectorStore.from_params(
+        store = BatchedChromaVectorStore.from_params(
             host=os.getenv("CHROMA_HOST"),
             port=os.getenv("CHROMA_PORT", "8001"),
             collection_name=collection_name,
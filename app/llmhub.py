@@ -1,7 +1,8 @@
 import logging
 import os
-from typing import Dict
+from typing import Dict, Optional
 
+from llama_index.core.llms import LLM
 from llama_index.core.settings import Settings
 from llama_index.embeddings.openai import OpenAIEmbedding
 
@@ -53,7 +54,9 @@ def embedding_config_from_env() -> Dict:
     return config
 
 
-def init_llmhub():
+def create_llmhub_llm(
+    model: Optional[str] = None, timeout: Optional[float] = None
+) -> LLM:
     try:
         from llama_index.llms.openai_like import OpenAILike
     except ImportError:
@@ -61,12 +64,21 @@ def init_llmhub():
         raise
 
     llm_configs = llm_config_from_env()
-    embedding_configs = embedding_config_from_env()
+    if model:
+        llm_configs["model"] = model
+    if timeout is not None:
+        llm_configs["timeout"] = timeout
 
-    Settings.embed_model = TSIEmbedding(**embedding_configs)
-    Settings.llm = OpenAILike(
+    return OpenAILike(
         **llm_configs,
         is_chat_model=True,
         is_function_calling_model=False,
         context_window=4096,
     )
+
+
+def init_llmhub():
+    embedding_configs = embedding_config_from_env()
+
+    Settings.embed_model = TSIEmbedding(**embedding_configs)
+    Settings.llm = create_llmhub_llm()
@@ -1,19 +1,20 @@
 import base64
+import hashlib
 import logging
 import mimetypes
 import os
 import re
+import shutil
 import uuid
-from io import BytesIO
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import BinaryIO, Callable, List, Optional, Tuple
 
 from llama_index.core import VectorStoreIndex
 from llama_index.core.ingestion import IngestionPipeline
 from llama_index.core.readers.file.base import (
     _try_loading_included_file_formats as get_file_loaders_map,
 )
-from llama_index.core.schema import Document
+from llama_index.core.schema import BaseNode, Document
 from llama_index.indices.managed.llama_cloud.base import LlamaCloudIndex
 from llama_index.readers.file import FlatReader
 from pydantic import BaseModel, Field
@@ -23,11 +24,18 @@ logger = logging.getLogger(__name__)
 PRIVATE_STORE_PATH = str(Path("output", "uploaded"))
 TOOL_STORE_PATH = str(Path("output", "tools"))
 LLAMA_CLOUD_STORE_PATH = str(Path("output", "llamacloud"))
+STORAGE_DIR = os.getenv("STORAGE_DIR", "storage")
+# Content of the private uploads, stored once by SHA-256 out of the file server
+UPLOAD_CONTENT_DIR = os.getenv(
+    "UPLOAD_CONTENT_DIR", os.path.join(STORAGE_DIR, "uploaded")
+)
+# Maximum size in bytes of a file uploaded from the chat
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", str(100 * 1024 * 1024)))
 
 
 class DocumentFile(BaseModel):
     id: str
-    name: str  # Stored file name
+    name: str  # Original file name
     type: str = None
     size: int = None
     url: str = None
@@ -39,6 +47,118 @@ class DocumentFile(BaseModel):
     refs: Optional[List[str]] = Field(
         None, description="The document ids in the index."
     )
+    content_hash: Optional[str] = Field(
+        None,
+        description="SHA-256 of the file content. Used internally in the server.",
+        exclude=True,
+    )
+
+    @property
+    def stored_name(self) -> str:
+        """
+        Name of the file in its directory, unique to this file.
+        """
+        return stored_file_name(self.id, self.name)
+
+    @property
+    def index_key(self) -> Optional[str]:
+        """
+        Uploads with the same content and name share their indexed documents,
+        whose metadata hold the file name.
+        """
+        if not self.content_hash:
+            return None
+        key = f"{self.content_hash}/{self.name}"
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+class FileTooLargeError(ValueError):
+    pass
+
+
+class UnsupportedFileError(ValueError):
+    pass
+
+
+class InvalidUploadError(ValueError):
+    pass
+
+
+class UploadWriter:
+    """
+    Write an uploaded file to disk chunk by chunk, computing its size and SHA-256
+    on the fly, so memory does not grow with the file size.
+    The content is stored once, as `<sha256>.<extension>` in `content_dir`, which
+    is not served. `close` links it to the file of this upload in `save_dir`,
+    named after the original name and the file id.
+    """
+
+    def __init__(
+        self,
+        file_name: str,
+        save_dir: str = PRIVATE_STORE_PATH,
+        max_size: int = MAX_UPLOAD_SIZE,
+        content_dir: str = UPLOAD_CONTENT_DIR,
+    ):
+        # Only the base name of what the client sent
+        self.name = os.path.basename(file_name.replace("\\", "/"))
+        self.file_id, self.stored_name, self.extension = _stored_file_name(self.name)
+        self.save_dir = save_dir
+        self.content_dir = content_dir
+        self.max_size = max_size
+        self.size = 0
+        self._digest = hashlib.sha256()
+        # Files created by `close`, removed by `abort`
+        self._created_paths: List[str] = []
+        self._tmp_path = os.path.join(content_dir, f"{self.file_id}.part")
+        os.makedirs(save_dir, exist_ok=True)
+        os.makedirs(content_dir, exist_ok=True)
+        self._file = open(self._tmp_path, "wb")
+
+    def write(self, data: bytes) -> None:
+        self.size += len(data)
+        if self.size > self.max_size:
+            raise FileTooLargeError(
+                f"File is larger than the maximum upload size of {self.max_size} bytes"
+            )
+        self._digest.update(data)
+        self._file.write(data)
+
+    def close(self) -> DocumentFile:
+        self._file.close()
+        content_hash = self._digest.hexdigest()
+        content_path = os.path.join(self.content_dir, f"{content_hash}.{self.extension}")
+        if os.path.exists(content_path):
+            os.remove(self._tmp_path)
+            logger.info(f"File content already stored at {content_path}")
+        else:
+            os.replace(self._tmp_path, content_path)
+            self._created_paths.append(content_path)
+        path = os.path.join(self.save_dir, self.stored_name)
+        _link_or_copy(content_path, path)
+        self._created_paths.append(path)
+        logger.info(f"Saved file to {path}")
+        return DocumentFile(
+            id=self.file_id,
+            name=self.name,
+            type=self.extension,
+            size=self.size,
+            path=path,
+            url=_file_url(self.save_dir, self.stored_name),
+            refs=None,
+            content_hash=content_hash,
+        )
+
+    def abort(self) -> None:
+        """
+        Drop the upload after a failure: the partial file, or the files stored by
+        `close`. Content stored before by another upload is kept.
+        """
+        self._file.close()
+        for path in [self._tmp_path, *self._created_paths]:
+            if os.path.exists(path):
+                os.remove(path)
+        self._created_paths = []
 
 
 class FileService:
@@ -56,6 +176,83 @@ class FileService:
         """
         Store the uploaded file and index it if necessary.
         """
+        document_file = cls.store_private_file(file_name, base64_content)
+        return cls.index_private_file(document_file, params)
+
+    @classmethod
+    def store_private_file(cls, file_name: str, base64_content: str) -> DocumentFile:
+        """
+        Decode a base64 data URL upload and store it in the private directory.
+        """
+        return cls.write_private_file(file_name, base64_content).close()
+
+    @classmethod
+    def write_private_file(cls, file_name: str, base64_content: str) -> UploadWriter:
+        """
+        Decode a base64 data URL upload and write it to the private directory.
+        The returned writer is closed to store the file, or aborted to drop it.
+        """
+        file_data, _ = cls._preprocess_base64_file(base64_content)
+        writer = UploadWriter(file_name)
+        try:
+            writer.write(file_data)
+        except BaseException:
+            writer.abort()
+            raise
+        return writer
+
+    @staticmethod
+    def find_indexed_upload(document_file: DocumentFile) -> Optional[List[str]]:
+        """
+        Return the document ids of an already indexed upload with the same content
+        and name and record `document_file` as one more owner of them, or None.
+        Access to private documents goes through their ids (refs), so sharing the
+        documents between uploads of the same content doesn't widen their scope.
+        """
+        from app.engine.docstore import get_doc_store
+        from app.services.upload_registry import get_upload_registry
+
+        index_key = document_file.index_key
+        if not index_key:
+            return None
+        registry = get_upload_registry()
+        indexed = registry.get(index_key)
+        if indexed is None:
+            return None
+        docstore = get_doc_store()
+        if any(
+            docstore.get_document(doc_id, raise_error=False) is None
+            for doc_id in indexed.refs
+        ):
+            # The index was rebuilt or the documents deleted since
+            registry.remove(index_key)
+            return None
+        registry.add_owner(index_key, document_file.id)
+        logger.info(
+            f"File {document_file.name} is already indexed, reusing {len(indexed.refs)} documents"
+        )
+        return indexed.refs
+
+    @classmethod
+    def index_private_file(
+        cls,
+        document_file: DocumentFile,
+        params: Optional[dict] = None,
+        on_status: Optional[Callable[[str], None]] = None,
+    ) -> DocumentFile:
+        """
+        Index a private file already stored on disk, e.g. by `UploadWriter`.
+        `on_status` is called with "parsing" and "embedding" as indexing progresses.
+        """
+        # Don't index csv files (they are handled by tools)
+        if document_file.type == "csv":
+            return document_file
+        # The same content was already indexed, share its documents
+        refs = cls.find_indexed_upload(document_file)
+        if refs is not None:
+            document_file.refs = refs
+            return document_file
+
         try:
             from app.engine.index import IndexConfig, get_index
         except ImportError as e:
@@ -68,31 +265,32 @@ class FileService:
         index_config = IndexConfig(**params)
         index = get_index(index_config)
 
-        # Preprocess and store the file
-        file_data, extension = cls._preprocess_base64_file(base64_content)
-
-        document_file = cls.save_file(
-            file_data,
-            file_name=file_name,
-            save_dir=PRIVATE_STORE_PATH,
-        )
-
-        # Don't index csv files (they are handled by tools)
-        if extension == "csv":
-            return document_file
-        else:
-            # Insert the file into the index and update document ids to the file metadata
-            if isinstance(index, LlamaCloudIndex):
+        # Insert the file into the index and update document ids to the file metadata
+        if on_status is not None:
+            on_status("parsing")
+        if isinstance(index, LlamaCloudIndex):
+            with open(document_file.path, "rb") as f:
                 doc_id = cls._add_file_to_llama_cloud_index(
-                    index, document_file.name, file_data
+                    index, document_file.name, f
+                )
+            # Add document ids to the file metadata
+            document_file.refs = [doc_id]
+        else:
+            documents = cls._load_file_to_documents(document_file)
+            if on_status is not None:
+                on_status("embedding")
+            nodes = cls._add_documents_to_vector_store_index(documents, index)
+            # Add document ids to the file metadata
+            document_file.refs = [doc.doc_id for doc in documents]
+            if document_file.index_key:
+                from app.services.upload_registry import get_upload_registry
+
+                get_upload_registry().add(
+                    document_file.index_key,
+                    document_file.refs,
+                    [node.node_id for node in nodes],
+                    owner=document_file.id,
                 )
-                # Add document ids to the file metadata
-                document_file.refs = [doc_id]
-            else:
-                documents = cls._load_file_to_documents(document_file)
-                cls._add_documents_to_vector_store_index(documents, index)
-                # Add document ids to the file metadata
-                document_file.refs = [doc.doc_id for doc in documents]
 
         # Return the file metadata
         return document_file
@@ -117,13 +315,8 @@ class FileService:
         if save_dir is None:
             save_dir = os.path.join("output", "uploaded")
 
-        file_id = str(uuid.uuid4())
-        name, extension = os.path.splitext(file_name)
-        extension = extension.lstrip(".")
-        sanitized_name = _sanitize_file_name(name)
-        if extension == "":
-            raise ValueError("File is not supported!")
-        new_file_name = f"{sanitized_name}_{file_id}.{extension}"
+        file_name = os.path.basename(file_name)
+        file_id, new_file_name, extension = _stored_file_name(file_name)
 
         file_path = os.path.join(save_dir, new_file_name)
 
@@ -150,37 +343,30 @@ class FileService:
 
         logger.info(f"Saved file to {file_path}")
 
-        file_url_prefix = os.getenv("FILESERVER_URL_PREFIX")
-        if file_url_prefix is None:
-            logger.warning(
-                "FILESERVER_URL_PREFIX is not set, fallback to http://localhost:8000/api/files"
-            )
-            file_url_prefix = "http://localhost:8000/api/files"
         file_size = os.path.getsize(file_path)
 
-        file_url = os.path.join(
-            file_url_prefix,
-            save_dir,
-            new_file_name,
-        )
-
         return DocumentFile(
             id=file_id,
-            name=new_file_name,
+            name=file_name,
             type=extension,
             size=file_size,
             path=file_path,
-            url=file_url,
+            url=_file_url(save_dir, new_file_name),
             refs=None,
+            content_hash=hashlib.sha256(content).hexdigest(),
         )
 
     @staticmethod
     def _preprocess_base64_file(base64_content: str) -> Tuple[bytes, str | None]:
-        header, data = base64_content.split(",", 1)
-        mime_type = header.split(";")[0].split(":", 1)[1]
-        extension = mimetypes.guess_extension(mime_type).lstrip(".")
-        # File data as bytes
-        return base64.b64decode(data), extension
+        try:
+            header, data = base64_content.split(",", 1)
+            mime_type = header.split(";")[0].split(":", 1)[1]
+            # File data as bytes
+            file_data = base64.b64decode(data)
+        except (ValueError, IndexError) as e:
+            raise InvalidUploadError(f"Invalid base64 data URL: {e}") from e
+        extension = mimetypes.guess_extension(mime_type)
+        return file_data, extension.lstrip(".") if extension else None
 
     @staticmethod
     def _load_file_to_documents(file: DocumentFile) -> List[Document]:
@@ -205,33 +391,40 @@ class FileService:
         # Add custom metadata
         for doc in documents:
             doc.metadata["file_name"] = file.name
+            # The file server path of the upload, for the citation URLs
+            doc.metadata["stored_file_name"] = file.stored_name
             doc.metadata["private"] = "true"
+            for keys in (doc.excluded_embed_metadata_keys, doc.excluded_llm_metadata_keys):
+                if "stored_file_name" not in keys:
+                    keys.append("stored_file_name")
         return documents
 
     @staticmethod
     def _add_documents_to_vector_store_index(
         documents: List[Document], index: VectorStoreIndex
-    ) -> None:
+    ) -> List[BaseNode]:
         """
-        Add the documents to the vector store index
+        Add the documents to the vector store index and return their nodes
         """
+        from app.engine.docstore import get_doc_store
+
         pipeline = IngestionPipeline()
         nodes = pipeline.run(documents=documents)
 
-        # Add the nodes to the index and persist it
+        # Add the nodes to the index
         if index is None:
             index = VectorStoreIndex(nodes=nodes)
         else:
             index.insert_nodes(nodes=nodes)
-        index.storage_context.persist(
-            persist_dir=os.environ.get("STORAGE_DIR", "storage")
-        )
+        # Upsert only the uploaded documents instead of rewriting the whole storage
+        get_doc_store().add_documents(documents)
+        return nodes
 
     @staticmethod
     def _add_file_to_llama_cloud_index(
         index: LlamaCloudIndex,
         file_name: str,
-        file_data: bytes,
+        file_data: BinaryIO,
     ) -> str:
         """
         Add the file to the LlamaCloud index.
@@ -243,7 +436,7 @@ class FileService:
             raise ValueError("LlamaCloudFileService is not found") from e
 
         # LlamaCloudIndex is a managed index so we can directly use the files
-        upload_file = (file_name, BytesIO(file_data))
+        upload_file = (file_name, file_data)
         doc_id = LLamaCloudFileService.add_file_to_pipeline(
             index.project.id,
             index.pipeline.id,
@@ -254,6 +447,44 @@ class FileService:
         return doc_id
 
 
+def _stored_file_name(file_name: str) -> Tuple[str, str, str]:
+    """
+    Return the file id, the stored file name and the extension of an uploaded file
+    """
+    file_id = str(uuid.uuid4())
+    extension = os.path.splitext(file_name)[1].lstrip(".")
+    if extension == "":
+        raise UnsupportedFileError("File is not supported!")
+    return file_id, stored_file_name(file_id, file_name), extension
+
+
+def stored_file_name(file_id: str, file_name: str) -> str:
+    """
+    Name a file is stored under: its sanitized name followed by its id, so file
+    server URLs can't be guessed.
+    """
+    name, extension = os.path.splitext(file_name)
+    return f"{_sanitize_file_name(name)}_{file_id}{extension}"
+
+
+def _link_or_copy(source: str, destination: str) -> None:
+    # Hard links share the content on disk, copy across file systems
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
+
+
+def _file_url(save_dir: str, file_name: str) -> str:
+    file_url_prefix = os.getenv("FILESERVER_URL_PREFIX")
+    if file_url_prefix is None:
+        logger.warning(
+            "FILESERVER_URL_PREFIX is not set, fallback to http://localhost:8000/api/files"
+        )
+        file_url_prefix = "http://localhost:8000/api/files"
+    return os.path.join(file_url_prefix, save_dir, file_name)
+
+
 def _sanitize_file_name(file_name: str) -> str:
     """
     Sanitize the file name by replacing all non-alphanumeric characters with underscores
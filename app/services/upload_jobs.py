@@ -0,0 +1,233 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel
+
+from app.services.file import DocumentFile, FileService
+from app.services.upload_registry import get_upload_registry
+
+logger = logging.getLogger("uvicorn")
+
+# Uploads parsed and embedded at the same time
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "2"))
+# Unfinished uploads accepted before new ones are rejected
+UPLOAD_MAX_PENDING = int(os.getenv("UPLOAD_MAX_PENDING", "32"))
+# Seconds a finished job stays available to the status endpoint
+UPLOAD_JOB_TTL = int(os.getenv("UPLOAD_JOB_TTL", "3600"))
+
+
+class UploadJobStatus(str, Enum):
+    QUEUED = "queued"
+    PARSING = "parsing"
+    EMBEDDING = "embedding"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class UploadJob(BaseModel):
+    id: str
+    status: UploadJobStatus
+    file: DocumentFile
+    error: Optional[str] = None
+    updated_at: float
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (UploadJobStatus.DONE, UploadJobStatus.FAILED)
+
+
+class UploadResponse(DocumentFile):
+    """
+    The uploaded file, as the chat UI expects it, with the status of its indexing
+    job. The chat UI sends the file back with the message, its refs are resolved
+    by file id once the job is done.
+    """
+
+    job_id: str
+    status: UploadJobStatus
+    error: Optional[str] = None
+
+    @classmethod
+    def from_job(cls, job: UploadJob) -> "UploadResponse":
+        return cls(
+            **job.file.model_dump(exclude_none=True),
+            job_id=job.id,
+            status=job.status,
+            error=job.error,
+        )
+
+
+class TooManyUploadsError(RuntimeError):
+    pass
+
+
+class UploadJobManager:
+    """
+    Index stored uploads on a bounded pool of background threads and keep track
+    of their status, so the upload request returns as soon as the file is on disk.
+    Only one job indexes a given content at a time: uploads of the same content
+    and name wait for it and reuse its documents.
+    Jobs live in memory: the status endpoint must be served by the same process.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = UPLOAD_WORKERS,
+        max_pending: int = UPLOAD_MAX_PENDING,
+        ttl: int = UPLOAD_JOB_TTL,
+    ):
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="upload"
+        )
+        self._jobs: Dict[str, UploadJob] = {}
+        self._params: Dict[str, Optional[dict]] = {}
+        # Index key (content and name) being indexed -> jobs waiting for it
+        self._indexing: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, document_file: DocumentFile, params: Optional[dict] = None) -> UploadJob:
+        # Content that is already indexed is done right away with the existing refs
+        refs = FileService.find_indexed_upload(document_file)
+        if refs is not None:
+            job = UploadJob(
+                id=str(uuid.uuid4()),
+                status=UploadJobStatus.DONE,
+                file=document_file.model_copy(update={"refs": refs}),
+                updated_at=time.time(),
+            )
+            with self._lock:
+                self._evict_expired()
+                self._jobs[job.id] = job
+                return job.model_copy(deep=True)
+
+        with self._lock:
+            self._evict_expired()
+            pending = sum(1 for job in self._jobs.values() if not job.finished)
+            if pending >= self.max_pending:
+                raise TooManyUploadsError(
+                    f"Too many uploads being processed ({pending}), try again later"
+                )
+            job = UploadJob(
+                id=str(uuid.uuid4()),
+                status=UploadJobStatus.QUEUED,
+                file=document_file,
+                updated_at=time.time(),
+            )
+            self._jobs[job.id] = job
+            self._params[job.id] = params
+            snapshot = job.model_copy(deep=True)
+        self._start(job.id)
+        return snapshot
+
+    def get(self, job_id: str) -> Optional[UploadJob]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job.model_copy(deep=True) if job else None
+
+    def refs_for_file(self, file_id: str) -> Optional[List[str]]:
+        """
+        Document ids of an uploaded file whose indexing job is done. Jobs expire,
+        indexed contents are found in the upload registry as long as they exist.
+        """
+        with self._lock:
+            for job in self._jobs.values():
+                if job.file.id == file_id and job.status == UploadJobStatus.DONE:
+                    return list(job.file.refs or [])
+        return get_upload_registry().refs_for_owner(file_id)
+
+    def _set_status(
+        self, job_id: str, status: UploadJobStatus, error: Optional[str] = None
+    ) -> None:
+        with self._lock:
+            job = self._jobs[job_id]
+            job.status = status
+            job.error = error
+            job.updated_at = time.time()
+
+    def _start(self, job_id: str) -> None:
+        """
+        Run the job, or queue it behind the job already indexing the same content.
+        """
+        with self._lock:
+            index_key = self._jobs[job_id].file.index_key
+            if index_key:
+                if index_key in self._indexing:
+                    self._indexing[index_key].append(job_id)
+                    return
+                self._indexing[index_key] = []
+            params = self._params.pop(job_id, None)
+        self._executor.submit(self._run, job_id, params)
+
+    def _release(self, index_key: Optional[str]) -> None:
+        """
+        Finish the jobs that waited for `index_key` with the documents it produced.
+        If it failed, the next waiting job indexes the content itself.
+        """
+        if not index_key:
+            return
+        with self._lock:
+            waiting = self._indexing.pop(index_key, [])
+        for job_id in waiting:
+            with self._lock:
+                document_file = self._jobs[job_id].file.model_copy(deep=True)
+            try:
+                refs = FileService.find_indexed_upload(document_file)
+            except Exception as e:
+                logger.error(f"Error indexing file {document_file.name}: {e}", exc_info=True)
+                self._set_status(job_id, UploadJobStatus.FAILED, error="Error processing file")
+                continue
+            if refs is None:
+                self._start(job_id)
+                continue
+            with self._lock:
+                self._jobs[job_id].file.refs = refs
+                self._params.pop(job_id, None)
+            self._set_status(job_id, UploadJobStatus.DONE)
+
+    def _run(self, job_id: str, params: Optional[dict]) -> None:
+        with self._lock:
+            document_file = self._jobs[job_id].file.model_copy(deep=True)
+        try:
+            document_file = FileService.index_private_file(
+                document_file,
+                params,
+                on_status=lambda status: self._set_status(job_id, UploadJobStatus(status)),
+            )
+        except Exception as e:
+            logger.error(f"Error indexing file {document_file.name}: {e}", exc_info=True)
+            self._set_status(job_id, UploadJobStatus.FAILED, error="Error processing file")
+            self._release(document_file.index_key)
+            return
+        with self._lock:
+            self._jobs[job_id].file = document_file
+        self._set_status(job_id, UploadJobStatus.DONE)
+        self._release(document_file.index_key)
+
+    def _evict_expired(self) -> None:
+        expired_before = time.time() - self.ttl
+        for job_id in [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job.finished and job.updated_at < expired_before
+        ]:
+            del self._jobs[job_id]
+
+
+_upload_jobs: Optional[UploadJobManager] = None
+_upload_jobs_lock = threading.Lock()
+
+
+def get_upload_jobs() -> UploadJobManager:
+    global _upload_jobs
+    with _upload_jobs_lock:
+        if _upload_jobs is None:
+            _upload_jobs = UploadJobManager()
+        return _upload_jobs
@@ -0,0 +1,135 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+STORAGE_DIR = os.getenv("STORAGE_DIR", "storage")
+UPLOAD_REGISTRY_PATH = os.getenv(
+    "UPLOAD_REGISTRY_PATH", os.path.join(STORAGE_DIR, "uploads.sqlite3")
+)
+
+
+@dataclass
+class IndexedUpload:
+    index_key: str
+    refs: List[str]
+    node_ids: List[str]
+
+
+class UploadRegistry:
+    """
+    Index key (see `DocumentFile.index_key`) of each indexed private upload with
+    the document and node ids it produced, and the uploaded files (owners) that
+    share them. Private documents are only reachable through the id of a file
+    that owns them.
+    """
+
+    def __init__(self, path: str = UPLOAD_REGISTRY_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._migrate_content_hash_keys()
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS uploads (
+                index_key TEXT PRIMARY KEY,
+                refs TEXT NOT NULL,
+                node_ids TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS upload_owners (
+                index_key TEXT NOT NULL,
+                file_id TEXT NOT NULL,
+                PRIMARY KEY (index_key, file_id)
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_upload_owners_file_id ON upload_owners (file_id)"
+        )
+        self._conn.commit()
+
+    def _migrate_content_hash_keys(self) -> None:
+        """
+        Uploads used to be keyed by content hash only. Those keys no longer match
+        new uploads, but their owners still reach their documents.
+        """
+        for table in ("uploads", "upload_owners"):
+            columns = [row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")]
+            if "content_hash" in columns:
+                self._conn.execute(
+                    f"ALTER TABLE {table} RENAME COLUMN content_hash TO index_key"
+                )
+        self._conn.commit()
+
+    def get(self, index_key: str) -> Optional[IndexedUpload]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT refs, node_ids FROM uploads WHERE index_key = ?",
+                (index_key,),
+            ).fetchone()
+        if row is None:
+            return None
+        return IndexedUpload(index_key, json.loads(row[0]), json.loads(row[1]))
+
+    def add(
+        self, index_key: str, refs: List[str], node_ids: List[str], owner: str
+    ) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO uploads (index_key, refs, node_ids, created_at) "
+                "VALUES (?, ?, ?, ?)",
+                (index_key, json.dumps(refs), json.dumps(node_ids), time.time()),
+            )
+            self._conn.execute(
+                "INSERT OR IGNORE INTO upload_owners (index_key, file_id) VALUES (?, ?)",
+                (index_key, owner),
+            )
+
+    def add_owner(self, index_key: str, owner: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO upload_owners (index_key, file_id) VALUES (?, ?)",
+                (index_key, owner),
+            )
+
+    def refs_for_owner(self, file_id: str) -> Optional[List[str]]:
+        """
+        Document ids of the indexed upload owned by `file_id`, or None.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT uploads.refs FROM upload_owners "
+                "JOIN uploads ON uploads.index_key = upload_owners.index_key "
+                "WHERE upload_owners.file_id = ?",
+                (file_id,),
+            ).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def remove(self, index_key: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM uploads WHERE index_key = ?", (index_key,))
+            self._conn.execute(
+                "DELETE FROM upload_owners WHERE index_key = ?", (index_key,)
+            )
+
+
+_registry: Optional[UploadRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_upload_registry() -> UploadRegistry:
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = UploadRegistry()
+        return _registry
@@ -1,6 +1,7 @@
 import os
 from typing import Dict, Optional
 
+from llama_index.core.llms import LLM
 from llama_index.core.multi_modal_llms import MultiModalLLM
 from llama_index.core.settings import Settings
 
@@ -8,11 +9,33 @@ from llama_index.core.settings import Settings
 # so we use a global variable to store it
 _multi_modal_llm: Optional[MultiModalLLM] = None
 
+# Pipeline stages that can be routed to their own model with `<STAGE>_MODEL`,
+# `<STAGE>_MODEL_PROVIDER` and `<STAGE>_LLM_TIMEOUT` environment variables
+LLM_STAGES = ("condense", "suggestion", "answer")
+_stage_llms: Dict[str, LLM] = {}
+
+ANTHROPIC_MODEL_MAP: Dict[str, str] = {
+    "claude-3-opus": "claude-3-opus-20240229",
+    "claude-3-sonnet": "claude-3-sonnet-20240229",
+    "claude-3-haiku": "claude-3-haiku-20240307",
+    "claude-2.1": "claude-2.1",
+    "claude-instant-1.2": "claude-instant-1.2",
+}
+
 
 def get_multi_modal_llm():
     return _multi_modal_llm
 
 
+def get_stage_llm(stage: str) -> LLM:
+    """
+    Return the LLM configured for a pipeline stage, falling back to `Settings.llm`.
+    """
+    if stage not in LLM_STAGES:
+        raise ValueError(f"Invalid LLM stage: {stage}")
+    return _stage_llms.get(stage) or Settings.llm
+
+
 def init_settings():
     model_provider = os.getenv("MODEL_PROVIDER")
     match model_provider:
@@ -42,44 +65,185 @@ def init_settings():
     Settings.chunk_size = int(os.getenv("CHUNK_SIZE", "1024"))
     Settings.chunk_overlap = int(os.getenv("CHUNK_OVERLAP", "20"))
 
+    init_stage_llms(model_provider)
+
+
+def init_stage_llms(default_provider: Optional[str]):
+    """
+    Create a dedicated LLM client for every stage that has `<STAGE>_MODEL`,
+    `<STAGE>_MODEL_PROVIDER` or `<STAGE>_LLM_TIMEOUT` set.
+    Each stage gets its own client instance, so timeouts and connection pools
+    are not shared with the answer model.
+    """
+    _stage_llms.clear()
+    for stage in LLM_STAGES:
+        prefix = stage.upper()
+        model = os.getenv(f"{prefix}_MODEL")
+        provider = os.getenv(f"{prefix}_MODEL_PROVIDER")
+        timeout = os.getenv(f"{prefix}_LLM_TIMEOUT")
+        if not (model or provider or timeout):
+            continue
+        if not model and provider and provider != default_provider:
+            raise ValueError(
+                f"{prefix}_MODEL must be set when {prefix}_MODEL_PROVIDER differs from MODEL_PROVIDER"
+            )
+        _stage_llms[stage] = create_llm(
+            provider or default_provider,
+            model or None,
+            float(timeout) if timeout is not None else None,
+        )
+
+
+def create_llm(
+    provider: str, model: Optional[str] = None, timeout: Optional[float] = None
+) -> LLM:
+    """
+    Create a standalone LLM client for the given provider.
+    Used by the `init_<provider>` functions for `Settings.llm` and for the stage LLMs.
+    `model` defaults to the main model (`MODEL`), `timeout` to the provider default.
+    """
+    kwargs = {}
+    if timeout is not None:
+        kwargs["timeout"] = timeout
+    match provider:
+        case "openai":
+            from llama_index.core.constants import DEFAULT_TEMPERATURE
+            from llama_index.llms.openai import OpenAI
+
+            max_tokens = os.getenv("LLM_MAX_TOKENS")
+            return OpenAI(
+                model=model or os.getenv("MODEL", "gpt-4o-mini"),
+                temperature=float(os.getenv("LLM_TEMPERATURE", DEFAULT_TEMPERATURE)),
+                max_tokens=int(max_tokens) if max_tokens is not None else None,
+                **kwargs,
+            )
+        case "azure-openai":
+            from llama_index.core.constants import DEFAULT_TEMPERATURE
+
+            try:
+                from llama_index.llms.azure_openai import AzureOpenAI
+            except ImportError:
+                raise ImportError(
+                    "Azure OpenAI support is not installed. Please install it with `poetry add llama-index-llms-azure-openai` and `poetry add llama-index-embeddings-azure-openai`"
+                )
+
+            max_tokens = os.getenv("LLM_MAX_TOKENS")
+            return AzureOpenAI(
+                model=model or os.getenv("MODEL"),
+                # Stage models are addressed by deployment name on Azure
+                deployment_name=model or os.environ["AZURE_OPENAI_LLM_DEPLOYMENT"],
+                max_tokens=int(max_tokens) if max_tokens is not None else None,
+                temperature=float(os.getenv("LLM_TEMPERATURE", DEFAULT_TEMPERATURE)),
+                **azure_openai_config(),
+                **kwargs,
+            )
+        case "groq":
+            try:
+                from llama_index.llms.groq import Groq
+            except ImportError:
+                raise ImportError(
+                    "Groq support is not installed. Please install it with `poetry add llama-index-llms-groq`"
+                )
+
+            return Groq(model=model or os.getenv("MODEL"), **kwargs)
+        case "ollama":
+            try:
+                from llama_index.llms.ollama.base import DEFAULT_REQUEST_TIMEOUT, Ollama
+            except ImportError:
+                raise ImportError(
+                    "Ollama support is not installed. Please install it with `poetry add llama-index-llms-ollama` and `poetry add llama-index-embeddings-ollama`"
+                )
+
+            return Ollama(
+                base_url=ollama_base_url(),
+                model=model or os.getenv("MODEL"),
+                request_timeout=timeout
+                or float(os.getenv("OLLAMA_REQUEST_TIMEOUT", DEFAULT_REQUEST_TIMEOUT)),
+            )
+        case "anthropic":
+            try:
+                from llama_index.llms.anthropic import Anthropic
+            except ImportError:
+                raise ImportError(
+                    "Anthropic support is not installed. Please install it with `poetry add llama-index-llms-anthropic`"
+                )
+
+            model = model or os.getenv("MODEL")
+            return Anthropic(model=ANTHROPIC_MODEL_MAP.get(model, model), **kwargs)
+        case "gemini":
+            try:
+                from llama_index.llms.gemini import Gemini
+            except ImportError:
+                raise ImportError(
+                    "Gemini support is not installed. Please install it with `poetry add llama-index-llms-gemini` and `poetry add llama-index-embeddings-gemini`"
+                )
+
+            return Gemini(
+                model=f"models/{model or os.getenv('MODEL')}",
+                request_options={"timeout": timeout} if timeout is not None else None,
+            )
+        case "mistral":
+            from llama_index.llms.mistralai import MistralAI
+
+            return MistralAI(model=model or os.getenv("MODEL"), **kwargs)
+        case "huggingface":
+            if timeout is not None:
+                raise ValueError(
+                    "Hugging Face models run locally and do not support a request timeout"
+                )
+            try:
+                from llama_index.llms.huggingface import HuggingFaceLLM
+            except ImportError:
+                raise ImportError(
+                    "Hugging Face support is not installed. Please install it with `poetry add llama-index-llms-huggingface` and `poetry add llama-index-embeddings-huggingface`"
+                )
+
+            model = model or os.getenv("MODEL")
+            return HuggingFaceLLM(model_name=model, tokenizer_name=model)
+        case "t-systems":
+            from .llmhub import create_llmhub_llm
+
+            return create_llmhub_llm(model, timeout)
+        case _:
+            raise ValueError(f"Invalid model provider: {provider}")
+
+
+def ollama_base_url() -> str:
+    return os.getenv("OLLAMA_BASE_URL") or "http://127.0.0.1:11434"
+
+
+def azure_openai_config() -> Dict[str, Optional[str]]:
+    return {
+        "api_key": os.environ["AZURE_OPENAI_API_KEY"],
+        "azure_endpoint": os.environ["AZURE_OPENAI_ENDPOINT"],
+        "api_version": os.getenv("AZURE_OPENAI_API_VERSION")
+        or os.getenv("OPENAI_API_VERSION"),
+    }
+
 
 def init_ollama():
     try:
         from llama_index.embeddings.ollama import OllamaEmbedding
-        from llama_index.llms.ollama.base import DEFAULT_REQUEST_TIMEOUT, Ollama
     except ImportError:
         raise ImportError(
             "Ollama support is not installed. Please install it with `poetry add llama-index-llms-ollama` and `poetry add llama-index-embeddings-ollama`"
         )
 
-    base_url = os.getenv("OLLAMA_BASE_URL") or "http://127.0.0.1:11434"
-    request_timeout = float(
-        os.getenv("OLLAMA_REQUEST_TIMEOUT", DEFAULT_REQUEST_TIMEOUT)
-    )
     Settings.embed_model = OllamaEmbedding(
-        base_url=base_url,
+        base_url=ollama_base_url(),
         model_name=os.getenv("EMBEDDING_MODEL"),
     )
-    Settings.llm = Ollama(
-        base_url=base_url, model=os.getenv("MODEL"), request_timeout=request_timeout
-    )
+    Settings.llm = create_llm("ollama")
 
 
 def init_openai():
-    from llama_index.core.constants import DEFAULT_TEMPERATURE
     from llama_index.embeddings.openai import OpenAIEmbedding
-    from llama_index.llms.openai import OpenAI
     from llama_index.multi_modal_llms.openai import OpenAIMultiModal
     from llama_index.multi_modal_llms.openai.utils import GPT4V_MODELS
 
-    max_tokens = os.getenv("LLM_MAX_TOKENS")
-    model_name = os.getenv("MODEL", "gpt-4o-mini")
-    Settings.llm = OpenAI(
-        model=model_name,
-        temperature=float(os.getenv("LLM_TEMPERATURE", DEFAULT_TEMPERATURE)),
-        max_tokens=int(max_tokens) if max_tokens is not None else None,
-    )
+    Settings.llm = create_llm("openai")
 
+    model_name = os.getenv("MODEL", "gpt-4o-mini")
     if model_name in GPT4V_MODELS:
         global _multi_modal_llm
         _multi_modal_llm = OpenAIMultiModal(model=model_name)
@@ -92,42 +256,23 @@ def init_openai():
 
 
 def init_azure_openai():
-    from llama_index.core.constants import DEFAULT_TEMPERATURE
-
     try:
         from llama_index.embeddings.azure_openai import AzureOpenAIEmbedding
-        from llama_index.llms.azure_openai import AzureOpenAI
     except ImportError:
         raise ImportError(
             "Azure OpenAI support is not installed. Please install it with `poetry add llama-index-llms-azure-openai` and `poetry add llama-index-embeddings-azure-openai`"
         )
 
-    llm_deployment = os.environ["AZURE_OPENAI_LLM_DEPLOYMENT"]
     embedding_deployment = os.environ["AZURE_OPENAI_EMBEDDING_DEPLOYMENT"]
-    max_tokens = os.getenv("LLM_MAX_TOKENS")
-    temperature = os.getenv("LLM_TEMPERATURE", DEFAULT_TEMPERATURE)
     dimensions = os.getenv("EMBEDDING_DIM")
 
-    azure_config = {
-        "api_key": os.environ["AZURE_OPENAI_API_KEY"],
-        "azure_endpoint": os.environ["AZURE_OPENAI_ENDPOINT"],
-        "api_version": os.getenv("AZURE_OPENAI_API_VERSION")
-        or os.getenv("OPENAI_API_VERSION"),
-    }
-
-    Settings.llm = AzureOpenAI(
-        model=os.getenv("MODEL"),
-        max_tokens=int(max_tokens) if max_tokens is not None else None,
-        temperature=float(temperature),
-        deployment_name=llm_deployment,
-        **azure_config,
-    )
+    Settings.llm = create_llm("azure-openai")
 
     Settings.embed_model = AzureOpenAIEmbedding(
         model=os.getenv("EMBEDDING_MODEL"),
         dimensions=int(dimensions) if dimensions is not None else None,
         deployment_name=embedding_deployment,
-        **azure_config,
+        **azure_openai_config(),
     )
 
 
@@ -178,50 +323,18 @@ def init_huggingface_embedding():
 
 
 def init_huggingface():
-    try:
-        from llama_index.llms.huggingface import HuggingFaceLLM
-    except ImportError:
-        raise ImportError(
-            "Hugging Face support is not installed. Please install it with `poetry add llama-index-llms-huggingface` and `poetry add llama-index-embeddings-huggingface`"
-        )
-
-    Settings.llm = HuggingFaceLLM(
-        model_name=os.getenv("MODEL"),
-        tokenizer_name=os.getenv("MODEL"),
-    )
+    Settings.llm = create_llm("huggingface")
     init_huggingface_embedding()
 
 
 def init_groq():
-    try:
-        from llama_index.llms.groq import Groq
-    except ImportError:
-        raise ImportError(
-            "Groq support is not installed. Please install it with `poetry add llama-index-llms-groq`"
-        )
-
-    Settings.llm = Groq(model=os.getenv("MODEL"))
+    Settings.llm = create_llm("groq")
     # Groq does not provide embeddings, so we use FastEmbed instead
     init_fastembed()
 
 
 def init_anthropic():
-    try:
-        from llama_index.llms.anthropic import Anthropic
-    except ImportError:
-        raise ImportError(
-            "Anthropic support is not installed. Please install it with `poetry add llama-index-llms-anthropic`"
-        )
-
-    model_map: Dict[str, str] = {
-        "claude-3-opus": "claude-3-opus-20240229",
-        "claude-3-sonnet": "claude-3-sonnet-20240229",
-        "claude-3-haiku": "claude-3-haiku-20240307",
-        "claude-2.1": "claude-2.1",
-        "claude-instant-1.2": "claude-instant-1.2",
-    }
-
-    Settings.llm = Anthropic(model=model_map[os.getenv("MODEL")])
+    Settings.llm = create_llm("anthropic")
     # Anthropic does not provide embeddings, so we use FastEmbed instead
     init_fastembed()
 
@@ -229,22 +342,19 @@ def init_anthropic():
 def init_gemini():
     try:
         from llama_index.embeddings.gemini import GeminiEmbedding
-        from llama_index.llms.gemini import Gemini
     except ImportError:
         raise ImportError(
             "Gemini support is not installed. Please install it with `poetry add llama-index-llms-gemini` and `poetry add llama-index-embeddings-gemini`"
         )
 
-    model_name = f"models/{os.getenv('MODEL')}"
     embed_model_name = f"models/{os.getenv('EMBEDDING_MODEL')}"
 
-    Settings.llm = Gemini(model=model_name)
+    Settings.llm = create_llm("gemini")
     Settings.embed_model = GeminiEmbedding(model_name=embed_model_name)
 
 
 def init_mistral():
     from llama_index.embeddings.mistralai import MistralAIEmbedding
-    from llama_index.llms.mistralai import MistralAI
 
-    Settings.llm = MistralAI(model=os.getenv("MODEL"))
+    Settings.llm = create_llm("mistral")
     Settings.embed_model = MistralAIEmbedding(model_name=os.getenv("EMBEDDING_MODEL"))
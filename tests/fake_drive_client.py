@@ -0,0 +1,70 @@
+import hashlib
+
+from app.engine.drive_client import FOLDER_MIME_TYPE, DriveClient, RangeNotSatisfiableError
+
+
+class FakeDriveClient(DriveClient):
+    """
+    DriveClient em memória: pastas e arquivos são criados pelos testes e cada
+    alteração entra no feed de mudanças.
+    """
+
+    def __init__(self, root_id="root"):
+        self.root_id = root_id
+        self.items = {}
+        self.contents = {}
+        self.changes = []
+        self.downloads = []  # (file_id, offset) de cada chamada a download
+
+    def add_folder(self, folder_id, name, parent=None):
+        self.items[folder_id] = {
+            'id': folder_id,
+            'name': name,
+            'mimeType': FOLDER_MIME_TYPE,
+            'parents': [parent or self.root_id],
+        }
+        self._changed(folder_id)
+
+    def put_file(self, file_id, name, content, parent=None):
+        self.items[file_id] = {
+            'id': file_id,
+            'name': name,
+            'mimeType': 'application/pdf',
+            'parents': [parent or self.root_id],
+            'size': str(len(content)),
+            'md5Checksum': hashlib.md5(content).hexdigest(),
+            'modifiedTime': f"2024-01-01T00:00:{len(self.changes):02d}Z",
+        }
+        self.contents[file_id] = content
+        self._changed(file_id)
+
+    def remove(self, item_id):
+        del self.items[item_id]
+        self.contents.pop(item_id, None)
+        self.changes.append({'fileId': item_id, 'removed': True})
+
+    def _changed(self, item_id):
+        self.changes.append({'fileId': item_id, 'removed': False, 'file': dict(self.items[item_id])})
+
+    def list_folder(self, folder_id):
+        return [dict(item) for item in self.items.values() if folder_id in item['parents']]
+
+    def get_files_metadata(self, file_ids):
+        return {file_id: dict(self.items[file_id]) for file_id in file_ids if file_id in self.items}
+
+    def download(self, file_id, fh, chunksize, on_progress=None, offset=0):
+        self.downloads.append((file_id, offset))
+        content = self.contents[file_id]
+        if offset > len(content):
+            raise RangeNotSatisfiableError(f"Offset {offset} além do fim do arquivo {file_id}")
+        for start in range(offset, len(content), chunksize):
+            chunk = content[start:start + chunksize]
+            fh.write(chunk)
+            if on_progress:
+                on_progress(len(chunk))
+
+    def get_start_page_token(self):
+        return str(len(self.changes))
+
+    def list_changes(self, page_token):
+        return self.changes[int(page_token):], str(len(self.changes))
@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+from llama_index.core.base.base_retriever import BaseRetriever
+from llama_index.core.llms import ChatMessage, CompletionResponse, MessageRole
+from llama_index.core.llms.mock import MockLLM
+from llama_index.core.memory import ChatMemoryBuffer
+
+from app.engine import condense
+from app.engine.condense import CachedCondensePlusContextChatEngine, is_self_contained
+
+
+class CountingLLM(MockLLM):
+    calls: int = 0
+
+    def complete(self, prompt, formatted=False, **kwargs):
+        self.calls += 1
+        return CompletionResponse(text=f"condensed {self.calls}")
+
+    async def acomplete(self, prompt, formatted=False, **kwargs):
+        return self.complete(prompt, formatted, **kwargs)
+
+
+class EmptyRetriever(BaseRetriever):
+    def _retrieve(self, query_bundle):
+        return []
+
+
+HISTORY = [
+    ChatMessage(role=MessageRole.USER, content="Qual o prazo de entrega do contrato?"),
+    ChatMessage(role=MessageRole.ASSISTANT, content="O prazo é de 30 dias."),
+]
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    condense._condense_cache.clear()
+    yield
+    condense._condense_cache.clear()
+
+
+def _engine(condense_llm):
+    return CachedCondensePlusContextChatEngine(
+        retriever=EmptyRetriever(),
+        llm=MockLLM(),
+        memory=ChatMemoryBuffer.from_defaults(),
+        condense_llm=condense_llm,
+    )
+
+
+@pytest.mark.parametrize(
+    "question, expected",
+    [
+        ("Qual o prazo de entrega do contrato de 2023?", True),
+        ("What is the refund policy for enterprise customers?", True),
+        ("E o de 2022?", False),
+        ("and for March?", False),
+        ("Qual o valor dele no ano passado?", False),
+        ("Can you summarize that again please?", False),
+        ("Resumo", False),
+    ],
+)
+def test_is_self_contained(question, expected):
+    assert is_self_contained(question) is expected
+
+
+def test_self_contained_question_skips_llm():
+    llm = CountingLLM()
+    question = "Qual o prazo de entrega do contrato de 2023?"
+    assert _engine(llm)._condense_question(HISTORY, question) == question
+    assert llm.calls == 0
+
+
+def test_condensed_question_is_cached_across_engines():
+    llm = CountingLLM()
+    assert _engine(llm)._condense_question(HISTORY, "E o de 2022?") == "condensed 1"
+    # The chat engine is rebuilt per request, the cache is shared
+    assert _engine(llm)._condense_question(HISTORY, "E o de 2022?") == "condensed 1"
+    assert (
+        asyncio.run(_engine(llm)._acondense_question(HISTORY, "E o de 2022?"))
+        == "condensed 1"
+    )
+    assert llm.calls == 1
+
+    other_history = HISTORY + [ChatMessage(role=MessageRole.USER, content="Obrigado")]
+    assert _engine(llm)._condense_question(other_history, "E o de 2022?") == "condensed 2"
+    assert llm.calls == 2
@@ -0,0 +1,179 @@
+import hashlib
+import sqlite3
+
+from llama_index.core.schema import NodeRelationship, RelatedNodeInfo, TextNode
+from llama_index.core.vector_stores.types import MetadataFilter, MetadataFilters
+
+from app.engine.dedup import (
+    MinHashDeduplicator,
+    MinHashIndex,
+    apply_dedup_index,
+    lsh_bands,
+    minhash_signature,
+)
+from app.engine.periods import PeriodQuery, include_linked_chunks
+from app.engine.query_filter import metadata_matches
+
+TEXT = " ".join(f"word{i}" for i in range(60))
+OTHER_TEXT = " ".join(f"other{i}" for i in range(60))
+
+
+def _node(node_id, doc_id, period, text=TEXT):
+    return TextNode(
+        id_=node_id,
+        text=text,
+        metadata={"file_path": f"/data/{period}/{doc_id}", "period": period},
+        relationships={NodeRelationship.SOURCE: RelatedNodeInfo(node_id=doc_id)},
+    )
+
+
+class Links:
+    """Records the metadata updates like the vector store merges them."""
+
+    def __init__(self):
+        self.metadata = {}
+
+    def __call__(self, updates):
+        for node_id, metadata in updates.items():
+            self.metadata.setdefault(node_id, {}).update(metadata)
+
+
+def _hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _deduplicator(tmp_path, links=None):
+    return MinHashDeduplicator(
+        threshold=0.9,
+        index=MinHashIndex(str(tmp_path / "minhash.sqlite3"), threshold=0.9),
+        on_links_changed=links,
+    )
+
+
+def _ingest(deduplicator, *nodes):
+    kept = deduplicator(list(nodes))
+    deduplicator.commit()
+    return [node.node_id for node in kept]
+
+
+def test_duplicates_of_other_periods_link_the_canonical_chunk(tmp_path):
+    links = Links()
+    deduplicator = _deduplicator(tmp_path, links)
+    kept = _ingest(
+        deduplicator,
+        _node("a", "manual-jan", "2024-01"),
+        _node("b", "copy-jan", "2024-01"),
+        _node("c", "manual-feb", "2024-02"),
+    )
+
+    assert kept == ["a"]
+    # A duplicate of the same period needs no link
+    assert links.metadata == {"a": {"linked_period_2024-02": "true"}}
+
+
+def test_removed_duplicate_unlinks_its_period(tmp_path):
+    links = Links()
+    deduplicator = _deduplicator(tmp_path, links)
+    _ingest(deduplicator, _node("a", "manual-jan", "2024-01"), _node("b", "manual-feb", "2024-02"))
+
+    deduplicator.remove_documents(["manual-feb"])
+
+    assert links.metadata == {"a": {"linked_period_2024-02": "false"}}
+    assert deduplicator.pop_orphaned_doc_ids() == []
+
+
+def test_document_ingested_again_keeps_its_duplicates(tmp_path):
+    links = Links()
+    deduplicator = _deduplicator(tmp_path, links)
+    _ingest(deduplicator, _node("a", "manual-jan", "2024-01"), _node("b", "manual-feb", "2024-02"))
+
+    # Chunks get new node ids, the duplicate is linked to the new canonical chunk
+    assert _ingest(deduplicator, _node("a2", "manual-jan", "2024-01")) == ["a2"]
+
+    assert deduplicator.pop_orphaned_doc_ids() == []
+    assert links.metadata["a2"] == {"linked_period_2024-02": "true"}
+    assert deduplicator.index.duplicate_chunks() == {("manual-feb", _hash(TEXT))}
+
+
+def test_duplicates_of_removed_chunks_are_orphaned(tmp_path):
+    deduplicator = _deduplicator(tmp_path)
+    _ingest(deduplicator, _node("a", "manual-jan", "2024-01"), _node("b", "manual-feb", "2024-02"))
+
+    deduplicator.remove_documents(["manual-jan"])
+
+    assert deduplicator.pop_orphaned_doc_ids() == ["manual-feb"]
+    assert deduplicator.pop_orphaned_doc_ids() == []
+    assert deduplicator.index.duplicate_chunks() == set()
+    # Ingested again, the chunk is canonical
+    assert _ingest(deduplicator, _node("b2", "manual-feb", "2024-02")) == ["b2"]
+
+
+def test_rolled_back_batch_is_forgotten(tmp_path):
+    links = Links()
+    deduplicator = _deduplicator(tmp_path, links)
+    deduplicator([_node("a", "manual", "2024-01")])
+    deduplicator.rollback()
+    assert _ingest(deduplicator, _node("b", "copy", "2024-02")) == ["b"]
+    assert links.metadata == {}
+
+
+def test_apply_dedup_index_matches_ingestion(tmp_path):
+    deduplicator = _deduplicator(tmp_path)
+    _ingest(
+        deduplicator,
+        _node("a", "manual", "2024-01"),
+        _node("b", "revision", "2024-02"),
+        _node("c", "other", "2024-02", text=OTHER_TEXT),
+    )
+    # Chunks split again (e.g. for BM25) get new node ids
+    nodes = [
+        _node("x", "manual", "2024-01"),
+        _node("y", "revision", "2024-02"),
+        _node("z", "other", "2024-02", text=OTHER_TEXT),
+    ]
+    kept = apply_dedup_index(nodes, deduplicator.index)
+
+    assert [node.ref_doc_id for node in kept] == ["manual", "other"]
+    assert kept[0].metadata["linked_period_2024-02"] == "true"
+    assert "linked_period_2024-02" in kept[0].excluded_llm_metadata_keys
+    assert "linked_period_2024-02" not in kept[1].metadata
+
+
+def test_period_filters_include_linked_chunks():
+    periods = ["2023-12", "2024-01", "2024-02"]
+    filters = include_linked_chunks(PeriodQuery(year=2024).to_filters(periods), periods)
+    canonical = {"period": "2023-12", "year": 2023, "month": 12}
+
+    assert not metadata_matches(canonical, filters)
+    assert metadata_matches({**canonical, "linked_period_2024-02": "true"}, filters)
+    assert not metadata_matches({**canonical, "linked_period_2024-02": "false"}, filters)
+    assert metadata_matches({"period": "2024-01", "year": 2024, "month": 1}, filters)
+
+    # No period matches, the filters are left as is
+    no_match = MetadataFilters(filters=[MetadataFilter(key="year", value=2020)])
+    assert include_linked_chunks(no_match, periods) is no_match
+
+
+def test_migrates_index_scoped_by_period(tmp_path):
+    path = str(tmp_path / "minhash.sqlite3")
+    index = MinHashIndex(path, threshold=0.9)
+    index.add("a", "manual", minhash_signature(TEXT), period="2024-01", chunk_hash="hash")
+    index.commit()
+    index.close()
+    conn = sqlite3.connect(path)
+    conn.execute("ALTER TABLE signatures RENAME COLUMN period TO scope")
+    conn.commit()
+    conn.close()
+
+    index = MinHashIndex(path, threshold=0.9)
+    assert index.legacy_duplicate_doc_ids == []
+    assert index.find_canonical(minhash_signature(TEXT))[0] == "a"
+    index.add("b", "revision", minhash_signature(TEXT), "a", period="2024-02", chunk_hash="hash")
+    assert index.linked_periods() == {("manual", "hash"): {"2024-02"}}
+
+
+def test_lsh_bands_are_computed_once():
+    lsh_bands.cache_clear()
+    lsh_bands(0.9)
+    lsh_bands(0.9)
+    assert lsh_bands.cache_info().hits == 1
@@ -0,0 +1,56 @@
+import os
+
+from llama_index.core import Document
+from llama_index.core.schema import NodeRelationship, RelatedNodeInfo, TextNode
+from llama_index.core.storage.docstore import SimpleDocumentStore
+
+from app.engine.docstore import SQLiteDocumentStore
+
+
+def _node(node_id, doc_id):
+    return TextNode(
+        id_=node_id,
+        text=node_id,
+        relationships={NodeRelationship.SOURCE: RelatedNodeInfo(node_id=doc_id)},
+    )
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "docstore.sqlite3")
+    docstore = SQLiteDocumentStore(path)
+    document = Document(id_="doc", text="content", metadata={"period": "2024-01"})
+    docstore.add_documents([document, _node("node-1", "doc"), _node("node-2", "doc")])
+    docstore.set_document_hash("doc", document.hash)
+
+    # A new instance reads everything back from the file
+    reopened = SQLiteDocumentStore(path)
+    stored = reopened.get_document("doc")
+    assert (stored.text, stored.metadata) == ("content", {"period": "2024-01"})
+    assert reopened.get_document_hash("doc") == document.hash
+    assert sorted(reopened.get_ref_doc_info("doc").node_ids) == ["node-1", "node-2"]
+    assert sorted(doc.node_id for doc in reopened.iter_documents()) == [
+        "doc",
+        "node-1",
+        "node-2",
+    ]
+
+    reopened.delete_ref_doc("doc")
+    assert SQLiteDocumentStore(path).get_document("node-1", raise_error=False) is None
+
+
+def test_imports_legacy_docstore_once(tmp_path):
+    json_path = str(tmp_path / "docstore.json")
+    legacy = SimpleDocumentStore()
+    legacy.add_documents([_node("node-1", "doc")])
+    legacy.set_document_hash("doc", "hash")
+    legacy.persist(json_path)
+
+    docstore = SQLiteDocumentStore(str(tmp_path / "docstore.sqlite3"))
+    assert docstore.import_legacy_docstore(json_path)
+
+    assert docstore.get_document("node-1").text == "node-1"
+    assert docstore.get_document_hash("doc") == "hash"
+    assert docstore.get_ref_doc_info("doc").node_ids == ["node-1"]
+    assert not os.path.exists(json_path)
+    assert os.path.exists(f"{json_path}.migrated")
+    assert not docstore.import_legacy_docstore(json_path)
@@ -0,0 +1,93 @@
+import hashlib
+import os
+
+import pytest
+
+from app.engine.drive_downloader import GoogleDriveDownloader
+from tests.fake_drive_client import FakeDriveClient
+
+
+@pytest.fixture
+def client():
+    client = FakeDriveClient()
+    client.add_folder("f1", "2024-01")
+    client.put_file("a", "manual.pdf", b"manual " * 100, parent="f1")
+    client.put_file("b", "notes.pdf", b"notes " * 10)
+    return client
+
+
+@pytest.fixture
+def downloader(tmp_path, monkeypatch, client):
+    monkeypatch.setenv("DRIVE_MANIFEST_PATH", str(tmp_path / "drive_manifest.json"))
+    monkeypatch.setenv("DRIVE_SYNC_STATE_PATH", str(tmp_path / "drive_sync_state.json"))
+    return _downloader(client)
+
+
+def _downloader(client):
+    return GoogleDriveDownloader(chunksize=64, max_workers=2, max_qps=0, client=client)
+
+
+def _sync(downloader, local_folder):
+    downloaded, removed = [], []
+    downloader.download_from_folder(
+        "root", str(local_folder), on_file_downloaded=downloaded.append, on_file_removed=removed.append
+    )
+    return sorted(downloaded), removed
+
+
+def _partial(local_folder, file_name, content):
+    return os.path.join(local_folder, f".{file_name}.{hashlib.md5(content).hexdigest()}.part")
+
+
+def test_full_sync_keeps_the_folder_structure(tmp_path, downloader):
+    data = tmp_path / "data"
+    downloaded, _ = _sync(downloader, data)
+    assert downloaded == [str(data / "2024-01" / "manual.pdf"), str(data / "notes.pdf")]
+    assert (data / "2024-01" / "manual.pdf").read_bytes() == b"manual " * 100
+
+
+def test_changes_sync_only_downloads_changed_files(tmp_path, client, downloader):
+    data = tmp_path / "data"
+    _sync(downloader, data)
+    client.put_file("b", "notes.pdf", b"new notes " * 10)
+    client.remove("a")
+    downloaded, removed = _sync(_downloader(client), data)
+    assert downloaded == [str(data / "notes.pdf")]
+    assert removed == [str(data / "2024-01" / "manual.pdf")]
+    assert (data / "notes.pdf").read_bytes() == b"new notes " * 10
+    assert not (data / "2024-01" / "manual.pdf").exists()
+
+
+def test_partial_download_is_resumed(tmp_path, client, downloader):
+    data = tmp_path / "data"
+    content = b"notes " * 10
+    os.makedirs(data)
+    with open(_partial(data, "notes.pdf", content), "wb") as f:
+        f.write(content[:20])
+    _sync(downloader, data)
+    assert ("b", 20) in client.downloads
+    assert (data / "notes.pdf").read_bytes() == content
+    assert not os.path.exists(_partial(data, "notes.pdf", content))
+
+
+@pytest.mark.parametrize("partial", [b"corrupted bytes", b"x" * 1000])
+def test_unusable_partial_download_restarts_from_zero(tmp_path, client, downloader, partial):
+    data = tmp_path / "data"
+    content = b"notes " * 10
+    os.makedirs(data)
+    with open(_partial(data, "notes.pdf", content), "wb") as f:
+        f.write(partial)
+    _sync(downloader, data)
+    assert ("b", len(partial)) in client.downloads
+    assert ("b", 0) in client.downloads
+    assert (data / "notes.pdf").read_bytes() == content
+
+
+def test_partial_download_of_an_old_version_is_removed(tmp_path, downloader):
+    data = tmp_path / "data"
+    os.makedirs(data)
+    stale = _partial(data, "notes.pdf", b"old notes")
+    with open(stale, "wb") as f:
+        f.write(b"old")
+    _sync(downloader, data)
+    assert not os.path.exists(stale)
@@ -0,0 +1,110 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from llama_index.core import MockEmbedding
+
+from app.engine import embedding_batcher
+from app.engine.embedding_batcher import AsyncBatchEmbedder
+
+
+class ProviderError(Exception):
+    def __init__(self, status_code, message="", retry_after=None):
+        super().__init__(message)
+        self.status_code = status_code
+        headers = {"retry-after": retry_after} if retry_after is not None else {}
+        self.response = SimpleNamespace(status_code=status_code, headers=headers)
+
+
+class FakeEmbedding(MockEmbedding):
+    # Lists are shared with the batcher's copy of the model
+    batches: list = []
+    errors: list = []
+
+    async def _aget_text_embeddings(self, texts):
+        self.batches.append(list(texts))
+        if self.errors:
+            raise self.errors.pop(0)
+        return [[float(len(text))] for text in texts]
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+
+    async def sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(embedding_batcher.asyncio, "sleep", sleep)
+    return delays
+
+
+def _embedder(embed_model, **kwargs):
+    embedder = AsyncBatchEmbedder(embed_model, max_in_flight=1, **kwargs)
+    # One token per word
+    embedder._tokenizer = str.split
+    return embedder
+
+
+def test_batches_are_cut_by_token_budget():
+    embed_model = FakeEmbedding(embed_dim=1, batches=[], errors=[])
+    texts = ["a b c d"] * 5
+    embeddings = asyncio.run(_embedder(embed_model, max_batch_tokens=10).aembed(texts))
+
+    assert [len(batch) for batch in embed_model.batches] == [2, 2, 1]
+    assert embeddings == [[7.0]] * 5
+
+
+def test_batches_are_cut_by_size():
+    embed_model = FakeEmbedding(embed_dim=1, batches=[], errors=[])
+    asyncio.run(_embedder(embed_model, max_batch_size=2).aembed(["a"] * 5))
+
+    assert [len(batch) for batch in embed_model.batches] == [2, 2, 1]
+
+
+def test_rate_limit_backs_off_and_shrinks_budget(sleeps):
+    embed_model = FakeEmbedding(
+        embed_dim=1,
+        batches=[],
+        errors=[ProviderError(429), ProviderError(429, retry_after="7")],
+    )
+    embedder = _embedder(embed_model, max_batch_tokens=8, base_delay=1.0)
+    embeddings = asyncio.run(embedder.aembed(["a b", "c d"]))
+
+    assert embeddings == [[3.0], [3.0]]
+    assert len(embed_model.batches) == 3
+    # Full jitter within the first backoff window, then the provider's Retry-After
+    assert 0 <= sleeps[0] <= 1.0
+    assert sleeps[1] == 7.0
+    # Halved twice, then grown back once after the successful batch
+    assert embedder._token_budget == int(2 * 1.25) + 1
+
+
+def test_gives_up_after_max_retries(sleeps):
+    embed_model = FakeEmbedding(
+        embed_dim=1, batches=[], errors=[ProviderError(429) for _ in range(3)]
+    )
+    with pytest.raises(ProviderError):
+        asyncio.run(_embedder(embed_model, max_retries=2).aembed(["a"]))
+    assert len(sleeps) == 2
+
+
+def test_batch_too_large_is_split(sleeps):
+    embed_model = FakeEmbedding(
+        embed_dim=1,
+        batches=[],
+        errors=[ProviderError(400, "maximum context length is 8192 tokens")],
+    )
+    embeddings = asyncio.run(_embedder(embed_model).aembed(["a", "bb", "ccc", "dddd"]))
+
+    assert embeddings == [[1.0], [2.0], [3.0], [4.0]]
+    assert [len(batch) for batch in embed_model.batches] == [4, 2, 2]
+    assert sleeps == []
+
+
+def test_shared_model_is_not_modified():
+    embed_model = FakeEmbedding(embed_dim=1, embed_batch_size=10, batches=[], errors=[])
+    embedder = AsyncBatchEmbedder(embed_model, max_batch_size=100)
+
+    assert embed_model.embed_batch_size == 10
+    assert embedder.embed_model.embed_batch_size == 100
@@ -0,0 +1,63 @@
+import itertools
+from types import SimpleNamespace
+
+from llama_index.core import MockEmbedding
+from llama_index.core.schema import TextNode
+
+from app.engine import embedding_cache
+from app.engine.embedding_cache import CachedEmbedding, EmbeddingCache
+
+
+class CountingEmbedding(MockEmbedding):
+    calls: list = []
+
+    def _get_text_embeddings(self, texts):
+        self.calls.append(list(texts))
+        return super()._get_text_embeddings(texts)
+
+
+def _fake_clock(monkeypatch):
+    # Distinct `last_used` values so the LRU order does not depend on timer resolution
+    clock = itertools.count(1)
+    monkeypatch.setattr(
+        embedding_cache, "time", SimpleNamespace(time=lambda: float(next(clock)))
+    )
+
+
+def test_evicts_least_recently_used(tmp_path, monkeypatch):
+    _fake_clock(monkeypatch)
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"), max_entries=2)
+    cache.put_many({"a": [1.0], "b": [2.0]}, "model", 1)
+    # Using `a` makes `b` the least recently used entry
+    assert cache.get_many(["a"], "model", 1) == {"a": [1.0]}
+    cache.put_many({"c": [3.0]}, "model", 1)
+
+    assert cache.get_many(["a", "b", "c"], "model", 1) == {"a": [1.0], "c": [3.0]}
+
+
+def test_key_includes_model_and_dimensions(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"))
+    cache.put_many({"a": [1.0, 2.0]}, "small", 2)
+
+    assert cache.get_many(["a"], "small", 2) == {"a": [1.0, 2.0]}
+    assert cache.get_many(["a"], "large", 2) == {}
+    assert cache.get_many(["a"], "small", 3) == {}
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_cache_persists_across_instances(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    EmbeddingCache(path).put_many({"a": [1.0]}, "model", 1)
+    assert EmbeddingCache(path).get_many(["a"], "model", 1) == {"a": [1.0]}
+
+
+def test_cached_embedding_embeds_only_new_texts(tmp_path):
+    embed_model = CountingEmbedding(embed_dim=2, calls=[])
+    transform = CachedEmbedding(
+        embed_model, cache=EmbeddingCache(str(tmp_path / "cache.sqlite3"))
+    )
+    transform([TextNode(text="first"), TextNode(text="second")])
+    nodes = transform([TextNode(text="first"), TextNode(text="third")])
+
+    assert embed_model.calls == [["first", "second"], ["third"]]
+    assert all(node.embedding == [0.5, 0.5] for node in nodes)
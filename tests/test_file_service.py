@@ -0,0 +1,92 @@
+import base64
+import os
+
+import pytest
+
+from app.services import file as file_service
+from app.services.file import (
+    DocumentFile,
+    FileService,
+    FileTooLargeError,
+    InvalidUploadError,
+    UnsupportedFileError,
+    UploadWriter,
+)
+
+
+def _data_url(content: bytes) -> str:
+    return "data:application/pdf;base64," + base64.b64encode(content).decode()
+
+
+def _upload(tmp_path, file_name, content, **kwargs):
+    writer = UploadWriter(
+        file_name,
+        save_dir=str(tmp_path / "uploaded"),
+        content_dir=str(tmp_path / "content"),
+        **kwargs,
+    )
+    writer.write(content)
+    return writer
+
+
+def test_uploads_keep_their_name_and_share_the_stored_content(tmp_path):
+    first = _upload(tmp_path, "Relatório 2024.pdf", b"content").close()
+    second = _upload(tmp_path, "C:\\Users\\me\\Relatório 2024.pdf", b"content").close()
+
+    assert (first.name, second.name) == ("Relatório 2024.pdf", "Relatório 2024.pdf")
+    assert first.content_hash == second.content_hash
+    assert first.index_key == second.index_key
+    # Each upload has its own unguessable file, the content is stored once
+    assert first.stored_name == f"Relat_rio_2024_{first.id}.pdf"
+    assert first.url.endswith(f"/uploaded/{first.stored_name}")
+    assert first.content_hash not in first.url
+    assert first.path != second.path
+    assert os.path.samefile(first.path, second.path)
+    assert os.listdir(tmp_path / "content") == [f"{first.content_hash}.pdf"]
+
+    other_name = _upload(tmp_path, "copy.pdf", b"content").close()
+    assert other_name.index_key != first.index_key
+
+
+def test_aborted_upload_leaves_no_file(tmp_path):
+    writer = _upload(tmp_path, "report.pdf", b"", max_size=10)
+    with pytest.raises(FileTooLargeError):
+        writer.write(b"x" * 11)
+    writer.abort()
+    assert os.listdir(tmp_path / "uploaded") == os.listdir(tmp_path / "content") == []
+
+    # The content stored by an earlier upload is kept
+    first = _upload(tmp_path, "report.pdf", b"content").close()
+    writer = _upload(tmp_path, "copy.pdf", b"content")
+    writer.close()
+    writer.abort()
+    assert os.listdir(tmp_path / "uploaded") == [first.stored_name]
+    assert os.listdir(tmp_path / "content") == [f"{first.content_hash}.pdf"]
+
+    writer = _upload(tmp_path, "other.pdf", b"other content")
+    writer.close()
+    writer.abort()
+    assert os.listdir(tmp_path / "uploaded") == [first.stored_name]
+    assert os.listdir(tmp_path / "content") == [f"{first.content_hash}.pdf"]
+
+
+def test_client_errors_have_their_own_types(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(file_service, "UPLOAD_CONTENT_DIR", str(tmp_path / "content"))
+    with pytest.raises(UnsupportedFileError):
+        FileService.write_private_file("README", _data_url(b"content"))
+    with pytest.raises(InvalidUploadError):
+        FileService.write_private_file("report.pdf", "not a data url")
+    with pytest.raises(InvalidUploadError):
+        FileService.write_private_file("report.pdf", "data:application/pdf;base64,abc")
+
+
+def test_private_documents_keep_the_original_name(tmp_path):
+    path = tmp_path / "notes_id.txt"
+    path.write_text("Meeting notes")
+    document_file = DocumentFile(id="id", name="notes.txt", type="txt", path=str(path))
+    documents = FileService._load_file_to_documents(document_file)
+
+    assert documents[0].metadata["file_name"] == "notes.txt"
+    assert documents[0].metadata["stored_file_name"] == "notes_id.txt"
+    assert "stored_file_name" in documents[0].excluded_llm_metadata_keys
@@ -0,0 +1,111 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+from llama_index.core import Document
+from pydantic import BaseModel, PrivateAttr
+
+from app.engine.loaders import file as file_loader
+from app.engine.loaders.file import FileLoaderConfig, get_file_documents
+from app.engine.loaders.parse_cache import ParseCache, parser_settings_key
+
+
+class FakeLlamaParse(BaseModel):
+    """
+    Local stand-in for the LlamaParse client, recording the files it parses and
+    the number of files parsed at the same time.
+    """
+
+    result_type: str = "markdown"
+    language: str = "en"
+    # Not part of the output, must not invalidate the cache
+    num_workers: int = 4
+    delay: float = 0.0
+
+    _parsed: list = PrivateAttr(default_factory=list)
+    _in_flight: int = PrivateAttr(default=0)
+    _max_in_flight: int = PrivateAttr(default=0)
+
+    async def aload_data(self, file_path):
+        self._parsed.append(Path(file_path).name)
+        self._in_flight += 1
+        self._max_in_flight = max(self._max_in_flight, self._in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self._in_flight -= 1
+        return [Document(text=f"{self.language}: {Path(file_path).name}")]
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / "llama_parse_cache")
+    monkeypatch.setattr(file_loader, "ParseCache", lambda: ParseCache(cache_dir))
+    return cache_dir
+
+
+def _write_files(tmp_path, count):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir(exist_ok=True)
+    paths = []
+    for i in range(count):
+        path = data_dir / f"report-{i}.pdf"
+        path.write_bytes(f"%PDF-1.4 report {i}".encode())
+        paths.append(str(path))
+    return paths
+
+
+def _load(paths, parser, max_concurrency=8):
+    config = FileLoaderConfig(
+        use_llama_parse=True, llama_parse_max_concurrency=max_concurrency
+    )
+    return list(get_file_documents(config, paths, llama_parser=parser))
+
+
+def test_cache_hit_skips_the_parser(tmp_path, cache_dir):
+    paths = _write_files(tmp_path, 2)
+    first = FakeLlamaParse()
+    documents = _load(paths, first)
+    assert sorted(first._parsed) == ["report-0.pdf", "report-1.pdf"]
+    assert sorted(d.id_ for d in documents) == [f"{p}_part_0" for p in paths]
+    assert {d.metadata["file_name"] for d in documents} == {"report-0.pdf", "report-1.pdf"}
+
+    second = FakeLlamaParse()
+    cached = _load(paths, second)
+    assert second._parsed == []
+    assert sorted(d.text for d in cached) == sorted(d.text for d in documents)
+
+    # A changed file is parsed again
+    Path(paths[0]).write_bytes(b"%PDF-1.4 edited")
+    third = FakeLlamaParse()
+    _load(paths, third)
+    assert third._parsed == ["report-0.pdf"]
+
+
+def test_output_settings_invalidate_the_cache(tmp_path, cache_dir):
+    assert parser_settings_key(FakeLlamaParse()) == parser_settings_key(
+        FakeLlamaParse(num_workers=1)
+    )
+    assert parser_settings_key(FakeLlamaParse()) != parser_settings_key(
+        FakeLlamaParse(language="pt")
+    )
+
+    paths = _write_files(tmp_path, 1)
+    _load(paths, FakeLlamaParse())
+    same_output = FakeLlamaParse(num_workers=1)
+    _load(paths, same_output)
+    assert same_output._parsed == []
+
+    other_language = FakeLlamaParse(language="pt")
+    documents = _load(paths, other_language)
+    assert other_language._parsed == ["report-0.pdf"]
+    assert documents[0].text == "pt: report-0.pdf"
+
+
+def test_parses_at_most_max_concurrency_files_at_a_time(tmp_path, cache_dir):
+    paths = _write_files(tmp_path, 10)
+    parser = FakeLlamaParse(delay=0.05)
+    documents = _load(paths, parser, max_concurrency=3)
+
+    assert len(documents) == 10
+    assert parser._max_in_flight == 3
@@ -0,0 +1,85 @@
+import os
+
+from llama_index.core import Document
+
+from app.engine.manifest import IngestionManifest
+
+
+def _write(path, text):
+    path.write_text(text)
+    return str(path)
+
+
+def _ingest(manifest, data_dir):
+    """
+    Scan and record every new or changed file as one document.
+    """
+    changes = manifest.scan(str(data_dir))
+    manifest.add_batch([Document(id_=f"{path}_part_0") for path in changes.to_ingest])
+    return changes, manifest.commit()
+
+
+def test_detects_added_modified_and_deleted_files(tmp_path):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    a = _write(data_dir / "a.txt", "first")
+    b = _write(data_dir / "b.txt", "second")
+    manifest = IngestionManifest(str(tmp_path / "manifest.json"))
+
+    changes, _ = _ingest(manifest, data_dir)
+    assert changes.new == [a, b]
+    assert manifest.entries[a].doc_ids == [f"{a}_part_0"]
+
+    _write(data_dir / "a.txt", "first, edited")
+    os.remove(b)
+    c = _write(data_dir / "c.txt", "third")
+    changes = manifest.scan(str(data_dir))
+    assert (changes.new, changes.changed, changes.deleted) == ([c], [a], [b])
+    assert changes.to_ingest == [a, c]
+    assert manifest.remove(b) == [f"{b}_part_0"]
+
+
+def test_touched_file_with_same_content_is_unchanged(tmp_path):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    a = _write(data_dir / "a.txt", "first")
+    manifest = IngestionManifest(str(tmp_path / "manifest.json"))
+    _ingest(manifest, data_dir)
+
+    stat = os.stat(a)
+    os.utime(a, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    changes = manifest.scan(str(data_dir))
+
+    assert changes.unchanged == [a]
+    assert not changes.has_changes()
+    assert manifest.entries[a].mtime_ns == stat.st_mtime_ns + 1_000_000_000
+
+
+def test_changed_file_returns_stale_doc_ids(tmp_path):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    a = _write(data_dir / "a.txt", "first")
+    manifest = IngestionManifest(str(tmp_path / "manifest.json"))
+    manifest.scan(str(data_dir))
+    manifest.add_batch([Document(id_=f"{a}_part_0"), Document(id_=f"{a}_part_1")])
+    manifest.commit()
+
+    _write(data_dir / "a.txt", "shorter")
+    changes, stale_doc_ids = _ingest(manifest, data_dir)
+
+    assert changes.changed == [a]
+    assert stale_doc_ids == [f"{a}_part_1"]
+
+
+def test_persist_and_load(tmp_path):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    a = _write(data_dir / "a.txt", "first")
+    path = str(tmp_path / "manifest.json")
+    manifest = IngestionManifest(path)
+    _ingest(manifest, data_dir)
+    manifest.persist()
+
+    loaded = IngestionManifest.load(path)
+    assert loaded.entries[a].doc_ids == [f"{a}_part_0"]
+    assert not loaded.scan(str(data_dir)).has_changes()
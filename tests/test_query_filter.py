@@ -0,0 +1,88 @@
+import chromadb
+from llama_index.core.schema import NodeRelationship, RelatedNodeInfo, TextNode
+from llama_index.core.vector_stores.types import (
+    FilterOperator,
+    MetadataFilter,
+    MetadataFilters,
+    VectorStoreQuery,
+)
+
+from app.engine.periods import include_linked_chunks
+from app.engine.query_filter import combine_filters, generate_filters
+from app.engine.vectordb import BatchedChromaVectorStore
+
+
+def _node(node_id, doc_id, private, period):
+    return TextNode(
+        id_=node_id,
+        text=node_id,
+        embedding=[1.0, 0.0, 0.0],
+        metadata={"private": private, "period": period},
+        # Stored as the `doc_id` metadata by the vector store
+        relationships={NodeRelationship.SOURCE: RelatedNodeInfo(node_id=doc_id)},
+    )
+
+
+def _vector_store(name):
+    client = chromadb.EphemeralClient()
+    collection = client.get_or_create_collection(name)
+    store = BatchedChromaVectorStore(chroma_collection=collection)
+    store.add(
+        [
+            _node("public-2024-01", "a", "false", "2024-01"),
+            _node("public-2024-02", "b", "false", "2024-02"),
+            _node("selected-2024-01", "c", "true", "2024-01"),
+            _node("selected-2024-02", "c", "true", "2024-02"),
+            _node("other-2024-01", "d", "true", "2024-01"),
+        ]
+    )
+    return store
+
+
+def _query(store, filters):
+    result = store.query(
+        VectorStoreQuery(
+            query_embedding=[1.0, 0.0, 0.0], similarity_top_k=10, filters=filters
+        )
+    )
+    return sorted(result.ids)
+
+
+def test_combine_filters_flattens_and_groups():
+    period = MetadataFilters(filters=[MetadataFilter(key="period", value="2024-01")])
+    year = MetadataFilters(
+        filters=[MetadataFilter(key="year", value=2024, operator=FilterOperator.GTE)]
+    )
+    combined = combine_filters(period, year)
+    assert all(isinstance(f, MetadataFilter) for f in combined.filters)
+    assert [f.key for f in combined.filters] == ["period", "year"]
+    assert combine_filters(None, period) is period
+    assert combine_filters(None, None) is None
+
+
+def test_doc_ids_and_period_filters_on_chroma():
+    store = _vector_store("doc_ids_and_period")
+    period = MetadataFilters(filters=[MetadataFilter(key="period", value="2024-01")])
+    filters = combine_filters(generate_filters(["c"]), period)
+    assert _query(store, filters) == ["public-2024-01", "selected-2024-01"]
+
+
+def test_public_and_period_filters_on_chroma():
+    store = _vector_store("public_and_period")
+    period = MetadataFilters(filters=[MetadataFilter(key="period", value="2024-02")])
+    filters = combine_filters(generate_filters([]), period)
+    assert _query(store, filters) == ["public-2024-02"]
+
+
+def test_linked_period_filters_on_chroma():
+    store = _vector_store("linked_period")
+    # The 2024-02 duplicate of the public 2024-01 chunk was skipped at ingestion
+    store.update_metadata({"public-2024-01": {"linked_period_2024-02": "true"}})
+    period = MetadataFilters(filters=[MetadataFilter(key="period", value="2024-02")])
+    filters = combine_filters(
+        generate_filters([]), include_linked_chunks(period, ["2024-01", "2024-02"])
+    )
+    assert _query(store, filters) == ["public-2024-01", "public-2024-02"]
+
+    store.update_metadata({"public-2024-01": {"linked_period_2024-02": "false"}})
+    assert _query(store, filters) == ["public-2024-02"]
@@ -0,0 +1,88 @@
+import pytest
+from llama_index.core.llms.mock import MockLLM
+from llama_index.core.settings import Settings
+
+from app import settings
+from app.settings import create_llm, get_stage_llm, init_stage_llms
+
+# Every provider accepted by `init_settings`
+MODEL_PROVIDERS = [
+    "openai",
+    "groq",
+    "ollama",
+    "anthropic",
+    "gemini",
+    "mistral",
+    "azure-openai",
+    "huggingface",
+    "t-systems",
+]
+
+
+@pytest.fixture(autouse=True)
+def env(monkeypatch):
+    for name in ("MODEL", "LLM_MAX_TOKENS", "LLM_TEMPERATURE"):
+        monkeypatch.delenv(name, raising=False)
+    for stage in settings.LLM_STAGES:
+        for suffix in ("_MODEL", "_MODEL_PROVIDER", "_LLM_TIMEOUT"):
+            monkeypatch.delenv(f"{stage.upper()}{suffix}", raising=False)
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("AZURE_OPENAI_API_KEY", "test")
+    monkeypatch.setenv("AZURE_OPENAI_ENDPOINT", "https://example.openai.azure.com")
+    monkeypatch.setenv("AZURE_OPENAI_LLM_DEPLOYMENT", "gpt-4o")
+    yield
+    settings._stage_llms.clear()
+
+
+@pytest.mark.parametrize("provider", MODEL_PROVIDERS)
+def test_create_llm_handles_every_provider(provider):
+    try:
+        create_llm(provider, "some-model")
+    except ImportError:
+        # The provider's integration package is optional
+        pass
+
+
+def test_create_llm_rejects_unknown_provider():
+    with pytest.raises(ValueError):
+        create_llm("unknown")
+
+
+def test_create_llm_uses_main_settings(monkeypatch):
+    pytest.importorskip("llama_index.llms.openai")
+    monkeypatch.setenv("MODEL", "gpt-4o")
+    monkeypatch.setenv("LLM_MAX_TOKENS", "512")
+    monkeypatch.setenv("LLM_TEMPERATURE", "0.3")
+    llm = create_llm("openai", timeout=12)
+    assert (llm.model, llm.max_tokens, llm.temperature, llm.timeout) == (
+        "gpt-4o",
+        512,
+        0.3,
+        12,
+    )
+    assert create_llm("openai", "gpt-4o-mini").model == "gpt-4o-mini"
+
+
+def test_huggingface_rejects_timeout():
+    with pytest.raises(ValueError):
+        create_llm("huggingface", timeout=10)
+
+
+def test_stage_llms(monkeypatch):
+    pytest.importorskip("llama_index.llms.openai")
+    Settings.llm = MockLLM()
+    monkeypatch.setenv("MODEL", "gpt-4o")
+    monkeypatch.setenv("CONDENSE_MODEL", "gpt-4o-mini")
+    monkeypatch.setenv("ANSWER_LLM_TIMEOUT", "30")
+    init_stage_llms("openai")
+
+    assert get_stage_llm("condense").model == "gpt-4o-mini"
+    answer = get_stage_llm("answer")
+    assert (answer.model, answer.timeout) == ("gpt-4o", 30)
+    assert get_stage_llm("suggestion") is Settings.llm
+
+
+def test_stage_provider_requires_model(monkeypatch):
+    monkeypatch.setenv("CONDENSE_MODEL_PROVIDER", "groq")
+    with pytest.raises(ValueError):
+        init_stage_llms("openai")
@@ -0,0 +1,82 @@
+import threading
+
+import pytest
+
+from app.engine.stages import Stage, StageQueue
+
+
+def test_items_flow_through_stages_in_order():
+    numbers: StageQueue[int] = StageQueue(maxsize=2)
+    squares: StageQueue[int] = StageQueue(maxsize=2)
+    results = []
+
+    def produce():
+        for i in range(20):
+            numbers.put(i)
+
+    def transform():
+        for i in numbers:
+            squares.put(i * i)
+
+    def consume():
+        results.extend(squares)
+
+    stages = [
+        Stage("produce", produce, output=numbers),
+        Stage("transform", transform, output=squares),
+        Stage("consume", consume),
+    ]
+    for stage in stages:
+        stage.start()
+    for stage in stages:
+        stage.result()
+
+    assert results == [i * i for i in range(20)]
+
+
+def test_put_blocks_while_queue_is_full():
+    items: StageQueue[int] = StageQueue(maxsize=1)
+    items.put(1)
+    second_put = threading.Thread(target=items.put, args=(2,), daemon=True)
+    second_put.start()
+    second_put.join(timeout=0.2)
+    assert second_put.is_alive()
+
+    consumed = []
+    consumer = threading.Thread(target=lambda: consumed.extend(items), daemon=True)
+    consumer.start()
+    second_put.join(timeout=1)
+    assert not second_put.is_alive()
+    items.close()
+    consumer.join(timeout=1)
+    assert consumed == [1, 2]
+
+
+def test_error_closes_output_and_is_raised_by_result():
+    items: StageQueue[int] = StageQueue(maxsize=2)
+    consumed = []
+
+    def produce():
+        items.put(1)
+        raise RuntimeError("download failed")
+
+    producer = Stage("produce", produce, output=items)
+    consumer = Stage("consume", lambda: consumed.extend(items))
+    producer.start()
+    consumer.start()
+
+    # The consumer is not left waiting for items that will never come
+    consumer.result()
+    assert consumed == [1]
+    with pytest.raises(RuntimeError, match="download failed"):
+        producer.result()
+
+
+def test_consumer_error_is_raised_by_result():
+    def consume():
+        raise ValueError("parse failed")
+
+    stage = Stage("consume", consume)
+    stage.start()
+    with pytest.raises(ValueError, match="parse failed"):
+        stage.result()
@@ -0,0 +1,144 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from app.services import upload_jobs
+from app.services.file import DocumentFile, FileService
+from app.services.upload_jobs import UploadJobManager, UploadJobStatus, UploadResponse
+from app.services.upload_registry import UploadRegistry
+
+
+class FakeIndex:
+    """
+    Stands in for the vector store indexing of FileService, with the same
+    content hash registry semantics.
+    """
+
+    def __init__(self):
+        self.indexed = {}
+        self.calls = []
+        self.release = threading.Event()
+        self.fail = False
+
+    def find_indexed_upload(self, document_file):
+        return self.indexed.get(document_file.index_key)
+
+    def index_private_file(self, document_file, params=None, on_status=None):
+        self.calls.append(document_file.id)
+        self.release.wait(5)
+        if self.fail:
+            self.fail = False
+            raise RuntimeError("embedding failed")
+        document_file.refs = [f"doc-{document_file.id}"]
+        self.indexed[document_file.index_key] = document_file.refs
+        return document_file
+
+
+@pytest.fixture
+def index(monkeypatch):
+    index = FakeIndex()
+    monkeypatch.setattr(FileService, "find_indexed_upload", staticmethod(index.find_indexed_upload))
+    monkeypatch.setattr(FileService, "index_private_file", staticmethod(index.index_private_file))
+    return index
+
+
+def _file(file_id, content_hash="hash", name="report.pdf"):
+    return DocumentFile(id=file_id, name=name, type="pdf", content_hash=content_hash)
+
+
+def _wait(manager, job_ids):
+    deadline = time.time() + 5
+    while time.time() < deadline:
+        jobs = [manager.get(job_id) for job_id in job_ids]
+        if all(job.finished for job in jobs):
+            return jobs
+        time.sleep(0.01)
+    raise AssertionError("upload jobs did not finish")
+
+
+def test_same_content_is_indexed_once(index):
+    manager = UploadJobManager(max_workers=4)
+    jobs = [manager.submit(_file(f"f{i}")) for i in range(3)]
+    index.release.set()
+    jobs = _wait(manager, [job.id for job in jobs])
+    assert index.calls == ["f0"]
+    assert [job.status for job in jobs] == [UploadJobStatus.DONE] * 3
+    assert [job.file.refs for job in jobs] == [["doc-f0"]] * 3
+
+
+def test_waiting_upload_indexes_the_content_when_the_first_one_fails(index):
+    manager = UploadJobManager(max_workers=4)
+    index.fail = True
+    jobs = [manager.submit(_file(f"f{i}")) for i in range(2)]
+    index.release.set()
+    jobs = _wait(manager, [job.id for job in jobs])
+    assert index.calls == ["f0", "f1"]
+    assert [job.status for job in jobs] == [UploadJobStatus.FAILED, UploadJobStatus.DONE]
+    assert jobs[1].file.refs == ["doc-f1"]
+
+
+def test_different_contents_are_indexed_concurrently(index):
+    manager = UploadJobManager(max_workers=4)
+    jobs = [manager.submit(_file(f"f{i}", content_hash=f"hash{i}")) for i in range(2)]
+    deadline = time.time() + 5
+    while len(index.calls) < 2 and time.time() < deadline:
+        time.sleep(0.01)
+    assert sorted(index.calls) == ["f0", "f1"]
+    index.release.set()
+    _wait(manager, [job.id for job in jobs])
+
+
+def test_same_content_with_another_name_is_indexed_again(index):
+    manager = UploadJobManager(max_workers=4)
+    index.release.set()
+    first = _wait(manager, [manager.submit(_file("f0")).id])[0]
+    second = _wait(manager, [manager.submit(_file("f1", name="other.pdf")).id])[0]
+    assert index.calls == ["f0", "f1"]
+    assert (first.file.refs, second.file.refs) == (["doc-f0"], ["doc-f1"])
+
+
+def test_refs_outlive_the_job(index, tmp_path, monkeypatch):
+    registry = UploadRegistry(str(tmp_path / "uploads.sqlite3"))
+    monkeypatch.setattr(upload_jobs, "get_upload_registry", lambda: registry)
+    manager = UploadJobManager(max_workers=1, ttl=0)
+    index.release.set()
+    job = _wait(manager, [manager.submit(_file("f0")).id])[0]
+    registry.add(job.file.index_key, job.file.refs, ["node-1"], owner="f0")
+    registry.add_owner(job.file.index_key, "f1")
+
+    # The response is the file itself, the job id is an extra field
+    response = UploadResponse.from_job(job)
+    assert (response.id, response.job_id, response.refs) == ("f0", job.id, ["doc-f0"])
+    assert manager.refs_for_file(job.id) is None
+
+    # The finished job expires, the refs are still found by file id
+    manager.submit(_file("f2", content_hash="other"))
+    assert manager.get(job.id) is None
+    assert manager.refs_for_file("f0") == ["doc-f0"]
+    assert manager.refs_for_file("f1") == ["doc-f0"]
+    assert manager.refs_for_file("unknown") is None
+
+
+def test_registry_migrates_content_hash_keys(tmp_path):
+    path = str(tmp_path / "uploads.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE uploads (content_hash TEXT PRIMARY KEY, refs TEXT NOT NULL, "
+        "node_ids TEXT NOT NULL, created_at REAL NOT NULL)"
+    )
+    conn.execute(
+        "CREATE TABLE upload_owners (content_hash TEXT NOT NULL, file_id TEXT NOT NULL, "
+        "PRIMARY KEY (content_hash, file_id))"
+    )
+    conn.execute("INSERT INTO uploads VALUES ('hash', '[\"doc\"]', '[\"node\"]', 0)")
+    conn.execute("INSERT INTO upload_owners VALUES ('hash', 'f0')")
+    conn.commit()
+    conn.close()
+
+    registry = UploadRegistry(path)
+    # Owners keep their documents, other files cannot reach them
+    assert registry.refs_for_owner("f0") == ["doc"]
+    assert registry.refs_for_owner("f1") is None
+    assert registry.get(_file("f1").index_key) is None
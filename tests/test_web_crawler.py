@@ -0,0 +1,197 @@
+import asyncio
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.engine.loaders.crawler import BrowserPool, WebCrawler, WebCrawlState
+from app.engine.loaders.web import CrawlUrl, WebLoaderConfig, get_web_documents
+
+LONG_TEXT = "This page has enough server-rendered text to be indexed as is. " * 3
+
+
+def _html(text, *links):
+    anchors = "".join(f'<a href="{link}">{link}</a>' for link in links)
+    return f"<html><body><p>{text}</p>{anchors}</body></html>"
+
+
+PAGES = {
+    "/docs/": (
+        "text/html",
+        _html(
+            LONG_TEXT,
+            "/docs/a",
+            "/docs/b#section",
+            "/docs/manual.pdf",
+            "/other/outside",
+        ),
+    ),
+    "/docs/a": ("text/html", _html(LONG_TEXT, "/docs/a/deep", "/docs/")),
+    "/docs/a/deep": ("text/html", _html(LONG_TEXT)),
+    # Rendered client side: the HTML has almost no text
+    "/docs/b": ("text/html", '<html><body><div id="root">Loading</div></body></html>'),
+    "/docs/manual.pdf": ("application/pdf", "%PDF-1.4"),
+    "/other/outside": ("text/html", _html(LONG_TEXT)),
+}
+
+
+class Site:
+    """
+    Local HTTP server with ETag support, recording the requests it receives.
+    """
+
+    def __init__(self):
+        self.pages = dict(PAGES)
+        self.requests = []
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                site.requests.append((self.path, self.headers.get("If-None-Match")))
+                if self.path not in site.pages:
+                    self.send_error(404)
+                    return
+                content_type, body = site.pages[self.path]
+                etag = '"' + hashlib.sha256(body.encode()).hexdigest()[:16] + '"'
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                data = body.encode()
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def requested(self):
+        return sorted({path for path, _ in self.requests})
+
+
+@pytest.fixture
+def site(monkeypatch):
+    # Requests to the local server must not go through a proxy
+    for name in ("HTTP_PROXY", "HTTPS_PROXY", "ALL_PROXY"):
+        monkeypatch.delenv(name, raising=False)
+        monkeypatch.delenv(name.lower(), raising=False)
+    site = Site()
+    thread = threading.Thread(target=site.server.serve_forever, daemon=True)
+    thread.start()
+    yield site
+    site.server.shutdown()
+    site.server.server_close()
+
+
+class FakeBrowserPool(BrowserPool):
+    def __init__(self):
+        super().__init__(size=1, driver_arguments=[])
+        self.rendered = []
+
+    def render(self, url):
+        self.rendered.append(url)
+        return "Rendered in the browser", []
+
+
+def _crawl(site, crawler, max_depth, render_js=None):
+    documents = []
+    asyncio.run(
+        crawler.crawl(
+            f"{site.url}/docs/",
+            f"{site.url}/docs/",
+            max_depth,
+            emit=documents.append,
+            render_js=render_js,
+        )
+    )
+    return {document.id_[len(site.url) :]: document for document in documents}
+
+
+def _crawler(tmp_path, **kwargs):
+    state = WebCrawlState(str(tmp_path / "web_crawl_state.json"))
+    return WebCrawler(max_concurrency=4, state=state, min_text_length=50, **kwargs)
+
+
+def test_crawls_breadth_first_up_to_max_depth_within_prefix(site, tmp_path):
+    documents = _crawl(site, _crawler(tmp_path), max_depth=1)
+
+    assert sorted(documents) == ["/docs/", "/docs/a", "/docs/b"]
+    assert documents["/docs/a"].metadata == {"URL": f"{site.url}/docs/a"}
+    assert LONG_TEXT.strip() in documents["/docs/a"].text
+    # Links outside the prefix and past the depth limit are not fetched, and
+    # pages linked more than once are fetched once
+    assert site.requested() == ["/docs/", "/docs/a", "/docs/b", "/docs/manual.pdf"]
+    assert len(site.requests) == 4
+
+    documents = _crawl(site, _crawler(tmp_path), max_depth=2)
+    assert "/docs/a/deep" in documents
+
+
+def test_skips_non_html_responses(site, tmp_path):
+    documents = _crawl(site, _crawler(tmp_path), max_depth=1)
+
+    assert "/docs/manual.pdf" in site.requested()
+    assert "/docs/manual.pdf" not in documents
+
+
+def test_unchanged_pages_are_not_emitted_again(site, tmp_path):
+    state = WebCrawlState(str(tmp_path / "web_crawl_state.json"))
+    _crawl(site, WebCrawler(max_concurrency=4, state=state), max_depth=2)
+    state.persist()
+
+    site.requests.clear()
+    site.pages["/docs/a/deep"] = ("text/html", _html("Updated " + LONG_TEXT))
+    state = WebCrawlState.load(state.path)
+    documents = _crawl(site, WebCrawler(max_concurrency=4, state=state), max_depth=2)
+
+    # Links of unchanged pages come from the state, so the crawl still reaches
+    # the changed page behind them
+    assert sorted(documents) == ["/docs/a/deep"]
+    assert all(
+        etag is not None
+        for path, etag in site.requests
+        if path != "/docs/manual.pdf"
+    )
+
+
+def test_pages_with_little_text_are_rendered_in_the_browser(site, tmp_path):
+    browser_pool = FakeBrowserPool()
+    documents = _crawl(site, _crawler(tmp_path, browser_pool=browser_pool), max_depth=1)
+
+    assert browser_pool.rendered == [f"{site.url}/docs/b"]
+    assert documents["/docs/b"].text == "Rendered in the browser"
+    assert documents["/docs/a"].text != "Rendered in the browser"
+
+
+def test_render_js_setting_overrides_text_length(site, tmp_path):
+    browser_pool = FakeBrowserPool()
+    _crawl(site, _crawler(tmp_path, browser_pool=browser_pool), 1, render_js=False)
+    assert browser_pool.rendered == []
+
+    documents = _crawl(
+        site, _crawler(tmp_path, browser_pool=browser_pool), 0, render_js=True
+    )
+    assert browser_pool.rendered == [f"{site.url}/docs/"]
+    assert documents["/docs/"].text == "Rendered in the browser"
+
+
+def test_get_web_documents(site, tmp_path):
+    config = WebLoaderConfig(
+        urls=[CrawlUrl(base_url=f"{site.url}/docs/", prefix=f"{site.url}/docs/a")],
+        browser_pool_size=0,
+    )
+    state = WebCrawlState(str(tmp_path / "web_crawl_state.json"))
+    documents = list(get_web_documents(config, state))
+
+    assert sorted(document.id_ for document in documents) == [
+        f"{site.url}/docs/",
+        f"{site.url}/docs/a",
+    ]
@@ -0,0 +1,35 @@
+import openpyxl
+import pytest
+
+from app.engine.loaders.xlsx import StreamingXLSXReader
+
+
+def _write_workbook(path, num_rows):
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = "Data"
+    sheet.append(["id", "name"])
+    for i in range(1, num_rows + 1):
+        sheet.append([i, f"row {i}"])
+    workbook.save(path)
+    return path
+
+
+@pytest.mark.parametrize(
+    "num_rows, expected", [(0, 1), (1, 1), (3, 1), (4, 2), (6, 2), (7, 3)]
+)
+def test_document_count(tmp_path, num_rows, expected):
+    path = _write_workbook(tmp_path / "data.xlsx", num_rows)
+    documents = StreamingXLSXReader(rows_per_document=3).load_data(path)
+    assert len(documents) == expected
+
+
+def test_windows_cover_all_rows(tmp_path):
+    path = _write_workbook(tmp_path / "data.xlsx", 6)
+    documents = StreamingXLSXReader(rows_per_document=3).load_data(path)
+    assert [(d.metadata["row_start"], d.metadata["row_end"]) for d in documents] == [
+        (2, 4),
+        (5, 7),
+    ]
+    for document in documents:
+        assert document.text.startswith("Sheet: Data\n| id | name |")